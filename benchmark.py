@@ -0,0 +1,842 @@
+# benchmark.py
+"""
+Pomiary wydajności serwera szachownicy.
+
+Użycie:
+    python benchmark.py multi_board --boards 1 4 12 24
+    python benchmark.py multi_board --boards 1 4 --threaded
+    python benchmark.py protocol
+    python benchmark.py decoder --frames 2000
+    python benchmark.py recognizer --games 20
+    python benchmark.py lichess_stream --moves 40 --interval 0.05
+    python benchmark.py move_log --plies 300
+    python benchmark.py submit --moves 40
+    python benchmark.py end_to_end --plies 40 --json wyniki.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import socket
+import statistics
+import threading
+import time
+
+from chess_server import ChessServer
+from chess_move_handler import ChessMoveHandler
+from config import COLOR_GREEN, MOVE_SETTLE_DELAY, WIRING
+from chess_logic import START_RANKS_MASK
+from board_protocol import encode_reed_frame, decode_binary_frame, reed_to_bitboard, bitboard_to_reed
+from frame_decoder import FrameDecoder
+from chess_position import Position, SQUARE_NAMES, move_to_uci, uci_to_move
+from move_recognizer import MoveRecognizer, SignatureCache, RESULT_MOVE
+from scheduler import TimerScheduler
+from clock import SimulatedClock
+from event_bus import EventBus
+from lichess_stream import NdjsonStream
+from fake_lichess import FakeLichess
+from move_log import MoveLog
+from move_submitter import MoveSubmitter
+from game_playback import physical_steps
+
+
+def start_position_reed():
+    """Zwraca stan przełączników Reed dla figur ustawionych w pozycji startowej."""
+    return bitboard_to_reed(START_RANKS_MASK)
+
+
+def percentile(values, pct):
+    """Zwraca percentyl z listy wartości (metoda najbliższej rangi)."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    """Zwraca słownik ze statystykami opóźnień w milisekundach."""
+    ms = [v * 1000.0 for v in values]
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms) if ms else float('nan'),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms) if ms else float('nan'),
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _read_line(sock, pending):
+    """Czyta jedną linię zakończoną '\\n' z gniazda. Zwraca (linia, reszta)."""
+    while b'\n' not in pending:
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionError("Serwer zamknął połączenie")
+        pending += data
+    line, _, rest = pending.partition(b'\n')
+    return line, rest
+
+
+def _simulated_board(host, port, board_id, frames, interval, latencies, errors):
+    """Symulowana szachownica wysyłająca heartbeaty i mierząca czas odpowiedzi."""
+    reed = start_position_reed()
+    payload = json.dumps({
+        "type": "reed_state",
+        "event": "heartbeat",
+        "board": board_id,
+        "data": reed
+    }).encode() + b'\n'
+
+    try:
+        with socket.create_connection((host, port), timeout=2.0) as sock:
+            pending = b""
+            for _ in range(frames):
+                started = time.perf_counter()
+                sock.sendall(payload)
+                _, pending = _read_line(sock, pending)
+                latencies.append(time.perf_counter() - started)
+                time.sleep(interval)
+    except (OSError, ConnectionError):
+        errors.append(board_id)
+
+
+def bench_multi_board(board_counts, frames=40, interval=0.05, use_asyncio=True):
+    """Mierzy opóźnienie odpowiedzi serwera przy N jednocześnie podłączonych szachownicach."""
+    results = []
+    for boards in board_counts:
+        port = _free_port()
+        server = ChessServer(host='127.0.0.1', port=port, use_asyncio=use_asyncio)
+        server.start()
+        time.sleep(0.2)
+
+        latencies = []
+        errors = []
+        threads = [
+            threading.Thread(
+                target=_simulated_board,
+                args=('127.0.0.1', port, f"bench-{i}", frames, interval, latencies, errors)
+            )
+            for i in range(boards)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.stop()
+
+        stats = summarize(latencies)
+        stats.update({"boards": boards, "failed_boards": len(errors), "elapsed_s": elapsed})
+        results.append(stats)
+        print(f"{boards:4d} szachownic: p50={stats['p50_ms']:.2f} ms  p95={stats['p95_ms']:.2f} ms  "
+              f"max={stats['max_ms']:.2f} ms  ramek={stats['count']}  błędów={len(errors)}")
+    return results
+
+
+def _time_per_call(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def bench_protocol(repeat=20000):
+    """Porównuje rozmiar i koszt kodowania/dekodowania ramek JSON i binarnych."""
+    reed = start_position_reed()
+    envelope = {"type": "reed_state", "event": "heartbeat", "data": reed}
+
+    json_frame = json.dumps(envelope).encode() + b'\n'
+    binary_frame = encode_reed_frame(reed_to_bitboard(reed), "heartbeat", 1)
+
+    results = {
+        "json": {
+            "bytes": len(json_frame),
+            "encode_us": _time_per_call(lambda: json.dumps(envelope).encode(), repeat) * 1e6,
+            "decode_us": _time_per_call(lambda: json.loads(json_frame), repeat) * 1e6,
+        },
+        "bin1": {
+            "bytes": len(binary_frame),
+            "encode_us": _time_per_call(lambda: encode_reed_frame(reed_to_bitboard(reed), "heartbeat", 1),
+                                        repeat) * 1e6,
+            "decode_us": _time_per_call(lambda: decode_binary_frame(binary_frame), repeat) * 1e6,
+            "decode_to_dict_us": _time_per_call(lambda: bitboard_to_reed(decode_binary_frame(binary_frame)["occupancy"]),
+                                                repeat) * 1e6,
+        },
+    }
+
+    for name, stats in results.items():
+        details = "  ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in stats.items())
+        print(f"{name:5s} {details}")
+    # Heartbeat co 500 ms = 2 ramki/s
+    for name, stats in results.items():
+        print(f"{name:5s} pasmo heartbeatów: {stats['bytes'] * 2} B/s na szachownicę")
+    return results
+
+
+def _legacy_decode(chunks):
+    """Poprzedni sposób dekodowania: bufor bytes, zliczanie nawiasów, jedna ramka na recv."""
+    buffer = b""
+    frames = 0
+    for data in chunks:
+        buffer += data
+        json_start = buffer.find(b'{')
+        if json_start < 0:
+            continue
+        open_braces = 0
+        for i in range(json_start, len(buffer)):
+            if buffer[i] == ord('{'):
+                open_braces += 1
+            elif buffer[i] == ord('}'):
+                open_braces -= 1
+            if open_braces == 0:
+                buffer = buffer[i + 1:]
+                frames += 1
+                break
+    return frames
+
+
+def _stream_decode(chunks):
+    decoder = FrameDecoder()
+    frames = 0
+    for data in chunks:
+        decoder.feed(data)
+        frames += len(decoder.frames())
+    return frames
+
+
+def bench_decoder(frame_count=2000, chunk_size=1460):
+    """Porównuje dekodowanie zaległych ramek przez stary i strumieniowy dekoder."""
+    reed = start_position_reed()
+    frame = json.dumps({"type": "reed_state", "event": "heartbeat", "data": reed}).encode() + b'\n'
+    stream = frame * frame_count
+    # Dane przychodzą w porcjach wielkości segmentu TCP
+    chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+    results = {}
+    for name, decode in (("legacy", _legacy_decode), ("stream", _stream_decode)):
+        started = time.perf_counter()
+        decoded = decode(chunks)
+        elapsed = time.perf_counter() - started
+        results[name] = {"frames": decoded, "elapsed_ms": elapsed * 1000.0, "recv_calls": len(chunks)}
+        print(f"{name:7s} ramek zdekodowanych={decoded}/{frame_count}  czas={elapsed * 1000.0:.2f} ms  "
+              f"wywołań recv={len(chunks)}")
+    return results
+
+
+def _sample_positions(games, plies, seed=7):
+    """Zwraca listę (pozycja, ruch) z losowych partii - powtarzalnie dla danego ziarna."""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(games):
+        position = Position()
+        for _ in range(plies):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            samples.append((position.copy(), move))
+            position.push(move)
+    return samples
+
+
+def _reed_changes(position, move):
+    """Zwraca zmiany Reed odpowiadające wykonaniu ruchu na szachownicy (z podniesieniem zbitej figury)."""
+    child = position.copy()
+    child.push(move)
+    before, after = position.occupancy, child.occupancy
+    changes = []
+    if before >> move[1] & 1 and after >> move[1] & 1:
+        # Bicie - zdjęcie i postawienie figury na polu docelowym
+        changes.append({"position": SQUARE_NAMES[move[1]], "from_state": 1, "to_state": 0})
+        changes.append({"position": SQUARE_NAMES[move[1]], "from_state": 0, "to_state": 1})
+    for square in range(64):
+        if (before ^ after) >> square & 1:
+            changes.append({"position": SQUARE_NAMES[square], "from_state": before >> square & 1,
+                            "to_state": after >> square & 1})
+    return changes
+
+
+def bench_recognizer(games=20, plies=60, rounds=3):
+    """Opóźnienie od zmiany Reed do werdyktu przy zimnej i ciepłej pamięci sygnatur ruchów."""
+    samples = _sample_positions(games, plies)
+    cases = [(position, move, _reed_changes(position, move)) for position, move in samples]
+    scheduler = TimerScheduler(name="bench-recognizer")  # Nieuruchomiony - ocena wywoływana bezpośrednio
+    cache = SignatureCache(maxsize=max(len(cases), 1))
+
+    results = {}
+    for name in ("cold", "warm"):
+        if name == "cold":
+            cache.clear()
+        hits, misses = cache.hits, cache.misses
+        latencies = []
+        errors = 0
+        for _ in range(rounds if name == "warm" else 1):
+            for position, move, changes in cases:
+                recognizer = MoveRecognizer(scheduler, lambda *args: None, position.occupancy)
+                started = time.perf_counter()
+                recognizer.arm(position, signatures=cache.signatures(position))
+                recognizer.feed(changes)
+                result, uci = recognizer.recognize()
+                latencies.append(time.perf_counter() - started)
+                recognizer.cancel()
+                if result != RESULT_MOVE:
+                    errors += 1
+        stats = summarize(latencies)
+        stats.update(errors=errors, hits=cache.hits - hits, misses=cache.misses - misses)
+        results[name] = stats
+        print(f"{name:5s} pozycji={stats['count']:5d}  p50={stats['p50_ms']:.3f} ms  p95={stats['p95_ms']:.3f} ms  "
+              f"p99={stats['p99_ms']:.3f} ms  błędy={errors}  trafienia={stats['hits']} chybienia={stats['misses']}")
+    return results
+
+
+def _stream_latencies(fake, moves, interval, per_event_sleep):
+    """Mierzy opóźnienie od dodania ruchu na serwerze do wywołania obsługi zdarzenia."""
+    game = fake.create_game()
+    latencies = []
+    seen = [0]
+    done = threading.Event()
+
+    def on_event(event):
+        state = event.get("state", event)
+        count = len(state.get("moves", "").split())
+        now = time.perf_counter()
+        for index in range(seen[0], count):
+            latencies.append(now - game.move_times[index])
+        seen[0] = max(seen[0], count)
+        if count >= moves or state.get("status", "started") != "started":
+            done.set()
+        if per_event_sleep:
+            # Dawna pętla: time.sleep(0.1) po każdym zdarzeniu
+            time.sleep(per_event_sleep)
+
+    stream = NdjsonStream(f"/api/board/game/stream/{game.game_id}", on_event, token="", base_url=fake.url)
+    thread = threading.Thread(target=stream.run, daemon=True)
+    thread.start()
+    while stream.connects == 0:
+        time.sleep(0.005)
+
+    rng = random.Random(11)
+    for _ in range(moves):
+        move = game.random_move(rng)
+        if move is None:
+            break
+        game.push_move(move)
+        time.sleep(interval)
+    done.wait(timeout=moves * 0.2 + 5)
+    stream.stop()
+    game.finish()
+    thread.join(timeout=2)
+    return latencies
+
+
+def bench_lichess_stream(moves=40, interval=0.05):
+    """Porównuje opóźnienie zdarzenie -> obsługa: dawna pętla ze sleep(0.1) vs strumień NDJSON."""
+    fake = FakeLichess().start()
+    results = {}
+    try:
+        for name, per_event_sleep in (("sleep", 0.1), ("stream", 0.0)):
+            stats = summarize(_stream_latencies(fake, moves, interval, per_event_sleep))
+            results[name] = stats
+            print(f"{name:6s} ruchów={stats['count']:4d}  p50={stats['p50_ms']:.2f} ms  "
+                  f"p95={stats['p95_ms']:.2f} ms  p99={stats['p99_ms']:.2f} ms  max={stats['max_ms']:.2f} ms")
+    finally:
+        fake.stop()
+    return results
+
+
+def _long_game(plies, seed=1):
+    """Zwraca listę ruchów UCI losowej partii o podanej długości (powtarzalnie)."""
+    while True:
+        rng = random.Random(seed)
+        position = Position()
+        moves = []
+        while len(moves) < plies:
+            legal = position.legal_moves()
+            if not legal:
+                break
+            move = rng.choice(legal)
+            position.push(move)
+            moves.append(move_to_uci(move))
+        if len(moves) == plies:
+            return moves
+        seed += 1
+
+
+def _legacy_move_tracking(states, player_color):
+    """Dawne przetwarzanie stanu: pełny podział zapisu, kopia listy, tura zgłaszana przy każdym zdarzeniu."""
+    last_moves = None
+    new_total = 0
+    my_turn_calls = 0
+    for moves_str in states:
+        current_moves = moves_str.strip().split()
+        if last_moves is not None and len(current_moves) > len(last_moves):
+            new_total += len(current_moves) - len(last_moves)
+        last_moves = current_moves.copy()
+        is_my_turn = (player_color == 'white' and len(current_moves) % 2 == 0) or \
+                     (player_color == 'black' and len(current_moves) % 2 == 1)
+        if is_my_turn:
+            my_turn_calls += 1
+    return new_total, my_turn_calls
+
+
+def _incremental_move_tracking(states, player_color):
+    """Przetwarzanie stanu z MoveLog: tylko nowy fragment zapisu, tura zgłaszana raz na półruch."""
+    log = MoveLog()
+    notified_ply = None
+    new_total = 0
+    my_turn_calls = 0
+    for moves_str in states:
+        _, new_moves = log.update(moves_str)
+        new_total += len(new_moves)
+        if log.is_turn(player_color) and notified_ply != len(log):
+            notified_ply = len(log)
+            my_turn_calls += 1
+    return new_total, my_turn_calls
+
+
+def bench_move_log(plies=300, repeat=20):
+    """Koszt śledzenia listy ruchów dla całej partii (każdy stan wysłany dwukrotnie, jak przy wznowieniu)."""
+    moves = _long_game(plies)
+    states = []
+    for ply in range(1, plies + 1):
+        moves_str = " ".join(moves[:ply])
+        states.extend((moves_str, moves_str))
+
+    results = {}
+    for name, track in (("legacy", _legacy_move_tracking), ("movelog", _incremental_move_tracking)):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            new_total, my_turn_calls = track(states, "white")
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[name] = {"game_ms": best * 1000.0, "event_us": best / len(states) * 1e6,
+                         "on_my_turn": my_turn_calls}
+        print(f"{name:8s} półruchów={plies}  zdarzeń={len(states)}  partia={best * 1000.0:.2f} ms  "
+              f"zdarzenie={best / len(states) * 1e6:.2f} us  wywołań on_my_turn={my_turn_calls}")
+    return results
+
+
+def _submit_latencies(fake, moves, persistent, seed=3):
+    """Gra partię na serwerze testowym, wysyłając ruchy białych przez MoveSubmitter; zwraca jego metryki."""
+    game = fake.create_game()
+    rng = random.Random(seed)
+    log = MoveLog()
+    changed = threading.Condition()
+    submitter = MoveSubmitter(game.game_id, lambda: log.moves, token=None, base_url=fake.url,
+                              persistent=persistent)
+
+    def on_event(event):
+        state = event.get("state", event)
+        with changed:
+            log.update(state.get("moves", ""))
+            submitter.notify_moves(log.moves)
+            changed.notify_all()
+
+    stream = NdjsonStream(f"/api/board/game/stream/{game.game_id}", on_event, token=None,
+                          base_url=fake.url, name="bench-submit")
+    thread = threading.Thread(target=stream.run, daemon=True)
+    thread.start()
+    submitter.start()
+
+    try:
+        for _ in range(moves):
+            uci = game.random_move(rng)
+            if uci is None:
+                break
+            with changed:
+                ply = len(log)
+                submitter.submit(uci, ply)
+                if not changed.wait_for(lambda: len(log) > ply, timeout=5.0):
+                    break
+
+            # Odpowiedź przeciwnika
+            reply = game.random_move(rng)
+            if reply is None:
+                break
+            game.push_move(reply)
+            with changed:
+                changed.wait_for(lambda: len(log) > ply + 1, timeout=5.0)
+    finally:
+        submitter.stop()
+        stream.stop()
+        thread.join(timeout=1.0)
+    return submitter.metrics()
+
+
+def bench_submit(moves=40):
+    """Czas wysłania ruchu do potwierdzenia w strumieniu: nowe połączenie na ruch vs utrzymywane połączenie."""
+    fake = FakeLichess().start()
+    results = {}
+    try:
+        for name, persistent in (("per_request", False), ("persistent", True)):
+            metrics = _submit_latencies(fake, moves, persistent)
+            results[name] = metrics
+            stages = "  ".join(f"{stage}: p50={metrics[stage]['p50_ms']:.2f} p95={metrics[stage]['p95_ms']:.2f} ms"
+                               for stage in ("queue_wait", "request", "stream_ack", "submit_to_ack")
+                               if metrics[stage]["count"])
+            print(f"{name:11s} ruchów={metrics['submitted']:3d}  ponowień={metrics['retries']}  {stages}")
+    finally:
+        fake.stop()
+    return results
+
+
+class _BenchLichessClient:
+    """Zastępuje LichessClient - zapisuje czas wywołania make_move."""
+
+    def __init__(self):
+        self.moves = []
+        self.condition = threading.Condition()
+
+    def make_move(self, move):
+        with self.condition:
+            self.moves.append((move, time.perf_counter()))
+            self.condition.notify_all()
+        return True
+
+    def wait_move(self, count, timeout):
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.moves) >= count, timeout=timeout):
+                raise TimeoutError("Brak wywołania make_move")
+            return self.moves[count - 1]
+
+
+class _BenchBoard:
+    """Szachownica podłączona do serwera przez gniazdo - wysyła stan Reed i zapisuje odebrane ramki LED."""
+
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port), timeout=5.0)
+        self.frames = []  # (czas odebrania, wiadomość)
+        self.condition = threading.Condition()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def send(self, occupancy, event="reed_change"):
+        """Wysyła ramkę stanu Reed. Zwraca czas wysłania."""
+        payload = json.dumps({"type": "reed_state", "event": event, "data": bitboard_to_reed(occupancy)})
+        sent_at = time.perf_counter()
+        self.sock.sendall(payload.encode() + b'\n')
+        return sent_at
+
+    def wait_frame(self, predicate, after, timeout):
+        """Czeka na ramkę LED odebraną po czasie after, dla której predicate(leds) jest prawdziwe."""
+        def find():
+            return next((received for received, message in self.frames
+                         if received >= after and predicate(message.get("leds", []))), None)
+
+        with self.condition:
+            if not self.condition.wait_for(lambda: find() is not None, timeout=timeout):
+                raise TimeoutError("Brak oczekiwanej ramki LED")
+            return find()
+
+    def close(self):
+        self.sock.close()
+
+    def _read(self):
+        pending = b""
+        try:
+            while True:
+                line, pending = _read_line(self.sock, pending)
+                message = json.loads(line)
+                with self.condition:
+                    self.frames.append((time.perf_counter(), message))
+                    self.condition.notify_all()
+        except (OSError, ConnectionError, ValueError):
+            pass
+
+
+def _play_physical(board, position, move, step_interval):
+    """Odtwarza ruch na szachownicy. Zwraca czas wysłania ostatniej ramki."""
+    sent_at = None
+    for occupancy in physical_steps(position, move):
+        sent_at = board.send(occupancy)
+        time.sleep(step_interval)
+    return sent_at
+
+
+def _wait_until(predicate, timeout, interval=0.001):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Przekroczono czas oczekiwania")
+        time.sleep(interval)
+
+
+def _end_to_end_game(moves, settle_delay, step_interval, stages):
+    """
+    Rozgrywa partię (gracz białymi) przez ChessServer i ChessMoveHandler, dopisując czasy etapów.
+
+    Zwraca liczbę ruchów gracza, dla których nie odnotowano callbacku po ostatniej ramce Reed.
+    """
+    port = _free_port()
+    failures = 0
+    reed_calls = []
+    handler = None
+
+    def on_reed_change(changes):
+        reed_calls.append(time.perf_counter())
+        handler.handle_reed_change(changes)
+
+    server = ChessServer(host='127.0.0.1', port=port, on_reed_change=on_reed_change)
+    server.start()
+    time.sleep(0.1)
+    board = _BenchBoard('127.0.0.1', port)
+    client = _BenchLichessClient()
+
+    try:
+        position = Position()
+        board.send(position.occupancy, "heartbeat")
+        _wait_until(lambda: server.occupancy == position.occupancy, 2.0)
+        server.set_game_mode(True)
+        handler = ChessMoveHandler(server, client, settle_delay=settle_delay)
+        handler.set_player_turn(True)
+        timeout = settle_delay + 2.0
+
+        for ply, uci in enumerate(moves):
+            move = uci_to_move(uci)
+            if ply % 2 == 0:
+                # Ruch gracza: przełączniki Reed -> serwer -> rozpoznanie -> make_move
+                _wait_until(lambda: handler.is_player_turn and handler.recognizer.armed, timeout)
+                placed_at = _play_physical(board, position, move, step_interval)
+                made, called_at = client.wait_move(ply // 2 + 1, timeout)
+                if made != uci:
+                    raise RuntimeError(f"Rozpoznano {made} zamiast {uci}")
+                callback_at = min((t for t in reed_calls if t >= placed_at), default=None)
+                if callback_at is None:
+                    failures += 1
+                else:
+                    stages["reed_to_callback"].append(callback_at - placed_at)
+                    stages["callback_to_make_move"].append(called_at - callback_at)
+                stages["reed_to_make_move"].append(called_at - placed_at)
+                position.push(move)
+                handler.sync_moves(moves[:ply + 1])
+            else:
+                # Ruch przeciwnika: Lichess -> diody na szachownicy -> ruch ręką -> zgaszenie diod
+                source = WIRING.led_for_position(uci[:2])
+                target = WIRING.led_for_position(uci[2:4])
+                announced_at = time.perf_counter()
+                handler.sync_moves(moves[:ply + 1])
+                handler.handle_opponent_move(uci)
+                lit_at = board.wait_frame(
+                    lambda leds: {source, target} <= {led["led"] for led in leds if led["color"] == COLOR_GREEN},
+                    announced_at, timeout)
+                stages["opponent_to_led"].append(lit_at - announced_at)
+
+                placed_at = _play_physical(board, position, move, step_interval)
+                cleared_at = board.wait_frame(lambda leds: not leds, placed_at, timeout)
+                stages["opponent_reed_to_clear"].append(cleared_at - placed_at)
+                position.push(move)
+    finally:
+        if handler:
+            handler.stop()
+        board.close()
+        server.stop()
+    return failures
+
+
+def bench_end_to_end(games=1, plies=40, settle_delay=MOVE_SETTLE_DELAY, step_interval=0.01, output=None):
+    """
+    Opóźnienia pełnej ścieżki ruchu w kolejnych etapach (p50/p95/p99).
+
+    Ruch gracza: ostatnia ramka Reed -> callback serwera -> rozpoznanie (z oknem settle_delay)
+    -> make_move. Ruch przeciwnika: zgłoszenie ruchu -> ramka z zielonymi diodami -> ruch ręką
+    -> ramka ze zgaszonymi diodami. Wyniki można zapisać jako JSON (output).
+    """
+    stages = {name: [] for name in ("reed_to_callback", "callback_to_make_move", "reed_to_make_move",
+                                    "opponent_to_led", "opponent_reed_to_clear")}
+    failures = 0
+    for game in range(games):
+        moves = _long_game(plies, seed=game + 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            failures += _end_to_end_game(moves, settle_delay, step_interval, stages)
+
+    results = {
+        "benchmark": "end_to_end",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {"games": games, "plies": plies, "settle_delay_s": settle_delay,
+                   "step_interval_s": step_interval},
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "failures": failures,
+    }
+    for name, stats in results["stages"].items():
+        print(f"{name:24s} n={stats['count']:4d}  p50={stats['p50_ms']:8.2f} ms  p95={stats['p95_ms']:8.2f} ms  "
+              f"p99={stats['p99_ms']:8.2f} ms  max={stats['max_ms']:8.2f} ms")
+    print(f"Ruchy gracza bez callbacku po ostatniej ramce Reed: {failures}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Zapisano wyniki: {output}")
+    return results
+
+
+def _virtual_game(moves, settle_delay, step_interval):
+    """
+    Rozgrywa partię przez ChessServer i ChessMoveHandler w czasie wirtualnym (bez gniazd i wątków).
+
+    Zwraca czas wirtualny partii (s). Zgłasza RuntimeError, gdy ruch nie został rozpoznany
+    lub diody ruchu przeciwnika nie zostały zapalone i zgaszone.
+    """
+    clock = SimulatedClock()
+    handler = None
+
+    def on_reed_change(changes):
+        handler.handle_reed_change(changes)
+
+    server = ChessServer(on_reed_change=on_reed_change, event_bus=EventBus(inline=True), clock=clock)
+    server.scheduler.start()
+    server.event_bus.start()
+    frames = []
+    server.session.attach(lambda data: frames.append(json.loads(data)))
+    client = _BenchLichessClient()
+
+    def play(position, move):
+        for occupancy in physical_steps(position, move):
+            server.session.handle_message({"type": "reed_state", "event": "reed_change", "occupancy": occupancy})
+            clock.advance(step_interval)
+        clock.run_until_idle()
+
+    try:
+        position = Position()
+        server.session.handle_message({"type": "reed_state", "event": "heartbeat", "occupancy": position.occupancy})
+        server.set_game_mode(True)
+        handler = ChessMoveHandler(server, client, settle_delay=settle_delay, clock=clock)
+        handler.set_player_turn(True)
+        clock.run_until_idle()
+
+        for ply, uci in enumerate(moves):
+            move = uci_to_move(uci)
+            if ply % 2 == 0:
+                play(position, move)
+                # Figury promocji nie da się odczytać z czujników - porównaj tylko pola ruchu
+                if len(client.moves) != ply // 2 + 1 or client.moves[-1][0][:4] != uci[:4]:
+                    raise RuntimeError(f"Nie rozpoznano ruchu gracza {uci} (półruch {ply})")
+            else:
+                handler.sync_moves(moves[:ply + 1])
+                handler.handle_opponent_move(uci)
+                clock.run_until_idle()
+                source = WIRING.led_for_position(uci[:2])
+                target = WIRING.led_for_position(uci[2:4])
+                leds = frames[-1].get("leds", [])
+                if not {source, target} <= {led["led"] for led in leds if led["color"] == COLOR_GREEN}:
+                    raise RuntimeError(f"Brak diod ruchu przeciwnika {uci}")
+                play(position, move)
+                if frames[-1].get("leds"):
+                    raise RuntimeError(f"Diody nie zgasły po ruchu przeciwnika {uci}")
+            position.push(move)
+            if ply % 2 == 0:
+                handler.sync_moves(moves[:ply + 1])
+                clock.run_until_idle()
+        return clock.now()
+    finally:
+        if handler:
+            handler.stop()
+        server.stop()
+
+
+def bench_virtual_games(games=100, plies=40, settle_delay=MOVE_SETTLE_DELAY, step_interval=0.3):
+    """
+    Przepustowość partii rozgrywanych w czasie wirtualnym (clock.SimulatedClock).
+
+    Terminy rozpoznawania ruchu i wypychania LED mijają natychmiast, więc czas
+    rzeczywisty zależy tylko od kosztu logiki serwera i obsługi ruchów.
+    """
+    virtual_time = 0.0
+    failed = 0
+    started = time.perf_counter()
+    for game in range(games):
+        moves = _long_game(plies, seed=game + 1)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                virtual_time += _virtual_game(moves, settle_delay, step_interval)
+        except RuntimeError as e:
+            failed += 1
+            print(f"Partia {game + 1}: {e}")
+    elapsed = time.perf_counter() - started
+
+    print(f"Partii: {games} po {plies} półruchów, błędów: {failed}")
+    print(f"Czas rzeczywisty: {elapsed:.2f} s ({games / elapsed * 60.0:.0f} partii/min), "
+          f"czas wirtualny: {virtual_time:.0f} s (x{virtual_time / elapsed:.0f})")
+    return {"games": games, "failed": failed, "elapsed_s": elapsed, "virtual_s": virtual_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pomiary wydajności serwera szachownicy")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    multi = subparsers.add_parser("multi_board", help="opóźnienie przy wielu szachownicach")
+    multi.add_argument("--boards", type=int, nargs="+", default=[1, 4, 12, 24])
+    multi.add_argument("--frames", type=int, default=40)
+    multi.add_argument("--interval", type=float, default=0.05)
+    multi.add_argument("--threaded", action="store_true", help="użyj serwera wątkowego (jedna szachownica)")
+
+    protocol = subparsers.add_parser("protocol", help="rozmiar i koszt ramek JSON vs binarnych")
+    protocol.add_argument("--repeat", type=int, default=20000)
+
+    decoder = subparsers.add_parser("decoder", help="dekodowanie zaległych ramek w strumieniu")
+    decoder.add_argument("--frames", type=int, default=2000)
+    decoder.add_argument("--chunk", type=int, default=1460)
+
+    recognizer = subparsers.add_parser("recognizer", help="rozpoznawanie ruchu z zimną i ciepłą pamięcią")
+    recognizer.add_argument("--games", type=int, default=20)
+    recognizer.add_argument("--plies", type=int, default=60)
+
+    lichess = subparsers.add_parser("lichess_stream", help="opóźnienie strumienia stanu partii Lichess")
+    lichess.add_argument("--moves", type=int, default=40)
+    lichess.add_argument("--interval", type=float, default=0.05, help="odstęp między ruchami (s)")
+
+    move_log = subparsers.add_parser("move_log", help="śledzenie listy ruchów w długiej partii")
+    move_log.add_argument("--plies", type=int, default=300)
+
+    submit = subparsers.add_parser("submit", help="wysyłanie ruchów do potwierdzenia w strumieniu partii")
+    submit.add_argument("--moves", type=int, default=40)
+
+    end_to_end = subparsers.add_parser("end_to_end", help="pełna ścieżka ruchu: Reed -> make_move i Lichess -> diody")
+    end_to_end.add_argument("--games", type=int, default=1)
+    end_to_end.add_argument("--plies", type=int, default=40)
+    end_to_end.add_argument("--settle", type=float, default=MOVE_SETTLE_DELAY, help="okno stabilizacji Reed (s)")
+    end_to_end.add_argument("--step", type=float, default=0.01, help="odstęp między ramkami ruchu ręką (s)")
+    end_to_end.add_argument("--json", dest="output", help="zapisz wyniki do pliku JSON")
+
+    virtual = subparsers.add_parser("virtual_games", help="partie rozgrywane w czasie wirtualnym")
+    virtual.add_argument("--games", type=int, default=100)
+    virtual.add_argument("--plies", type=int, default=40)
+    virtual.add_argument("--settle", type=float, default=MOVE_SETTLE_DELAY, help="okno stabilizacji Reed (s)")
+    virtual.add_argument("--step", type=float, default=0.3, help="odstęp między ramkami ruchu ręką (s)")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "virtual_games":
+        bench_virtual_games(args.games, args.plies, args.settle, args.step)
+    elif args.benchmark == "end_to_end":
+        bench_end_to_end(args.games, args.plies, args.settle, args.step, args.output)
+    elif args.benchmark == "submit":
+        bench_submit(args.moves)
+    elif args.benchmark == "move_log":
+        bench_move_log(args.plies)
+    elif args.benchmark == "lichess_stream":
+        bench_lichess_stream(args.moves, args.interval)
+    elif args.benchmark == "recognizer":
+        bench_recognizer(args.games, args.plies)
+    elif args.benchmark == "decoder":
+        bench_decoder(args.frames, args.chunk)
+    elif args.benchmark == "protocol":
+        bench_protocol(args.repeat)
+    elif args.benchmark == "multi_board":
+        print(f"Serwer: {'wątkowy' if args.threaded else 'asyncio'}")
+        bench_multi_board(args.boards, args.frames, args.interval, use_asyncio=not args.threaded)
+
+
+if __name__ == "__main__":
+    main()
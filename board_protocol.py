@@ -0,0 +1,257 @@
+# board_protocol.py
+"""
+Protokół komunikacji szachownica (ESP32) <-> serwer.
+
+Obsługiwane są dwa formaty ramek od szachownicy:
+- JSON (stare oprogramowanie): {"type": "reed_state", "event": ..., "data": {"MCP1": {"PA": {...}}}}
+- binarny "bin1": 13 bajtów - nagłówek i 64-bitowa mapa zajętości pól (bitboard)
+
+Format binarny jest negocjowany: szachownica wysyła
+    {"type": "hello", "protocols": ["bin1", "json"]}
+a serwer odpowiada {"type": "hello", "protocol": "bin1"}. Dopiero wtedy szachownica
+zaczyna wysyłać ramki binarne. Odpowiedzi serwera pozostają w formacie JSON.
+
+Ramka binarna (big-endian):
+    bajt 0     MAGIC (0xB5)
+    bajt 1     typ ramki (FRAME_REED_STATE lub FRAME_LED_ACK)
+    bajt 2     kod zdarzenia (EVENT_CODES) lub flagi potwierdzenia (ACK_FLAG_GAP)
+    bajty 3-4  numer sekwencyjny ramki (dla FRAME_LED_ACK - potwierdzany numer ramki LED)
+    bajty 5-12 bitboard zajętości, bit n = pole n (a1 = 0, b1 = 1, ..., h8 = 63)
+
+Tryb delta LED (cecha "led_delta" w hello) zastępuje pełną listę "leds" ramkami
+    {"seq": 7, "base": 6, "d": [[led, kolor, miganie], ...], "status": "..."}
+zawierającymi tylko diody zmienione od poprzedniej ramki (kolor 0 = dioda wyłączona).
+Ramka kluczowa {"seq": 8, "key": 1, "d": [...], "status": "..."} przesyła pełny stan.
+Szachownica potwierdza ramki przez {"type": "led_ack", "seq": 7} (lub FRAME_LED_ACK),
+a po wykryciu luki (base różne od ostatnio zastosowanej ramki) wysyła "gap": true -
+serwer odpowiada wtedy ramką kluczową.
+"""
+import json
+import struct
+
+from config import WIRING, COLOR_RED, COLOR_GREEN, COLOR_YELLOW, COLOR_ORANGE
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "bin1"
+SUPPORTED_PROTOCOLS = (PROTOCOL_BINARY, PROTOCOL_JSON)
+
+FEATURE_LED_DELTA = "led_delta"
+SUPPORTED_FEATURES = (FEATURE_LED_DELTA,)
+
+MAGIC = 0xB5
+FRAME_REED_STATE = 0x01
+FRAME_LED_ACK = 0x02
+ACK_FLAG_GAP = 0x01
+
+BINARY_FRAME = struct.Struct(">BBBHQ")
+BINARY_FRAME_SIZE = BINARY_FRAME.size
+
+# Kody zdarzeń przesyłanych w ramce binarnej
+EVENT_CODES = {
+    "unknown": 0,
+    "heartbeat": 1,
+    "reed_change": 2,
+    "phase_change": 3,
+    "state_change": 4,
+    "status_change": 5,
+    "important_event": 6,
+}
+EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+
+# Zdarzenia wysyłane przez oprogramowanie ESP32 (arduino.txt) i ich odpowiedniki w serwerze
+FIRMWARE_EVENT_ALIASES = {
+    "state_change": "reed_change",
+    "important_event": "reed_change",
+    "status_change": "phase_change",
+}
+
+# Indeksy kolorów w ramkach delta LED (0 = dioda wyłączona)
+COLOR_OFF_INDEX = 0
+COLOR_INDEX = {COLOR_RED: 1, COLOR_GREEN: 2, COLOR_YELLOW: 3, COLOR_ORANGE: 4}
+COLOR_NAMES = {index: color for color, index in COLOR_INDEX.items()}
+
+# Po tylu niepotwierdzonych ramkach delta serwer wysyła ramkę kluczową
+MAX_UNACKED_LED_FRAMES = 16
+
+
+def reed_to_bitboard(reed_data, wiring=WIRING):
+    """Zamienia zagnieżdżony słownik stanów Reed na 64-bitową mapę zajętości."""
+    bitboard = 0
+    for mcp_name, port_name, pin_name, square in wiring.pins:
+        if reed_data.get(mcp_name, {}).get(port_name, {}).get(pin_name, 0):
+            bitboard |= 1 << square
+    return bitboard
+
+
+def bitboard_to_reed(bitboard, wiring=WIRING):
+    """Zamienia 64-bitową mapę zajętości na zagnieżdżony słownik stanów Reed."""
+    reed_data = {}
+    for mcp_name, port_name, pin_name, square in wiring.pins:
+        reed_data.setdefault(mcp_name, {}).setdefault(port_name, {})[pin_name] = (bitboard >> square) & 1
+    return reed_data
+
+
+def encode_reed_frame(bitboard, event="heartbeat", seq=0):
+    """Koduje binarną ramkę stanu Reed."""
+    return BINARY_FRAME.pack(MAGIC, FRAME_REED_STATE, EVENT_CODES.get(event, 0), seq & 0xFFFF, bitboard)
+
+
+def encode_led_ack(seq, gap=False):
+    """Koduje binarne potwierdzenie ramki LED."""
+    return BINARY_FRAME.pack(MAGIC, FRAME_LED_ACK, ACK_FLAG_GAP if gap else 0, seq & 0xFFFF, 0)
+
+
+def decode_binary_frame(frame):
+    """Dekoduje binarną ramkę do wiadomości w postaci słownika. Zgłasza ValueError dla uszkodzonej ramki."""
+    if len(frame) != BINARY_FRAME_SIZE:
+        raise ValueError(f"Nieprawidłowa długość ramki binarnej: {len(frame)} B zamiast {BINARY_FRAME_SIZE} B")
+    magic, frame_type, event_code, seq, bitboard = BINARY_FRAME.unpack(frame)
+    if magic != MAGIC:
+        raise ValueError("Nieprawidłowy bajt początkowy ramki binarnej")
+    if frame_type == FRAME_REED_STATE:
+        return {
+            "type": "reed_state",
+            "event": EVENT_NAMES.get(event_code, "unknown"),
+            "seq": seq,
+            "occupancy": bitboard,
+        }
+    if frame_type == FRAME_LED_ACK:
+        return {"type": "led_ack", "seq": seq, "gap": bool(event_code & ACK_FLAG_GAP)}
+    raise ValueError(f"Nieznana ramka binarna: typ {frame_type}")
+
+
+def encode_hello(protocols=SUPPORTED_PROTOCOLS, board_id=None, features=()):
+    """Koduje wiadomość negocjacji protokołu wysyłaną przez szachownicę."""
+    message = {"type": "hello", "protocols": list(protocols)}
+    if features:
+        message["features"] = list(features)
+    if board_id is not None:
+        message["board"] = board_id
+    return json.dumps(message).encode() + b'\n'
+
+
+def choose_features(offered):
+    """Zwraca cechy protokołu obsługiwane zarówno przez szachownicę, jak i serwer."""
+    return [feature for feature in SUPPORTED_FEATURES if feature in (offered or [])]
+
+
+def choose_protocol(offered):
+    """Wybiera najlepszy protokół spośród zaproponowanych przez szachownicę."""
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in (offered or []):
+            return protocol
+    return PROTOCOL_JSON
+
+
+def is_binary_frame(frame):
+    """Sprawdza, czy ramka jest w formacie binarnym."""
+    return len(frame) > 0 and frame[0] == MAGIC
+
+
+def led_table(leds_with_colors):
+    """Zamienia listę diod {"led", "color", "blink"} na słownik {led: (indeks_koloru, miganie)}."""
+    table = {}
+    for led_info in leds_with_colors:
+        color_index = COLOR_INDEX.get(led_info["color"], COLOR_OFF_INDEX)
+        if color_index != COLOR_OFF_INDEX:
+            table[led_info["led"]] = (color_index, 1 if led_info.get("blink", False) else 0)
+    return table
+
+
+class LedDeltaEncoder:
+    """Koduje stan LED jako ramki delta względem stanu ostatnio wysłanego do szachownicy."""
+
+    def __init__(self, max_unacked=MAX_UNACKED_LED_FRAMES):
+        self.max_unacked = max_unacked
+        self.seq = 0
+        self.acked_seq = 0
+        self.table = {}
+        self.status = None
+        self.need_keyframe = True
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+
+    def encode(self, leds_with_colors, status):
+        """Zwraca ramkę (słownik) z różnicą stanu LED lub ramkę kluczową."""
+        table = led_table(leds_with_colors)
+        previous_seq = self.seq
+        self.seq = (self.seq + 1) & 0xFFFF
+        unacked = (previous_seq - self.acked_seq) & 0xFFFF
+
+        if self.need_keyframe or unacked >= self.max_unacked:
+            message = {
+                "seq": self.seq,
+                "key": 1,
+                "d": [[led, color, blink] for led, (color, blink) in sorted(table.items())],
+                "status": status,
+            }
+            self.need_keyframe = False
+            self.keyframes_sent += 1
+        else:
+            delta = []
+            for led, value in table.items():
+                if self.table.get(led) != value:
+                    delta.append([led, value[0], value[1]])
+            for led in self.table:
+                if led not in table:
+                    delta.append([led, COLOR_OFF_INDEX, 0])
+            message = {"seq": self.seq, "base": previous_seq, "d": delta}
+            if status != self.status:
+                message["status"] = status
+            self.deltas_sent += 1
+
+        self.table = table
+        self.status = status
+        return message
+
+    def is_unchanged(self, leds_with_colors, status):
+        """Sprawdza, czy stan LED i status są takie same jak ostatnio wysłane."""
+        return not self.need_keyframe and led_table(leds_with_colors) == self.table and status == self.status
+
+    def acknowledge(self, seq, gap=False):
+        """Przetwarza potwierdzenie od szachownicy. Luka wymusza ramkę kluczową."""
+        ahead = (seq - self.acked_seq) & 0xFFFF
+        in_flight = (self.seq - self.acked_seq) & 0xFFFF
+        if gap or ahead > in_flight:
+            self.need_keyframe = True
+        else:
+            self.acked_seq = seq
+
+
+class LedDeltaDecoder:
+    """Odtwarza stan LED po stronie szachownicy z ramek delta i ramek kluczowych."""
+
+    def __init__(self):
+        self.seq = None
+        self.table = {}
+        self.status = None
+
+    def apply(self, message):
+        """
+        Stosuje ramkę LED. Zwraca krotkę (zastosowano, luka).
+
+        Ramka delta, której "base" nie odpowiada ostatnio zastosowanej ramce,
+        jest odrzucana i zgłaszana jako luka.
+        """
+        if message.get("key"):
+            self.table = {led: (color, blink) for led, color, blink in message.get("d", [])}
+        elif self.seq is None or message.get("base") != self.seq:
+            return False, True
+        else:
+            for led, color, blink in message.get("d", []):
+                if color == COLOR_OFF_INDEX:
+                    self.table.pop(led, None)
+                else:
+                    self.table[led] = (color, blink)
+
+        self.seq = message.get("seq")
+        if "status" in message:
+            self.status = message["status"]
+        return True, False
+
+    def leds(self):
+        """Zwraca stan diod w formacie listy {"led", "color", "blink"}."""
+        return [
+            {"led": led, "color": COLOR_NAMES.get(color, "off"), "blink": bool(blink)}
+            for led, (color, blink) in self.table.items()
+        ]
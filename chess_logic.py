@@ -1,16 +1,51 @@
 # chess_logic.py
-import time
-from config import MAPPING, LED_TO_CHESS, COLOR_RED, COLOR_YELLOW, COLOR_ORANGE
+from config import WIRING, COLOR_RED, COLOR_YELLOW, COLOR_ORANGE
+from board_protocol import reed_to_bitboard
+from clock import SYSTEM_CLOCK
 
-# Przechowuje stan pulsacji (dla efektu migania)
-pulse_state = False
-last_pulse_change = time.time()
+# Okres przełączania koloru pulsujących diod (s)
+PULSE_INTERVAL = 0.2
 
+# Maski pól: linie startowe (1,2,7,8) i pola środkowe (linie 3,4,5,6)
+START_RANKS_MASK = 0xFFFF00000000FFFF
+MIDDLE_RANKS_MASK = 0x0000FFFFFFFF0000
 
-def process_data(reed_data):
+
+class LedPulse:
+    """Faza pulsowania diod jednej szachownicy (efekt migania), liczona według zegara clock."""
+
+    def __init__(self, clock=SYSTEM_CLOCK, interval=PULSE_INTERVAL):
+        self.clock = clock
+        self.interval = interval
+        self.state = False
+        self.last_change = clock.now()
+
+    def color(self):
+        """Przełącza fazę co interval s i zwraca aktualny kolor pulsowania."""
+        now = self.clock.now()
+        if now - self.last_change > self.interval:
+            self.state = not self.state
+            self.last_change = now
+        return COLOR_YELLOW if self.state else COLOR_ORANGE
+
+
+# Faza pulsowania dla wywołań bez własnego LedPulse (process_data) - jak dawny globalny stan pulsacji
+_DEFAULT_PULSE = LedPulse()
+
+
+def _leds_for_squares(bitboard, color, square_to_led):
+    """Zwraca listę diod dla wszystkich pól zaznaczonych w bitboardzie."""
+    leds = []
+    while bitboard:
+        lowest = bitboard & -bitboard
+        leds.append({"led": square_to_led[lowest.bit_length() - 1], "color": color})
+        bitboard ^= lowest
+    return leds
+
+
+def process_occupancy(occupancy, wiring=WIRING, pulse=None):
     """
-    Przetwarza dane z przełączników Reeda i zwraca informacje o tym,
-    które diody należy zapalić i w jakim kolorze.
+    Zwraca diody do zapalenia na podstawie 64-bitowej mapy zajętości pól.
 
     Logika:
     - Pola startowe (linie 1,2,7,8):
@@ -19,68 +54,57 @@ def process_data(reed_data):
     - Pola środkowe (linie 3,4,5,6):
       - Jeśli figura obecna: dioda CZERWONA
       - Jeśli brak figury: dioda WYŁĄCZONA
+
+    pulse (LedPulse) to faza pulsowania szachownicy - bez niej dioda świeci pomarańczowo.
     """
-    global pulse_state, last_pulse_change
+    pulse_color = pulse.color() if pulse else COLOR_ORANGE
+    return _occupancy_leds(occupancy, ~0, wiring, pulse_color)
+
 
-    current_time = time.time()
-    if current_time - last_pulse_change > 0.2:
-        pulse_state = not pulse_state
-        last_pulse_change = current_time
+def _occupancy_leds(occupancy, reported, wiring, pulse_color):
+    """Diody dla pól zaznaczonych w masce reported (pola, których stan jest znany)."""
+    missing = START_RANKS_MASK & reported & ~occupancy
+    misplaced = MIDDLE_RANKS_MASK & reported & occupancy
+    return (_leds_for_squares(missing, pulse_color, wiring.square_to_led) +
+            _leds_for_squares(misplaced, COLOR_RED, wiring.square_to_led))
 
-    # Kolor dla pulsacji
-    pulse_color = COLOR_YELLOW if pulse_state else COLOR_ORANGE
 
-    # Lista diod z informacją o kolorze
-    leds_with_colors = []
+def is_occupancy_ready(occupancy):
+    """
+    Sprawdza czy szachownica jest gotowa do gry na podstawie mapy zajętości.
+
+    Szachownica jest gotowa gdy figury stoją dokładnie na liniach startowych (1,2,7,8).
+    """
+    return occupancy == START_RANKS_MASK
 
-    for mcp_name, ports in reed_data.items():
-        for port_name, pins in ports.items():
-            for pin_name, state in pins.items():
-                led_num = MAPPING[mcp_name][port_name][pin_name]
 
-                if led_num in LED_TO_CHESS:
-                    chess_pos = LED_TO_CHESS[led_num]
-                    rank = chess_pos[1]  # Numer linii (1-8)
+def _reported_squares(reed_data, wiring):
+    """Maska pól, których przełączniki występują w słowniku stanów Reed (może być niepełny)."""
+    reported = 0
+    for mcp_name, port_name, pin_name, square in wiring.pins:
+        if pin_name in reed_data.get(mcp_name, {}).get(port_name, {}):
+            reported |= 1 << square
+    return reported
 
-                    # Linie początkowe (1,2,7,8)
-                    if rank in ['1', '2', '7', '8']:
-                        if state == 0:  # Brak figury, pulsowanie
-                            leds_with_colors.append({"led": led_num, "color": pulse_color})
-                        # Jeśli figura jest obecna, nie dodajemy LED (pozostaje wyłączony)
 
-                    # Linie środkowe (3,4,5,6)
-                    elif rank in ['3', '4', '5', '6'] and state == 1:  # Figura na środku
-                        leds_with_colors.append({"led": led_num, "color": COLOR_RED})
+def process_data(reed_data, wiring=WIRING, pulse=None):
+    """
+    Przetwarza dane z przełączników Reeda i zwraca informacje o tym,
+    które diody należy zapalić i w jakim kolorze.
 
-    return leds_with_colors
+    Adapter dla zagnieżdżonego słownika MCP/port/pin - patrz process_occupancy. Pola bez
+    stanu w słowniku nie są podświetlane, a bez pulse używana jest wspólna faza pulsowania.
+    """
+    return _occupancy_leds(reed_to_bitboard(reed_data, wiring), _reported_squares(reed_data, wiring), wiring,
+                           (pulse or _DEFAULT_PULSE).color())
 
 
-def is_board_ready(reed_data):
+def is_board_ready(reed_data, wiring=WIRING):
     """
     Sprawdza czy szachownica jest gotowa do gry bezpośrednio na podstawie stanu przełączników Reed.
 
-    Szachownica jest gotowa gdy:
-    - Wszystkie przełączniki Reed na liniach startowych (1,2,7,8) mają wartość 1 (figura obecna)
-    - Wszystkie przełączniki Reed na polach środkowych (3,4,5,6) mają wartość 0 (brak figury)
+    Adapter dla zagnieżdżonego słownika MCP/port/pin - patrz is_occupancy_ready.
+    Sprawdzane są tylko pola, których stan występuje w słowniku.
     """
-    for mcp_name, ports in reed_data.items():
-        for port_name, pins in ports.items():
-            for pin_name, state in pins.items():
-                led_num = MAPPING[mcp_name][port_name][pin_name]
-
-                if led_num in LED_TO_CHESS:
-                    chess_pos = LED_TO_CHESS[led_num]
-                    rank = chess_pos[1]  # Numer linii (1-8)
-
-                    # Sprawdź linie startowe (1,2,7,8)
-                    if rank in ['1', '2', '7', '8']:
-                        if state != 1:  # Powinna być figura (Reed=1)
-                            return False
-
-                    # Sprawdź pola środkowe (3,4,5,6)
-                    elif rank in ['3', '4', '5', '6']:
-                        if state != 0:  # Nie powinno być figury (Reed=0)
-                            return False
-
-    # Jeśli nie znaleźliśmy żadnego nieprawidłowego stanu, szachownica jest gotowa
-    return True
+    reported = _reported_squares(reed_data, wiring)
+    return (reed_to_bitboard(reed_data, wiring) ^ START_RANKS_MASK) & reported == 0
@@ -1,42 +1,115 @@
-import threading
-import time
-from config import COLOR_GREEN, COLOR_RED, COLOR_YELLOW, COLOR_ORANGE
+from config import COLOR_GREEN, COLOR_RED, COLOR_YELLOW, COLOR_ORANGE, MOVE_SETTLE_DELAY, square_index
+from chess_position import Position, uci_to_move
+from move_recognizer import (MoveRecognizer, SignatureCache, RESULT_NONE, RESULT_PENDING, RESULT_MOVE,
+                             RESULT_ILLEGAL, squares_to_names)
+from scheduler import TimerScheduler
 
 
 class ChessMoveHandler:
-    def __init__(self, chess_server, lichess_client):
-        """Inicjalizuje obsługę ruchów szachowych."""
+    def __init__(self, chess_server, lichess_client, scheduler=None, signature_cache=None,
+                 settle_delay=MOVE_SETTLE_DELAY, clock=None):
+        """
+        Inicjalizuje obsługę ruchów szachowych.
+
+        Wszystkie terminy potwierdzeń i zdarzenia (zmiany Reed, ruchy przeciwnika, zmiana tury)
+        wykonywane są po kolei w wątku planisty, więc stan obsługi nie wymaga blokad.
+        Planista i pamięć podręczna sygnatur ruchów mogą być współdzielone przez wiele szachownic.
+        settle_delay to czas (s), przez który stan Reed musi być stały, by rozpoznać ruch.
+        clock to zegar własnego planisty (np. clock.SimulatedClock w testach całych partii).
+        """
         self.chess_server = chess_server
         self.lichess_client = lichess_client
 
+        self._owns_scheduler = scheduler is None
+        self.scheduler = scheduler or TimerScheduler(name="move-handler", clock=clock)
+        self.scheduler.start()
+
+        # Lokalna kopia pozycji partii (aktualizowana ruchami z Lichess)
+        self.position = Position()
+        self.previous_position = None  # Pozycja przed ostatnim ruchem
+        self.applied_moves = []
+
+        # Rozpoznawanie ruchów na fizycznej szachownicy
+        self.signature_cache = signature_cache or SignatureCache()
+        occupancy = getattr(chess_server, 'occupancy', None)
+        self.recognizer = MoveRecognizer(self.scheduler, self._on_recognized,
+                                         occupancy if occupancy is not None else self.position.occupancy,
+                                         settle_delay=settle_delay)
+        self._armed_for = None  # (liczba ruchów, rodzaj) - dla czego uzbrojono rozpoznawanie
+
         # Stan ruchu gracza
-        self.move_in_progress = False
-        self.source_position = None
-        self.timer = None
         self.is_player_turn = False
 
         # Stan ruchu przeciwnika
         self.opponent_move_pending = False
+        self.opponent_move = None
         self.opponent_source = None
         self.opponent_target = None
-        self.opponent_source_lifted = False
-        self.opponent_timer = None  # Timer dla ruchu przeciwnika
-
-        # Nowe zmienne dla obsługi bić
-        self.capturing = False
-        self.capture_timer = None
-        self.capture_lifted = False
-        self.capture_target = None
 
     def set_player_turn(self, is_turn):
         """Ustawia, czy jest tura gracza."""
+        self.scheduler.call_soon(self._set_player_turn, is_turn)
+
+    def _set_player_turn(self, is_turn):
+        # Tura gracza zaczyna się dopiero po odtworzeniu ruchu przeciwnika na szachownicy
+        if is_turn and self.opponent_move_pending:
+            return
+
         self.is_player_turn = is_turn
 
         # Aktualizuj stan w ChessServer
         self.chess_server.is_player_turn = is_turn
 
+        if is_turn:
+            self._arm("player", self.position)
+
+    def sync_moves(self, moves):
+        """Aktualizuje lokalną pozycję na podstawie listy ruchów partii (UCI)."""
+        self.scheduler.call_soon(self._sync_moves, list(moves))
+
+    def _sync_moves(self, moves):
+        # Jeśli historia się nie zgadza (np. cofnięty ruch), odtwórz pozycję od początku.
+        # Gdy lista urosła, wystarczy porównać ostatni zastosowany ruch; lista tej samej lub
+        # mniejszej długości (cofnięcie i ponowienie ruchu) porównywana jest w całości.
+        applied = len(self.applied_moves)
+        if len(moves) > applied:
+            stale = applied and moves[applied - 1] != self.applied_moves[-1]
+        else:
+            stale = moves != self.applied_moves
+        if stale:
+            self.position = Position()
+            self.previous_position = None
+            self.applied_moves = []
+            # Rozpoznawanie trzeba uzbroić ponownie - liczba ruchów może być taka sama jak przed zmianą
+            self._armed_for = None
+
+        for move in moves[len(self.applied_moves):]:
+            previous = self.position.copy()
+            try:
+                self.position.push_uci(move)
+            except ValueError as e:
+                self.position = previous
+                print(f"Nie można zastosować ruchu {move} w lokalnej pozycji: {e}")
+                break
+            self.previous_position = previous
+            self.applied_moves.append(move)
+
+    def _arm(self, kind, position, moves=None):
+        """Uzbraja rozpoznawanie ruchu - raz na półruch, żeby powtórzone powiadomienia nie gubiły postępu."""
+        key = (len(self.applied_moves), kind)
+        if self._armed_for == key:
+            return
+        self._armed_for = key
+        if moves is None:
+            self.recognizer.arm(position, signatures=self.signature_cache.signatures(position))
+        else:
+            self.recognizer.arm(position, moves)
+
     def handle_opponent_move(self, move):
         """Obsługuje ruch przeciwnika."""
+        self.scheduler.call_soon(self._handle_opponent_move, move)
+
+    def _handle_opponent_move(self, move):
         if len(move) < 4:
             print(f"Nieprawidłowy format ruchu przeciwnika: {move}")
             return
@@ -47,16 +120,18 @@ class ChessMoveHandler:
 
         print(f"Przeciwnik wykonał ruch z {source} na {target}")
 
-        # Zapal zielone diody na pozycjach źródłowej i docelowej
-        self.chess_server.clear_all_leds()
-        self.chess_server.set_led(source, COLOR_GREEN)
-        self.chess_server.set_led(target, COLOR_GREEN)
-
         # Ustaw stan oczekiwania na wykonanie ruchu przeciwnika przez gracza
         self.opponent_move_pending = True
+        self.opponent_move = move
         self.opponent_source = source
         self.opponent_target = target
-        self.opponent_source_lifted = False
+        self._show_opponent_move()
+
+        # Rozpoznawaj tylko ruch przeciwnika, w pozycji sprzed tego ruchu
+        if self.applied_moves and self.applied_moves[-1] == move and self.previous_position:
+            self._arm("opponent", self.previous_position, [uci_to_move(move)])
+        else:
+            self._arm("opponent", self.position, [uci_to_move(move)])
 
         # Wyłącz tryb gracza
         self.is_player_turn = False
@@ -69,133 +144,68 @@ class ChessMoveHandler:
         print(f"1. Podnieś figurę z pola {source}")
         print(f"2. Postaw ją na polu {target}")
 
+    def _show_opponent_move(self):
+        """Zapala zielone diody na polach ruchu przeciwnika."""
+        self.chess_server.clear_all_leds()
+        self.chess_server.set_led(self.opponent_source, COLOR_GREEN)
+        self.chess_server.set_led(self.opponent_target, COLOR_GREEN)
+
     def handle_reed_change(self, changes):
         """Obsługuje zmiany stanu przełączników Reed."""
-        # Jeśli oczekujemy na wykonanie ruchu przeciwnika przez gracza
-        if self.opponent_move_pending:
-            self._handle_opponent_move_reed_changes(changes)
-            return
+        self.scheduler.call_soon(self._handle_reed_change, changes)
+
+    def _handle_reed_change(self, changes):
+        # Stan szachownicy śledzony jest zawsze - ocena tylko po uzbrojeniu rozpoznawania
+        self.recognizer.feed(changes)
+
+        for change in changes:
+            print(f"DEBUG: Wykryto zmianę na {change['position']}: {change['from_state']} -> {change['to_state']}")
 
-        # Standardowa obsługa ruchu gracza
-        if not self.is_player_turn:
+        if not self.opponent_move_pending and not self.is_player_turn:
             # Jeśli nie jest tura gracza, ignoruj zmiany
             print("DEBUG: Zmiany zignorowane - nie jest tura gracza")
             return
 
+        # Migająca zielona dioda na każdym polu zmienionym względem początku ruchu
+        diff = self.recognizer.diff
         for change in changes:
             position = change["position"]
-            from_state = change["from_state"]
-            to_state = change["to_state"]
-
-            print(f"DEBUG: Wykryto zmianę na {position}: {from_state} -> {to_state}")
-
-            # Podniesienie figury (Reed z 1 na 0)
-            if from_state == 1 and to_state == 0:
-                self._handle_figure_lifted(position)
-
-            # Postawienie figury (Reed z 0 na 1)
-            elif from_state == 0 and to_state == 1:
-                self._handle_figure_placed(position)
-
-    def _handle_figure_lifted(self, position):
-        """Obsługuje podniesienie figury."""
-        # Jeśli trwa proces bicia i figura została podniesiona z pola docelowego (potencjalne bicie)
-        if self.move_in_progress and self.target_position and position == self.target_position:
-            print(f"Podniesiono figurę przeciwnika z pola {position} (bicie)")
-            self.capture_lifted = True
-            self.capture_target = position
-
-            # Anuluj istniejący timer bicia, jeśli istnieje
-            if self.capture_timer:
-                self.capture_timer.cancel()
-
-            # Uruchom timer dla podniesionej figury (1 sekunda)
-            self.capture_timer = threading.Timer(1.0, self._handle_capture_lifted_timeout)
-            self.capture_timer.start()
+            if diff >> square_index(position) & 1:
+                self.chess_server.set_led(position, COLOR_GREEN, blink=True)
+            elif self.opponent_move_pending and position in (self.opponent_source, self.opponent_target):
+                self.chess_server.set_led(position, COLOR_GREEN)
+            else:
+                self.chess_server.clear_led(position)
+
+    def _on_recognized(self, result, uci_move, diff):
+        """Obsługuje wynik rozpoznawania po ustabilizowaniu się szachownicy."""
+        if not self.opponent_move_pending and not self.is_player_turn:
             return
 
-        # Standardowa obsługa podniesienia figury gracza
-        if self.move_in_progress and self.source_position:
-            return
-
-        print(f"Podniesiono figurę z pola {position}")
-
-        # Wyczyść wszystkie diody z poprzednich ruchów
-        self.chess_server.clear_all_leds()
+        if result == RESULT_NONE:
+            print("Figury wróciły na miejsca - ruch anulowany")
+            if self.opponent_move_pending:
+                self._show_opponent_move()
+            else:
+                self.chess_server.clear_all_leds()
 
-        # Rozpocznij nowy ruch
-        self.move_in_progress = True
-        self.source_position = position
-
-        # Zapal diodę na pozycji źródłowej (migająca zielona)
-        self.chess_server.set_led(position, COLOR_GREEN, blink=True)
-        print(f"DEBUG: Ustawiono migającą zieloną diodę na polu {position}")
-
-    def _handle_figure_placed(self, position):
-        """Obsługuje postawienie figury."""
-        # Jeśli nie ma ruchu w trakcie lub nie ma pozycji źródłowej, ignoruj
-        if not self.move_in_progress or not self.source_position:
+        elif result == RESULT_PENDING:
             return
 
-        # Jeśli pozycja docelowa jest taka sama jak źródłowa, ignoruj
-        if position == self.source_position:
-            return
+        elif result == RESULT_ILLEGAL:
+            squares = squares_to_names(diff)
+            print(f"Nielegalny ruch (zmienione pola: {', '.join(squares)}). Przywróć figury na miejsca.")
+            for position in squares:
+                self.chess_server.set_led(position, COLOR_RED)
 
-        # Sprawdź, czy trwa proces bicia
-        if self.capture_lifted and position == self.capture_target:
-            print(f"Postawiono własną figurę na polu {position} (zakończenie bicia)")
-
-            # Anuluj istniejący timer bicia
-            if self.capture_timer:
-                self.capture_timer.cancel()
-
-            # Zapal diodę na pozycji docelowej (migająca zielona)
-            self.chess_server.set_led(position, COLOR_GREEN, blink=True)
-
-            # Uruchom timer na sekundę przed wykonaniem ruchu
-            if self.timer:
-                self.timer.cancel()
-
-            print(f"Potwierdzanie bicia z {self.source_position} na {position}. Czekaj 1 sekundę...")
-            self.timer = threading.Timer(1.0, self._execute_move, args=[self.source_position, position])
-            self.timer.start()
-            return
-
-        print(f"Postawiono figurę na polu {position}")
-
-        # Sprawdź, czy na polu docelowym jest już figura (potencjalne bicie)
-        target_state = self._get_reed_state(position)
-        if target_state == 1:
-            print(f"Wykryto figurę na polu docelowym {position} - rozpoczęcie sekwencji bicia")
-            self.capturing = True
-            self.target_position = position
-
-            # Zapal diodę na pozycji docelowej (migająca zielona)
-            self.chess_server.set_led(position, COLOR_GREEN, blink=True)
-            return
-
-        # Standardowa obsługa dla ruchu bez bicia
-        # Zapal diodę na pozycji docelowej (migająca zielona)
-        self.chess_server.set_led(position, COLOR_GREEN, blink=True)
-
-        # Uruchom timer na sekundę przed wykonaniem ruchu
-        if self.timer:
-            self.timer.cancel()
-
-        print(f"Potwierdzanie ruchu z {self.source_position} na {position}. Czekaj 1 sekundę...")
-        self.timer = threading.Timer(1.0, self._execute_move, args=[self.source_position, position])
-        self.timer.start()
-
-    def _handle_capture_lifted_timeout(self):
-        """Obsługuje upłynięcie czasu po podniesieniu figury przeciwnika podczas bicia."""
-        print("Figura przeciwnika podniesiona wystarczająco długo - możesz postawić swoją figurę")
-        # Nie robimy nic specjalnego, po prostu informujemy użytkownika
-
-    def _execute_move(self, source, target):
-        """Wykonuje ruch po upływie czasu potwierdzenia."""
-        # Stwórz notację UCI (np. "e2e4")
-        uci_move = f"{source}{target}"
+        elif result == RESULT_MOVE:
+            if self.opponent_move_pending:
+                self._complete_opponent_move()
+            else:
+                self._execute_move(uci_move)
 
+    def _execute_move(self, uci_move):
+        """Wysyła rozpoznany ruch gracza do Lichess."""
         print(f"Wykonuję ruch: {uci_move}")
 
         # Wykonaj ruch w API Lichess
@@ -204,69 +214,40 @@ class ChessMoveHandler:
         # Wyczyść wszystkie diody
         self.chess_server.clear_all_leds()
 
-        # Zresetuj stan ruchu
-        self.move_in_progress = False
-        self.source_position = None
-        self.target_position = None
-        self.capturing = False
-        self.capture_lifted = False
-        self.capture_target = None
-
         # Wyłącz turę gracza po wykonaniu ruchu
         if success:
             self.is_player_turn = False
+            self.recognizer.disarm()
         else:
-            print(f"Błąd podczas wykonywania ruchu {uci_move}. Spróbuj ponownie.")
+            print(f"Błąd podczas wykonywania ruchu {uci_move}. Cofnij ruch i spróbuj ponownie.")
 
-    def stop(self):
-        """Zatrzymuje obsługę ruchów."""
-        if self.timer:
-            self.timer.cancel()
-        if self.opponent_timer:
-            self.opponent_timer.cancel()
-        if self.capture_timer:
-            self.capture_timer.cancel()
-
-    def _handle_opponent_move_reed_changes(self, changes):
-        """Obsługuje zmiany przełączników Reed podczas wykonywania ruchu przeciwnika."""
-        for change in changes:
-            position = change["position"]
-            from_state = change["from_state"]
-            to_state = change["to_state"]
-
-            print(f"DEBUG: Wykryto zmianę podczas ruchu przeciwnika na {position}: {from_state} -> {to_state}")
-
-            # Jeśli gracz podniósł figurę z pola źródłowego
-            if not self.opponent_source_lifted and position == self.opponent_source and from_state == 1 and to_state == 0:
-                print(f"Podniesiono figurę z pola {position} (krok 1/2)")
-                self.opponent_source_lifted = True
-
-                # Zmień diodę na polu źródłowym na migającą
-                self.chess_server.set_led(self.opponent_source, COLOR_GREEN, blink=True)
-
-            # Jeśli gracz postawił figurę na polu docelowym
-            elif self.opponent_source_lifted and position == self.opponent_target and from_state == 0 and to_state == 1:
-                print(f"Postawiono figurę na polu {position} (krok 2/2)")
-                print("Potwierdzanie ruchu przeciwnika... Czekaj 1 sekundę...")
+    def handle_move_failed(self, uci_move):
+        """Obsługuje ruch gracza, którego nie udało się wysłać do Lichess."""
+        self.scheduler.call_soon(self._handle_move_failed, uci_move)
 
-                # Ustaw migającą diodę na polu docelowym
-                self.chess_server.set_led(self.opponent_target, COLOR_GREEN, blink=True)
+    def _handle_move_failed(self, uci_move):
+        print(f"Ruch {uci_move} nie został przyjęty. Cofnij go na szachownicy i spróbuj ponownie.")
+        self.is_player_turn = True
+        self.chess_server.is_player_turn = True
 
-                # Anuluj istniejący timer, jeśli istnieje
-                if self.opponent_timer:
-                    self.opponent_timer.cancel()
+        # Stan początkowy rozpoznawania to nadal pozycja sprzed ruchu
+        self.recognizer.resume()
+        for position in squares_to_names(self.recognizer.diff):
+            self.chess_server.set_led(position, COLOR_RED)
 
-                # Uruchom timer na sekundę przed zakończeniem ruchu przeciwnika
-                self.opponent_timer = threading.Timer(1.0, self._complete_opponent_move)
-                self.opponent_timer.start()
+    def stop(self):
+        """Zatrzymuje obsługę ruchów."""
+        self.recognizer.disarm()
+        if self._owns_scheduler:
+            self.scheduler.stop()
 
     def _complete_opponent_move(self):
-        """Kończy ruch przeciwnika po upływie czasu potwierdzenia."""
+        """Kończy ruch przeciwnika po rozpoznaniu go na szachownicy."""
         print("Ruch przeciwnika wykonany!")
 
         # Zakończ obsługę ruchu przeciwnika
         self.opponent_move_pending = False
-        self.opponent_source_lifted = False
+        self.opponent_move = None
 
         # Aktualizuj status w ChessServer
         self.chess_server.opponent_move_pending = False
@@ -275,24 +256,6 @@ class ChessMoveHandler:
         self.chess_server.clear_all_leds()
 
         # Przejdź do obsługi ruchu gracza
-        self.is_player_turn = True
-        self.chess_server.is_player_turn = True
+        self._set_player_turn(True)
 
         print("\nTeraz Twój ruch!")
-
-    def _get_reed_state(self, position):
-        """Pobiera aktualny stan przełącznika Reed na danej pozycji."""
-        if hasattr(self.chess_server, 'previous_reed_data') and self.chess_server.previous_reed_data:
-            # Pobierz numer LED dla pozycji
-            if position in self.chess_server.CHESS_TO_LED:
-                led_num = self.chess_server.CHESS_TO_LED[position]
-                # Znajdź odpowiedni MCP, port i pin
-                for mcp_name, ports in self.chess_server.MAPPING.items():
-                    for port_name, pins in ports.items():
-                        for pin_name, pin_led in pins.items():
-                            if pin_led == led_num:
-                                # Pobierz stan przełącznika
-                                state = self.chess_server.previous_reed_data.get(mcp_name, {}).get(port_name, {}).get(
-                                    pin_name, 0)
-                                return state
-        return 0  # Domyślnie zakładamy brak figury
\ No newline at end of file
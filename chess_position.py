@@ -0,0 +1,514 @@
+# chess_position.py
+"""
+Pozycja szachowa oparta na bitboardach i generator ruchów legalnych.
+
+Pola numerowane są jak w config.square_index: a1 = 0, b1 = 1, ..., h8 = 63.
+Ruch to krotka (z_pola, na_pole, promocja), gdzie promocja to typ figury
+(KNIGHT, BISHOP, ROOK, QUEEN) lub None.
+"""
+import random
+
+from config import SQUARE_NAMES, square_index
+
+WHITE = 0
+BLACK = 1
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+PIECE_SYMBOLS = "pnbrqk"
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Prawa do roszady
+CASTLE_WHITE_KING = 1
+CASTLE_WHITE_QUEEN = 2
+CASTLE_BLACK_KING = 4
+CASTLE_BLACK_QUEEN = 8
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+RANK_1 = 0x00000000000000FF
+RANK_8 = 0xFF00000000000000
+
+# Klucze Zobrista (stałe ziarno - skróty są powtarzalne między uruchomieniami)
+_zobrist_random = random.Random(0x5EED_C4E5)
+ZOBRIST_PIECES = [[[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(6)] for _ in range(2)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+def _build_step_attacks(offsets):
+    """Buduje tablicę ataków figur skaczących (skoczek, król) dla każdego pola."""
+    table = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        attacks = 0
+        for d_rank, d_file in offsets:
+            r, f = rank + d_rank, file + d_file
+            if 0 <= r < 8 and 0 <= f < 8:
+                attacks |= 1 << (r * 8 + f)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = _build_step_attacks([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _build_step_attacks([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+PAWN_ATTACKS = [
+    _build_step_attacks([(1, -1), (1, 1)]),     # Białe piony
+    _build_step_attacks([(-1, -1), (-1, 1)]),   # Czarne piony
+]
+
+# Kierunki (zmiana linii, zmiana kolumny); pierwsze cztery mają rosnące indeksy pól
+_DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+_POSITIVE_DIRECTIONS = (0, 1, 2, 3)
+ORTHOGONAL = (0, 1, 4, 5)
+DIAGONAL = (2, 3, 6, 7)
+
+
+def _build_rays():
+    """Buduje promienie od każdego pola do krawędzi szachownicy w każdym kierunku."""
+    rays = []
+    for d_rank, d_file in _DIRECTIONS:
+        table = []
+        for square in range(64):
+            rank, file = divmod(square, 8)
+            ray = 0
+            r, f = rank + d_rank, file + d_file
+            while 0 <= r < 8 and 0 <= f < 8:
+                ray |= 1 << (r * 8 + f)
+                r, f = r + d_rank, f + d_file
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+RAYS = _build_rays()
+
+
+def slider_attacks(square, occupied, directions):
+    """Zwraca ataki figury liniowej z pola square przy danym zajęciu szachownicy."""
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            if direction in _POSITIVE_DIRECTIONS:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def iter_squares(bitboard):
+    """Iteruje po indeksach pól zaznaczonych w bitboardzie."""
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def move_to_uci(move):
+    """Zamienia ruch (z, na, promocja) na notację UCI, np. "e7e8q"."""
+    from_square, to_square, promotion = move
+    uci = SQUARE_NAMES[from_square] + SQUARE_NAMES[to_square]
+    if promotion is not None:
+        uci += PIECE_SYMBOLS[promotion]
+    return uci
+
+
+def uci_to_move(uci):
+    """Zamienia notację UCI na krotkę ruchu. Zgłasza ValueError dla nieprawidłowego zapisu."""
+    if len(uci) not in (4, 5):
+        raise ValueError(f"Nieprawidłowy ruch UCI: {uci}")
+    promotion = None
+    if len(uci) == 5:
+        if uci[4] not in "nbrq":
+            raise ValueError(f"Nieprawidłowa promocja w ruchu UCI: {uci}")
+        promotion = PIECE_SYMBOLS.index(uci[4])
+    return square_index(uci[0:2]), square_index(uci[2:4]), promotion
+
+
+class Position:
+    def __init__(self, fen=STARTING_FEN):
+        """Tworzy pozycję z zapisu FEN (domyślnie pozycja startowa)."""
+        self.boards = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self._set_fen(fen)
+        self.hash = self.zobrist_hash()
+
+    def copy(self):
+        """Zwraca niezależną kopię pozycji."""
+        position = Position.__new__(Position)
+        position.boards = [self.boards[WHITE][:], self.boards[BLACK][:]]
+        position.occupied = self.occupied[:]
+        position.turn = self.turn
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.hash = self.hash
+        return position
+
+    def _set_fen(self, fen):
+        parts = fen.split()
+        if len(parts) < 4:
+            raise ValueError(f"Nieprawidłowy FEN: {fen}")
+
+        rows = parts[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"Nieprawidłowy FEN: {fen}")
+        for row_index, row in enumerate(rows):
+            rank = 7 - row_index
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                color = WHITE if char.isupper() else BLACK
+                piece = PIECE_SYMBOLS.index(char.lower())
+                self.boards[color][piece] |= 1 << (rank * 8 + file)
+                file += 1
+        self.occupied = [sum(self.boards[WHITE]), sum(self.boards[BLACK])]
+
+        self.turn = WHITE if parts[1] == 'w' else BLACK
+        for char, right in (('K', CASTLE_WHITE_KING), ('Q', CASTLE_WHITE_QUEEN),
+                            ('k', CASTLE_BLACK_KING), ('q', CASTLE_BLACK_QUEEN)):
+            if char in parts[2]:
+                self.castling |= right
+        self.ep_square = None if parts[3] == '-' else square_index(parts[3])
+        if len(parts) >= 6:
+            self.halfmove_clock = int(parts[4])
+            self.fullmove_number = int(parts[5])
+
+    def fen(self):
+        """Zwraca zapis FEN pozycji."""
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                piece = self.piece_at(rank * 8 + file)
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                color, piece_type = piece
+                symbol = PIECE_SYMBOLS[piece_type]
+                row += symbol.upper() if color == WHITE else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        castling = "".join(char for char, right in (('K', CASTLE_WHITE_KING), ('Q', CASTLE_WHITE_QUEEN),
+                                                    ('k', CASTLE_BLACK_KING), ('q', CASTLE_BLACK_QUEEN))
+                           if self.castling & right) or "-"
+        ep = SQUARE_NAMES[self.ep_square] if self.ep_square is not None else "-"
+        return (f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling} {ep} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def zobrist_hash(self):
+        """Liczy od zera 64-bitowy skrót Zobrista pozycji (push aktualizuje self.hash przyrostowo)."""
+        key = ZOBRIST_CASTLING[self.castling]
+        for color in (WHITE, BLACK):
+            for piece in range(6):
+                for square in iter_squares(self.boards[color][piece]):
+                    key ^= ZOBRIST_PIECES[color][piece][square]
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP_FILE[self.ep_square % 8]
+        if self.turn == BLACK:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key
+
+    @property
+    def occupancy(self):
+        """64-bitowa mapa zajętości pól - odpowiada stanowi przełączników Reed."""
+        return self.occupied[WHITE] | self.occupied[BLACK]
+
+    def piece_at(self, square):
+        """Zwraca (kolor, typ_figury) na polu lub None."""
+        mask = 1 << square
+        for color in (WHITE, BLACK):
+            if self.occupied[color] & mask:
+                for piece in range(6):
+                    if self.boards[color][piece] & mask:
+                        return color, piece
+        return None
+
+    def king_square(self, color):
+        return self.boards[color][KING].bit_length() - 1
+
+    def _attackers(self, square, color, occupied, boards):
+        """Zwraca bitboard figur koloru color atakujących pole przy danym zajęciu."""
+        return ((PAWN_ATTACKS[color ^ 1][square] & boards[PAWN]) |
+                (KNIGHT_ATTACKS[square] & boards[KNIGHT]) |
+                (KING_ATTACKS[square] & boards[KING]) |
+                (slider_attacks(square, occupied, DIAGONAL) & (boards[BISHOP] | boards[QUEEN])) |
+                (slider_attacks(square, occupied, ORTHOGONAL) & (boards[ROOK] | boards[QUEEN])))
+
+    def is_attacked(self, square, by_color):
+        """Sprawdza, czy pole jest atakowane przez figury danego koloru."""
+        return bool(self._attackers(square, by_color, self.occupancy, self.boards[by_color]))
+
+    def is_check(self):
+        """Sprawdza, czy strona na ruchu jest szachowana."""
+        return self.is_attacked(self.king_square(self.turn), self.turn ^ 1)
+
+    def _pseudo_legal_moves(self):
+        """Generuje ruchy zgodne z regułami ruchu figur (bez sprawdzania szacha)."""
+        us = self.turn
+        them = us ^ 1
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        empty = ~occupied & 0xFFFFFFFFFFFFFFFF
+        boards = self.boards[us]
+        moves = []
+
+        # Piony
+        forward = 8 if us == WHITE else -8
+        start_rank = 1 if us == WHITE else 6
+        promotion_rank = 7 if us == WHITE else 0
+        ep_mask = (1 << self.ep_square) if self.ep_square is not None else 0
+        for square in iter_squares(boards[PAWN]):
+            targets = PAWN_ATTACKS[us][square] & (enemy | ep_mask)
+            one = square + forward
+            if 0 <= one < 64 and empty >> one & 1:
+                targets |= 1 << one
+                two = one + forward
+                if square // 8 == start_rank and empty >> two & 1:
+                    targets |= 1 << two
+            for target in iter_squares(targets):
+                if target // 8 == promotion_rank:
+                    for piece in PROMOTION_PIECES:
+                        moves.append((square, target, piece))
+                else:
+                    moves.append((square, target, None))
+
+        # Skoczki, gońce, wieże, hetmany, król
+        not_own = ~own
+        for square in iter_squares(boards[KNIGHT]):
+            for target in iter_squares(KNIGHT_ATTACKS[square] & not_own):
+                moves.append((square, target, None))
+        for square in iter_squares(boards[BISHOP] | boards[QUEEN]):
+            for target in iter_squares(slider_attacks(square, occupied, DIAGONAL) & not_own):
+                moves.append((square, target, None))
+        for square in iter_squares(boards[ROOK] | boards[QUEEN]):
+            for target in iter_squares(slider_attacks(square, occupied, ORTHOGONAL) & not_own):
+                moves.append((square, target, None))
+        king = self.king_square(us)
+        for target in iter_squares(KING_ATTACKS[king] & not_own):
+            moves.append((king, target, None))
+
+        # Roszady
+        if us == WHITE:
+            rights = ((CASTLE_WHITE_KING, 4, 6, 0x60, (5, 6)), (CASTLE_WHITE_QUEEN, 4, 2, 0x0E, (3, 2)))
+        else:
+            rights = ((CASTLE_BLACK_KING, 60, 62, 0x60 << 56, (61, 62)),
+                      (CASTLE_BLACK_QUEEN, 60, 58, 0x0E << 56, (59, 58)))
+        for right, king_from, king_to, between, path in rights:
+            if self.castling & right and king == king_from and not occupied & between:
+                if not self.is_attacked(king_from, them) and not any(self.is_attacked(sq, them) for sq in path):
+                    moves.append((king_from, king_to, None))
+
+        return moves
+
+    def _is_legal(self, move):
+        """Sprawdza, czy ruch nie zostawia własnego króla w szachu."""
+        from_square, to_square, _ = move
+        us = self.turn
+        them = us ^ 1
+        from_mask = 1 << from_square
+        to_mask = 1 << to_square
+
+        captured = to_mask
+        if (self.boards[us][PAWN] & from_mask and to_square == self.ep_square
+                and (from_square - to_square) % 8 != 0):
+            # Bicie w przelocie - zbity pion stoi obok pola docelowego
+            captured = 1 << (to_square - 8 if us == WHITE else to_square + 8)
+
+        occupied = ((self.occupancy & ~from_mask) | to_mask) & ~(captured & ~to_mask)
+        enemy_boards = [board & ~captured for board in self.boards[them]]
+        king = to_square if self.boards[us][KING] & from_mask else self.king_square(us)
+        return not self._attackers(king, them, occupied, enemy_boards)
+
+    def legal_moves(self):
+        """Zwraca listę ruchów legalnych w pozycji."""
+        return [move for move in self._pseudo_legal_moves() if self._is_legal(move)]
+
+    def legal_uci_moves(self):
+        """Zwraca zbiór ruchów legalnych w notacji UCI."""
+        return {move_to_uci(move) for move in self.legal_moves()}
+
+    def is_legal_uci(self, uci):
+        """Sprawdza, czy ruch w notacji UCI jest legalny."""
+        try:
+            move = uci_to_move(uci)
+        except ValueError:
+            return False
+        return move in self.legal_moves()
+
+    def _san_body(self, move, legal_moves):
+        """Zapis SAN ruchu bez oznaczenia szacha."""
+        from_square, to_square, promotion = move
+        piece = self.piece_at(from_square)[1]
+        capture = bool(self.occupancy >> to_square & 1) or (piece == PAWN and from_square % 8 != to_square % 8)
+
+        if piece == KING and abs(to_square - from_square) == 2:
+            return "O-O" if to_square > from_square else "O-O-O"
+
+        if piece == PAWN:
+            san = SQUARE_NAMES[from_square][0] + "x" if capture else ""
+        else:
+            san = PIECE_SYMBOLS[piece].upper()
+            # Ujednoznacznienie, gdy inna figura tego typu może przejść na to samo pole
+            rivals = [other for other, target, _ in legal_moves
+                      if target == to_square and other != from_square
+                      and self.boards[self.turn][piece] >> other & 1]
+            if rivals:
+                if all(other % 8 != from_square % 8 for other in rivals):
+                    san += SQUARE_NAMES[from_square][0]
+                elif all(other // 8 != from_square // 8 for other in rivals):
+                    san += SQUARE_NAMES[from_square][1]
+                else:
+                    san += SQUARE_NAMES[from_square]
+            if capture:
+                san += "x"
+
+        san += SQUARE_NAMES[to_square]
+        if promotion is not None:
+            san += "=" + PIECE_SYMBOLS[promotion].upper()
+        return san
+
+    def san(self, move):
+        """Zwraca zapis SAN ruchu legalnego (np. "Nbd7", "exd6", "e8=Q+", "O-O#")."""
+        san = self._san_body(move, self.legal_moves())
+        child = self.copy()
+        child.push(move)
+        if child.is_check():
+            san += "#" if not child.legal_moves() else "+"
+        return san
+
+    def parse_san(self, san):
+        """Zamienia zapis SAN na ruch legalny. Zgłasza ValueError, jeśli ruch nie pasuje."""
+        wanted = san.rstrip("+#!?").replace("0-0-0", "O-O-O").replace("0-0", "O-O")
+        legal_moves = self.legal_moves()
+        for move in legal_moves:
+            if self._san_body(move, legal_moves) == wanted:
+                return move
+        raise ValueError(f"Nielegalny lub nieprawidłowy ruch SAN: {san}")
+
+    def push_san(self, san):
+        """Wykonuje ruch zapisany w notacji SAN i zwraca go jako krotkę."""
+        move = self.parse_san(san)
+        self.push(move)
+        return move
+
+    def push_uci(self, uci):
+        """Wykonuje ruch zapisany w notacji UCI (bez sprawdzania legalności)."""
+        self.push(uci_to_move(uci))
+
+    def push(self, move):
+        """Wykonuje ruch (bez sprawdzania legalności)."""
+        from_square, to_square, promotion = move
+        us = self.turn
+        them = us ^ 1
+        from_mask = 1 << from_square
+        to_mask = 1 << to_square
+        boards = self.boards[us]
+
+        moving = None
+        for piece in range(6):
+            if boards[piece] & from_mask:
+                moving = piece
+                break
+        if moving is None:
+            raise ValueError(f"Brak figury na polu {SQUARE_NAMES[from_square]}")
+
+        zobrist = ZOBRIST_PIECES
+        key = self.hash ^ ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_BLACK_TO_MOVE
+        if self.ep_square is not None:
+            key ^= ZOBRIST_EP_FILE[self.ep_square % 8]
+
+        # Zbicie figury na polu docelowym
+        capture = bool(self.occupied[them] & to_mask)
+        if capture:
+            for piece in range(6):
+                if self.boards[them][piece] & to_mask:
+                    self.boards[them][piece] &= ~to_mask
+                    key ^= zobrist[them][piece][to_square]
+                    break
+            self.occupied[them] &= ~to_mask
+
+        # Bicie w przelocie
+        if moving == PAWN and to_square == self.ep_square and (from_square - to_square) % 8 != 0:
+            captured_square = to_square - 8 if us == WHITE else to_square + 8
+            captured_mask = 1 << captured_square
+            self.boards[them][PAWN] &= ~captured_mask
+            self.occupied[them] &= ~captured_mask
+            key ^= zobrist[them][PAWN][captured_square]
+            capture = True
+
+        # Przesunięcie figury (z ewentualną promocją)
+        placed = promotion if promotion is not None else moving
+        boards[moving] &= ~from_mask
+        boards[placed] |= to_mask
+        self.occupied[us] = (self.occupied[us] & ~from_mask) | to_mask
+        key ^= zobrist[us][moving][from_square] ^ zobrist[us][placed][to_square]
+
+        # Roszada - przesuń wieżę
+        if moving == KING and abs(to_square - from_square) == 2:
+            if to_square > from_square:
+                rook_from, rook_to = from_square + 3, from_square + 1
+            else:
+                rook_from, rook_to = from_square - 4, from_square - 1
+            rook_mask = (1 << rook_from) | (1 << rook_to)
+            boards[ROOK] ^= rook_mask
+            self.occupied[us] ^= rook_mask
+            key ^= zobrist[us][ROOK][rook_from] ^ zobrist[us][ROOK][rook_to]
+
+        # Prawa do roszady
+        for square, right in ((4, CASTLE_WHITE_KING | CASTLE_WHITE_QUEEN), (0, CASTLE_WHITE_QUEEN),
+                              (7, CASTLE_WHITE_KING), (60, CASTLE_BLACK_KING | CASTLE_BLACK_QUEEN),
+                              (56, CASTLE_BLACK_QUEEN), (63, CASTLE_BLACK_KING)):
+            if from_square == square or to_square == square:
+                self.castling &= ~right
+
+        # Pole bicia w przelocie
+        self.ep_square = None
+        if moving == PAWN and abs(to_square - from_square) == 16:
+            self.ep_square = (from_square + to_square) // 2
+            key ^= ZOBRIST_EP_FILE[self.ep_square % 8]
+
+        self.hash = key ^ ZOBRIST_CASTLING[self.castling]
+        self.halfmove_clock = 0 if moving == PAWN or capture else self.halfmove_clock + 1
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.turn = them
+
+    def perft(self, depth):
+        """Liczy liczbę pozycji osiągalnych w depth półruchach (test generatora ruchów)."""
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        total = 0
+        for move in moves:
+            child = self.copy()
+            child.push(move)
+            total += child.perft(depth - 1)
+        return total
@@ -2,38 +2,556 @@
 import socket
 import json
 import threading
-from config import SERVER_HOST, SERVER_PORT, BUFFER_SIZE
-from chess_logic import process_data, is_board_ready
-import time
+import asyncio
+from config import (SERVER_HOST, SERVER_PORT, BUFFER_SIZE, LED_PUSH_COALESCE_DELAY, MAX_WRITE_BUFFER, WIRING,
+                    SQUARE_NAMES)
+from chess_logic import LedPulse, process_occupancy, is_occupancy_ready
+from frame_decoder import FrameDecoder
+from scheduler import TimerScheduler
+from clock import SYSTEM_CLOCK
+from event_bus import EventBus
+import metrics
+from board_protocol import (is_binary_frame, decode_binary_frame, bitboard_to_reed, reed_to_bitboard,
+                            choose_protocol, choose_features, LedDeltaEncoder, PROTOCOL_JSON, FEATURE_LED_DELTA,
+                            FIRMWARE_EVENT_ALIASES)
+
+
+# Metryki ścieżki ramki: dekodowanie -> obsługa (wykrycie zmian Reed, diody) -> kodowanie -> wysłanie
+# (w trybie asyncio "send" to przekazanie danych do pętli zdarzeń)
+STAGE_SECONDS = metrics.histogram("chess_server_stage_seconds", "Czas etapów obsługi ramki ESP32", ("stage",))
+STAGE_DECODE = STAGE_SECONDS.labels("decode")
+STAGE_HANDLE = STAGE_SECONDS.labels("handle")
+STAGE_REED_CHANGES = STAGE_SECONDS.labels("detect_reed_changes")
+STAGE_LEDS = STAGE_SECONDS.labels("compose_leds")
+STAGE_ENCODE = STAGE_SECONDS.labels("encode")
+STAGE_SEND = STAGE_SECONDS.labels("send")
+FRAMES_RECEIVED = metrics.counter("chess_server_frames_received_total", "Ramki odebrane od ESP32", ("protocol",))
+FRAMES_RECEIVED_JSON = FRAMES_RECEIVED.labels("json")
+FRAMES_RECEIVED_BINARY = FRAMES_RECEIVED.labels("binary")
+FRAMES_INVALID = metrics.counter("chess_server_frames_invalid_total", "Ramki ESP32, których nie udało się zdekodować")
+FRAMES_SENT = metrics.counter("chess_server_frames_sent_total", "Ramki wysłane do ESP32")
+BYTES_RECEIVED = metrics.counter("chess_server_bytes_received_total", "Bajty odebrane od ESP32")
+BYTES_SENT = metrics.counter("chess_server_bytes_sent_total", "Bajty wysłane do ESP32")
+LED_PUSHES = metrics.counter("chess_server_led_pushes_total", "Wypchnięcia stanu LED bez zapytania ESP32")
+LED_RESENDS = metrics.counter("chess_server_led_resends_total", "Pełny stan LED wysłany ponownie po luce w ramkach delta")
+RECONNECTS = metrics.counter("chess_server_reconnects_total", "Ponowne połączenia szachownicy z istniejącą sesją")
+
+
+class BoardSession:
+    """Stan pojedynczej szachownicy (jednego ESP32) obsługiwanej przez serwer."""
+
+    def __init__(self, server, board_id):
+        """Inicjalizacja stanu szachownicy."""
+        self.server = server
+        self.board_id = board_id
+        self.wiring = server.wiring
+
+        # Callbacki domyślnie dziedziczone z serwera, można je nadpisać per szachownica
+        self.on_board_ready_callback = server.on_board_ready_callback
+        self.on_reed_change_callback = server.on_reed_change_callback
+
+        # Format ramek wynegocjowany z aktualnie podłączonym ESP32
+        self.protocol = PROTOCOL_JSON
+        # Koder ramek delta LED (None = pełna lista "leds" w każdej odpowiedzi)
+        self.led_encoder = None
+
+        self.board_ready = False
+        self.custom_leds = []
+        # Ostatni stan przełączników Reed jako 64-bitowa mapa zajętości (None = brak danych)
+        self.occupancy = None
+        self._game_mode = False
+        # Faza pulsowania diod pustych pól startowych (według zegara serwera)
+        self.pulse = LedPulse(server.clock)
+
+        # Dodane pola do wyświetlania statusu
+        self._is_player_turn = False
+        self._opponent_move_pending = False
+
+        # Stan LED i status ostatnio wysłane do ESP32 (do porównywania zmian)
+        self.previous_led_states = {}
+        self.previous_status = None
+
+        # Funkcja wysyłająca dane do aktualnie podłączonego ESP32
+        self._send = None
+        self._close = None
+        self.connections = 0
+        self._lock = threading.RLock()
+
+        # Zaplanowane wypchnięcie stanu do ESP32 (łączy serie zmian w jeden zapis)
+        self._push_timer = None
+        self._push_lock = threading.Lock()
+
+        # Zmiany Reed dla logiki gry: stan już przekazany i najnowszy odebrany. Zmiany nie są
+        # gubione - przy pełnej kolejce magistrali łączą się i są przekazywane przy kolejnej ramce
+        self._reed_delivered = None
+        self._reed_latest = None
+        self._reed_scheduled = False
+        self._board_ready_pending = False
+
+    def attach(self, send_func, close_func=None):
+        """
+        Podłącza nowe połączenie ESP32 do sesji. Zwraca token połączenia.
+
+        Poprzednie połączenie tej samej szachownicy (np. zerwane bez zamknięcia po stronie
+        ESP32) jest zamykane funkcją close_func podaną przy jego podłączeniu.
+        """
+        with self._lock:
+            previous_close = self._close if self._send is not None else None
+            self._send = send_func
+            self._close = close_func
+            self.connections += 1
+            if self.connections > 1:
+                RECONNECTS.inc()
+            # Nowe połączenie - pierwsza odpowiedź zawsze zawiera pełny stan
+            self.previous_led_states = {}
+            self.previous_status = None
+            self.protocol = PROTOCOL_JSON
+            self.led_encoder = None
+        if previous_close is not None:
+            previous_close()
+        return send_func
+
+    def detach(self, token):
+        """Odłącza połączenie, o ile nie zostało już zastąpione nowszym."""
+        with self._lock:
+            if self._send is token:
+                self._send = None
+                self._close = None
+
+    @property
+    def connected(self):
+        return self._send is not None
+
+    def send(self, message):
+        """Wysyła wiadomość JSON do podłączonego ESP32."""
+        send_func = self._send
+        if send_func is None:
+            return False
+        started = metrics.start()
+        data = json.dumps(message).encode() + b'\n'
+        STAGE_ENCODE.observe_since(started)
+
+        started = metrics.start()
+        send_func(data)
+        STAGE_SEND.observe_since(started)
+        FRAMES_SENT.inc()
+        BYTES_SENT.inc(len(data))
+        return True
+
+    @property
+    def previous_reed_data(self):
+        """Ostatni stan przełączników Reed w formacie słownika MCP/port/pin."""
+        if self.occupancy is None:
+            return None
+        return bitboard_to_reed(self.occupancy, self.wiring)
+
+    @previous_reed_data.setter
+    def previous_reed_data(self, reed_data):
+        self.occupancy = None if reed_data is None else reed_to_bitboard(reed_data, self.wiring)
+
+    @property
+    def game_mode(self):
+        return self._game_mode
+
+    @game_mode.setter
+    def game_mode(self, value):
+        if value != self._game_mode:
+            self._game_mode = value
+            self.request_push()
+
+    @property
+    def is_player_turn(self):
+        return self._is_player_turn
+
+    @is_player_turn.setter
+    def is_player_turn(self, value):
+        if value != self._is_player_turn:
+            self._is_player_turn = value
+            self.request_push()
+
+    @property
+    def opponent_move_pending(self):
+        return self._opponent_move_pending
+
+    @opponent_move_pending.setter
+    def opponent_move_pending(self, value):
+        if value != self._opponent_move_pending:
+            self._opponent_move_pending = value
+            self.request_push()
+
+    def request_push(self):
+        """
+        Planuje wysłanie aktualnego stanu LED i statusu do ESP32.
+
+        Zmiany zgłoszone w oknie LED_PUSH_COALESCE_DELAY są łączone w jeden zapis,
+        więc seria wywołań set_led trafia do szachownicy jako pojedyncza ramka.
+        """
+        if not self.connected:
+            return
+
+        with self._push_lock:
+            if self._push_timer is not None:
+                return
+            self._push_timer = self.server.scheduler.call_later(LED_PUSH_COALESCE_DELAY, self._push_state)
+
+    def _push_state(self):
+        """Wysyła stan LED i status, jeśli różnią się od ostatnio wysłanych."""
+        with self._push_lock:
+            self._push_timer = None
+
+        with self._lock:
+            leds_with_colors = self._compose_leds(self.occupancy or 0)
+            game_status = self.get_status()
+            current_led_states = self._led_states(leds_with_colors)
+
+            if current_led_states == self.previous_led_states and game_status == self.previous_status:
+                return
+
+            self.previous_led_states = current_led_states
+            self.previous_status = game_status
+            # W trybie delta zmiana niewidoczna dla ESP32 (np. dioda "off") dałaby pustą ramkę
+            if self.led_encoder is not None and self.led_encoder.is_unchanged(leds_with_colors, game_status):
+                return
+            LED_PUSHES.inc()
+            try:
+                self._send_leds(leds_with_colors, game_status)
+            except OSError as e:
+                print(f"Błąd wysyłania aktualizacji do ESP32 ({self.board_id}): {e}")
+
+    def _send_leds(self, leds_with_colors, game_status):
+        """Wysyła stan LED i status - jako pełną listę lub ramkę delta, zależnie od negocjacji."""
+        if self.led_encoder is not None:
+            return self.send(self.led_encoder.encode(leds_with_colors, game_status))
+        return self.send({
+            "leds": leds_with_colors,
+            "status": game_status
+        })
+
+    def set_game_mode(self, enabled=True):
+        """Włącza lub wyłącza tryb gry."""
+        self.game_mode = enabled
+        print(f"DEBUG: Tryb gry {'włączony' if enabled else 'wyłączony'} ({self.board_id})")
+
+    def handle_message(self, message):
+        """Przetwarza jedną wiadomość od ESP32 i wysyła odpowiedź, jeśli jest potrzebna."""
+        with self._lock:
+            started = metrics.start()
+            self._handle_message(message)
+            STAGE_HANDLE.observe_since(started)
+
+    def _handle_message(self, message):
+        # Negocjacja formatu ramek
+        if isinstance(message, dict) and message.get("type") == "hello":
+            self.protocol = choose_protocol(message.get("protocols"))
+            features = choose_features(message.get("features"))
+            self.led_encoder = LedDeltaEncoder() if FEATURE_LED_DELTA in features else None
+            print(f"ESP32 ({self.board_id}) używa protokołu: {self.protocol} {features}")
+            self.send({"type": "hello", "protocol": self.protocol, "features": features})
+            return
+
+        # Potwierdzenie ramki LED w trybie delta
+        if isinstance(message, dict) and message.get("type") == "led_ack":
+            if self.led_encoder is not None:
+                self.led_encoder.acknowledge(message.get("seq", 0), message.get("gap", False))
+                if self.led_encoder.need_keyframe:
+                    # Luka w sekwencji - wyślij pełny stan
+                    LED_RESENDS.inc()
+                    leds_with_colors = self._compose_leds(self.occupancy or 0)
+                    self.previous_led_states = self._led_states(leds_with_colors)
+                    self.previous_status = self.get_status()
+                    self._send_leds(leds_with_colors, self.previous_status)
+            return
+
+        if message.get("type") != "reed_state":
+            return
+
+        # Sprawdź zdarzenie - stan Reed jest już zamieniony na mapę zajętości przy dekodowaniu ramki
+        event_type = message.get("event", "unknown")
+        event_type = FIRMWARE_EVENT_ALIASES.get(event_type, event_type)
+        occupancy = message["occupancy"]
+
+        #print(f"Odebrano dane od ESP32 - zdarzenie: {event_type}")
+
+        # Wykryj zmiany w przełącznikach Reed
+        if self.occupancy is not None:
+            started = metrics.start()
+            self._detect_reed_changes(self.occupancy, occupancy)
+            STAGE_REED_CHANGES.observe_since(started)
+
+        # Aktualizuj poprzedni stan
+        self.occupancy = occupancy
+
+        # Przygotuj listę LED do zapalenia
+        started = metrics.start()
+        leds_with_colors = self._compose_leds(occupancy)
+        STAGE_LEDS.observe_since(started)
+
+        # Sprawdź czy szachownica jest gotowa
+        was_ready = self.board_ready
+        self.board_ready = is_occupancy_ready(occupancy)
+
+        # Jeśli stan gotowości się zmienił, wywołaj callback
+        if self.board_ready and not was_ready and self.on_board_ready_callback:
+            self.custom_leds = []  # Wyczyść niestandardowe diody
+
+            # Wyślij natychmiastową aktualizację do ESP32
+            self._send_leds([], "Szachownica gotowa. Podaj ID partii.")
+            self._board_ready_pending = True
+
+        # Przekaż zdarzenia logice gry (także zaległe, jeśli kolejka magistrali była pełna)
+        self._publish_events()
+
+        # Przygotuj status gry
+        game_status = self.get_status()
+
+        # Określ, czy trzeba wysłać odpowiedź na podstawie zdarzenia
+        send_response = False
+
+        if event_type == "unknown":
+            send_response = True
+
+        # 1. Heartbeat - zawsze odpowiadaj aby potwierdzić połączenie
+        if event_type == "heartbeat":
+            send_response = True
+
+        # 2. Zmiana fazy gry - zawsze odpowiadaj
+        elif event_type == "phase_change":
+            send_response = True
+
+        # 3. Zmiana stanu Reed - odpowiadaj w zależności od fazy gry
+        elif event_type == "reed_change":
+            # W trybie gry
+            if self.game_mode:
+                # Jeśli jest tura gracza - zawsze odpowiadaj na zmiany Reed
+                if self.is_player_turn:
+                    send_response = True
+                    print("Wykryto ruch gracza w jego turze - wysyłam odpowiedź")
+                # Jeśli wykonujemy ruch przeciwnika - też odpowiadaj
+                elif self.opponent_move_pending:
+                    send_response = True
+                    print(
+                        "Wykryto zmianę podczas wykonywania ruchu przeciwnika - wysyłam odpowiedź")
+            else:
+                # W trybie ustawiania - odpowiadaj na zmiany Reed
+                send_response = True
+
+        # Sprawdź, czy stan LED się zmienił
+        current_led_states = self._led_states(leds_with_colors)
+
+        led_state_changed = (self.previous_led_states != current_led_states)
+
+        # Wyślij odpowiedź jeśli:
+        # - Zdarzenie wymaga odpowiedzi
+        # - Stan LED się zmienił
+        # - To pierwsza odpowiedź
+        if send_response or led_state_changed or not self.previous_led_states:
+            self.previous_led_states = current_led_states.copy()
+            self.previous_status = game_status
+
+            self._send_leds(leds_with_colors, game_status)
+
+            #print(f"Wysłano odpowiedź na zdarzenie: {event_type}")
+
+    def _compose_leds(self, occupancy):
+        """Łączy diody ustawione przez logikę gry ze standardowym podświetleniem."""
+        leds_with_colors = []
+
+        # Dodaj niestandardowe diody
+        custom_leds_positions = set()
+        for custom_led in self.custom_leds.copy():
+            led_num = custom_led["led"]
+            color = custom_led["color"]
+            blink = custom_led.get("blink", False)
+
+            leds_with_colors.append({
+                "led": led_num,
+                "color": color,
+                "blink": blink
+            })
+            custom_leds_positions.add(led_num)
+
+        # Dodaj standardowe podświetlenia w trybie ustawiania
+        if not self.game_mode:
+            standard_leds = process_occupancy(occupancy, self.wiring, self.pulse)
+            for led_info in standard_leds:
+                if led_info["led"] not in custom_leds_positions:
+                    leds_with_colors.append(led_info)
+
+        return leds_with_colors
+
+    def _led_states(self, leds_with_colors):
+        """Zwraca słownik stanów LED do porównywania zmian."""
+        current_led_states = {}
+        for led_info in leds_with_colors:
+            led_num = led_info["led"]
+            current_led_states[led_num] = f"{led_num}:{led_info['color']}:{led_info.get('blink', False)}"
+        return current_led_states
+
+    def get_status(self):
+        """Zwraca tekst statusu gry wyświetlany na ESP32."""
+        game_status = "Ustaw figury w pozycji startowej"
+        if self.board_ready:
+            if self.game_mode:
+                if self.is_player_turn:
+                    game_status = "Twoj ruch! Podnieś figurę, którą chcesz ruszyć."
+                else:
+                    if self.opponent_move_pending:
+                        game_status = "Wykonaj ruch przeciwnika na szachownicy."
+                    else:
+                        game_status = "Oczekiwanie na ruch przeciwnika..."
+            else:
+                game_status = "Szachownica gotowa. Podaj ID partii."
+        return game_status
+
+    def _detect_reed_changes(self, previous_occupancy, current_occupancy):
+        """Zapamiętuje nowy stan Reed - zmiany względem stanu przekazanego logice gry wyśle _publish_events()."""
+        if self._reed_delivered is None:
+            self._reed_delivered = previous_occupancy
+        self._reed_latest = current_occupancy
+
+    def _publish_events(self):
+        """Publikuje zaległe zdarzenia na magistrali bez czekania - przy pełnej kolejce ponowienie przy następnej ramce."""
+        event_bus = self.server.event_bus
+        if self._board_ready_pending:
+            if not self.on_board_ready_callback or event_bus.try_publish(self.board_id, self.on_board_ready_callback):
+                self._board_ready_pending = False
+        if not self._reed_scheduled and self._reed_latest != self._reed_delivered:
+            # Jedno zaplanowane przekazanie na raz - zachowuje kolejność i łączy kolejne zmiany
+            # (flaga przed publikacją - magistrala inline przekazuje zmiany od razu)
+            self._reed_scheduled = True
+            if not event_bus.try_publish(self.board_id, self._deliver_reed_changes):
+                self._reed_scheduled = False
+
+    def _deliver_reed_changes(self):
+        """Przekazuje logice gry zmiany Reed od ostatnio przekazanego do najnowszego stanu (wątek magistrali)."""
+        with self._lock:
+            self._reed_scheduled = False
+            previous_occupancy, current_occupancy = self._reed_delivered, self._reed_latest
+            self._reed_delivered = current_occupancy
+        if previous_occupancy is None or current_occupancy is None:
+            return
+
+        changes = []
+
+        # Bity, które różnią się między poprzednim i obecnym stanem
+        changed = previous_occupancy ^ current_occupancy
+        while changed:
+            lowest = changed & -changed
+            square = lowest.bit_length() - 1
+            changed ^= lowest
+
+            # Dodaj informację o zmianie
+            changes.append({
+                "position": SQUARE_NAMES[square],
+                "from_state": (previous_occupancy >> square) & 1,
+                "to_state": (current_occupancy >> square) & 1
+            })
+
+        # Jeśli wykryto zmiany, obsłuż je
+        if changes and self.on_reed_change_callback:
+            self.on_reed_change_callback(changes)
+
+    def set_led(self, position, color, blink=False):
+        """Ustawia diodę LED na określonej pozycji."""
+        # Sprawdź czy pozycja jest prawidłowa
+        led_num = self.wiring.led_for_position(position)
+        if led_num is not None:
+            # Sprawdź czy ta dioda już jest na liście
+            for i, led in enumerate(self.custom_leds):
+                if led.get("led") == led_num:
+                    # Aktualizuj istniejącą diodę
+                    self.custom_leds[i] = {"led": led_num, "color": color, "blink": blink}
+                    self.request_push()
+                    return
+
+            # Dodaj nową diodę
+            self.custom_leds.append({"led": led_num, "color": color, "blink": blink})
+            self.request_push()
+
+    def clear_led(self, position):
+        """Usuwa diodę LED z określonej pozycji."""
+        led_num = self.wiring.led_for_position(position)
+        if led_num is not None:
+            # Usuń diodę z listy
+            self.custom_leds = [led for led in self.custom_leds if led.get("led") != led_num]
+            self.request_push()
+
+    def clear_all_leds(self):
+        """Usuwa wszystkie niestandardowe diody LED."""
+        self.custom_leds = []
+        self.request_push()
+
+
+def _session_property(name):
+    """Tworzy właściwość serwera delegującą do domyślnej sesji szachownicy."""
+    def getter(self):
+        return getattr(self.session, name)
+
+    def setter(self, value):
+        setattr(self.session, name, value)
+
+    return property(getter, setter)
+
 
 class ChessServer:
-    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, on_board_ready=None, on_reed_change=None):
-        """Inicjalizacja serwera szachownicy."""
+    # Stan szachownicy w trybie jednej szachownicy jest przechowywany w domyślnej sesji
+    board_ready = _session_property("board_ready")
+    custom_leds = _session_property("custom_leds")
+    previous_reed_data = _session_property("previous_reed_data")
+    occupancy = _session_property("occupancy")
+    game_mode = _session_property("game_mode")
+    is_player_turn = _session_property("is_player_turn")
+    opponent_move_pending = _session_property("opponent_move_pending")
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, on_board_ready=None, on_reed_change=None,
+                 use_asyncio=False, on_new_session=None, wiring=WIRING, event_bus=None, clock=None):
+        """
+        Inicjalizacja serwera szachownicy.
+
+        W trybie asyncio (use_asyncio=True) serwer obsługuje wiele szachownic
+        jednocześnie - każde połączenie dostaje własną sesję BoardSession.
+        Callback on_new_session(session) pozwala podpiąć logikę gry do nowej szachownicy.
+        Parametr wiring (config.compile_wiring) pozwala obsłużyć inny układ okablowania.
+
+        Callbacki on_board_ready i on_reed_change wywoływane są przez magistralę zdarzeń
+        (event_bus.EventBus) poza pętlą obsługi gniazda - w kolejności zdarzeń danej szachownicy.
+        clock (clock.SimulatedClock) pozwala prowadzić terminy serwera w czasie wirtualnym.
+        """
         self.host = host
         self.port = port
         self.running = False
         self.server_socket = None
         self.on_board_ready_callback = on_board_ready
         self.on_reed_change_callback = on_reed_change
-        self.board_ready = False
-        self.last_board_ready_state = False
-        self.custom_leds = []
-        self.previous_reed_data = None
+        self.on_new_session_callback = on_new_session
+        self.use_asyncio = use_asyncio
 
-        self.game_mode = False
+        self.wiring = wiring
+        self.BUFFER_SIZE = BUFFER_SIZE
 
-        # Stan pulsacji dla migających diod
-        self.pulse_state = False
-        self.last_pulse_change = time.time()
+        # Magistrala zdarzeń dla callbacków logiki gry
+        self.event_bus = event_bus or EventBus(name="chess-server-events")
 
-        # Dodane pola do wyświetlania statusu
-        self.is_player_turn = False
-        self.opponent_move_pending = False
+        # Planista wypychania stanu LED do szachownic (jeden wątek dla wszystkich sesji)
+        self.clock = clock or SYSTEM_CLOCK
+        self.scheduler = TimerScheduler(name="chess-server", clock=self.clock)
+
+        # Sesje szachownic: {board_id: BoardSession}
+        self.sessions = {}
+        self._sessions_lock = threading.Lock()
+        self.session = self._get_session("default")
+
+        # Pętla zdarzeń i serwer w trybie asyncio
+        self._loop = None
+        self._async_server = None
 
     def start(self):
         """Uruchamia serwer w osobnym wątku."""
         self.running = True
-        server_thread = threading.Thread(target=self._run_server)
+        self.scheduler.start()
+        self.event_bus.start()
+        target = self._run_async_server_thread if self.use_asyncio else self._run_server
+        server_thread = threading.Thread(target=target)
         server_thread.daemon = True
         server_thread.start()
         return server_thread
@@ -41,6 +559,13 @@ class ChessServer:
     def stop(self):
         """Zatrzymuje serwer."""
         self.running = False
+        self.scheduler.stop()
+        self.event_bus.stop()
+        if self._loop and self._async_server:
+            try:
+                self._loop.call_soon_threadsafe(self._async_server.close)
+            except RuntimeError:
+                pass
         if self.server_socket:
             try:
                 self.server_socket.close()
@@ -49,8 +574,20 @@ class ChessServer:
 
     def set_game_mode(self, enabled=True):
         """Włącza lub wyłącza tryb gry."""
-        self.game_mode = enabled
-        print(f"DEBUG: Tryb gry {'włączony' if enabled else 'wyłączony'}")
+        self.session.set_game_mode(enabled)
+
+    def _get_session(self, board_id):
+        """Zwraca sesję szachownicy o podanym ID, tworząc ją w razie potrzeby."""
+        with self._sessions_lock:
+            session = self.sessions.get(board_id)
+            if session is not None:
+                return session
+            session = BoardSession(self, board_id)
+            self.sessions[board_id] = session
+
+        if self.on_new_session_callback:
+            self.on_new_session_callback(session)
+        return session
 
     def _run_server(self):
         """Uruchamia serwer w wątku."""
@@ -75,197 +612,36 @@ class ChessServer:
         except KeyboardInterrupt:
             print("\nWyłączanie serwera...")
         except Exception as e:
-            print(f"Błąd serwera: {e}")
+            if self.running:
+                print(f"Błąd serwera: {e}")
         finally:
             if self.server_socket:
                 self.server_socket.close()
 
     def _handle_client(self, client_socket):
         """Obsługuje połączenie od klienta (ESP32) - model zdarzeniowy."""
+        session = self.session
+        token = session.attach(client_socket.sendall, lambda: self._shutdown_socket(client_socket))
         try:
             client_socket.settimeout(5.0)
-            buffer = b""
-
-            # Stan LED dla porównywania zmian
-            previous_led_states = {}
+            decoder = FrameDecoder(capacity=self.BUFFER_SIZE * 4)
 
             print(f"Połączono z ESP32: {client_socket.getpeername()}")
 
             while self.running:
                 try:
-                    # Odbierz dane od ESP32
-                    data = client_socket.recv(self.BUFFER_SIZE)
-                    if not data:
+                    # Odbierz dane od ESP32 bezpośrednio do bufora dekodera
+                    received = decoder.recv_into(client_socket)
+                    BYTES_RECEIVED.inc(received)
+                    if not received:
                         print("Klient rozłączony")
+                        for frame in decoder.flush():
+                            self._process_frame(session, frame)
                         break
 
-                    buffer += data
-
-                    # Przetwarzaj tylko kompletne dane JSON
-                    json_start = buffer.find(b'{')
-                    if json_start >= 0:
-                        # Zliczanie nawiasów do znalezienia końca JSON
-                        open_braces = 0
-                        json_end = -1
-
-                        for i in range(json_start, len(buffer)):
-                            if buffer[i] == ord('{'):
-                                open_braces += 1
-                            elif buffer[i] == ord('}'):
-                                open_braces -= 1
-
-                            if open_braces == 0:
-                                json_end = i + 1
-                                break
-
-                        # Jeśli znaleziono kompletny JSON
-                        if json_end > 0:
-                            json_data = buffer[json_start:json_end]
-                            buffer = buffer[json_end:]  # Zachowaj resztę danych
-
-                            # Przetwarzanie kompletnego JSON
-                            try:
-                                data_str = json_data.decode('utf-8').strip()
-
-                                message = json.loads(data_str)
-
-                                # Sprawdź typ wiadomości i zdarzenie
-                                event_type = "unknown"
-                                if isinstance(message, dict):
-                                    if message.get("type") == "reed_state":
-                                        reed_data = message.get("data", {})
-                                        event_type = message.get("event", "unknown")
-                                    else:
-                                        reed_data = message
-                                else:
-                                    reed_data = message
-
-                                #print(f"Odebrano dane od ESP32 - zdarzenie: {event_type}")
-
-                                # Zachowaj kopię danych
-                                original_reed_data = reed_data.copy()
-
-                                # Wykryj zmiany w przełącznikach Reed
-                                reed_changes = None
-                                if self.previous_reed_data:
-                                    reed_changes = self._detect_reed_changes(self.previous_reed_data, reed_data)
-
-                                # Aktualizuj poprzedni stan
-                                self.previous_reed_data = reed_data.copy()
-
-                                # Przygotuj listę LED do zapalenia
-                                leds_with_colors = []
-
-                                # Dodaj niestandardowe diody
-                                custom_leds_positions = set()
-                                if hasattr(self, 'custom_leds') and self.custom_leds:
-                                    for custom_led in self.custom_leds.copy():
-                                        led_num = custom_led["led"]
-                                        color = custom_led["color"]
-                                        blink = custom_led.get("blink", False)
-
-                                        leds_with_colors.append({
-                                            "led": led_num,
-                                            "color": color,
-                                            "blink": blink
-                                        })
-                                        custom_leds_positions.add(led_num)
-
-                                # Dodaj standardowe podświetlenia w trybie ustawiania
-                                if not hasattr(self, 'game_mode') or not self.game_mode:
-                                    standard_leds = process_data(reed_data)
-                                    for led_info in standard_leds:
-                                        if led_info["led"] not in custom_leds_positions:
-                                            leds_with_colors.append(led_info)
-
-                                # Sprawdź czy szachownica jest gotowa
-                                was_ready = self.board_ready
-                                self.board_ready = is_board_ready(reed_data)
-
-                                # Jeśli stan gotowości się zmienił, wywołaj callback
-                                if self.board_ready and not was_ready and self.on_board_ready_callback:
-                                    self.custom_leds = []  # Wyczyść niestandardowe diody
-
-                                    # Wyślij natychmiastową aktualizację do ESP32
-                                    response = json.dumps({
-                                        "leds": [],
-                                        "status": "Szachownica gotowa. Podaj ID partii."
-                                    })
-                                    client_socket.sendall(response.encode() + b'\n')
-                                    self.on_board_ready_callback()
-
-                                # Przygotuj status gry
-                                game_status = "Ustaw figury w pozycji startowej"
-                                if self.board_ready:
-                                    if hasattr(self, 'game_mode') and self.game_mode:
-                                        if hasattr(self, 'is_player_turn') and self.is_player_turn:
-                                            game_status = "Twoj ruch! Podnieś figurę, którą chcesz ruszyć."
-                                        else:
-                                            if hasattr(self, 'opponent_move_pending') and self.opponent_move_pending:
-                                                game_status = "Wykonaj ruch przeciwnika na szachownicy."
-                                            else:
-                                                game_status = "Oczekiwanie na ruch przeciwnika..."
-                                    else:
-                                        game_status = "Szachownica gotowa. Podaj ID partii."
-
-                                # Określ, czy trzeba wysłać odpowiedź na podstawie zdarzenia
-                                send_response = False
-
-                                if event_type == "unknown":
-                                    send_response = True
-
-                                # 1. Heartbeat - zawsze odpowiadaj aby potwierdzić połączenie
-                                if event_type == "heartbeat":
-                                    send_response = True
-
-                                # 2. Zmiana fazy gry - zawsze odpowiadaj
-                                elif event_type == "phase_change":
-                                    send_response = True
-
-                                # 3. Zmiana stanu Reed - odpowiadaj w zależności od fazy gry
-                                elif event_type == "reed_change":
-                                    # W trybie gry
-                                    if hasattr(self, 'game_mode') and self.game_mode:
-                                        # Jeśli jest tura gracza - zawsze odpowiadaj na zmiany Reed
-                                        if hasattr(self, 'is_player_turn') and self.is_player_turn:
-                                            send_response = True
-                                            print("Wykryto ruch gracza w jego turze - wysyłam odpowiedź")
-                                        # Jeśli wykonujemy ruch przeciwnika - też odpowiadaj
-                                        elif hasattr(self, 'opponent_move_pending') and self.opponent_move_pending:
-                                            send_response = True
-                                            print(
-                                                "Wykryto zmianę podczas wykonywania ruchu przeciwnika - wysyłam odpowiedź")
-                                    else:
-                                        # W trybie ustawiania - odpowiadaj na zmiany Reed
-                                        send_response = True
-
-                                # Sprawdź, czy stan LED się zmienił
-                                current_led_states = {}
-                                for led_info in leds_with_colors:
-                                    led_num = led_info["led"]
-                                    led_key = f"{led_num}:{led_info['color']}:{led_info.get('blink', False)}"
-                                    current_led_states[led_num] = led_key
-
-                                led_state_changed = (previous_led_states != current_led_states)
-
-                                # Wyślij odpowiedź jeśli:
-                                # - Zdarzenie wymaga odpowiedzi
-                                # - Stan LED się zmienił
-                                # - To pierwsza odpowiedź
-                                if send_response or led_state_changed or not previous_led_states:
-                                    previous_led_states = current_led_states.copy()
-
-                                    response = json.dumps({
-                                        "leds": leds_with_colors,
-                                        "status": game_status
-                                    })
-                                    client_socket.sendall(response.encode() + b'\n')
-
-                                    #print(f"Wysłano odpowiedź na zdarzenie: {event_type}")
-
-                            except json.JSONDecodeError as e:
-                                print(f"Błąd parsowania JSON: {e}")
-                                print(f"Dane: '{data_str}'")
+                    # Przetwarzaj wszystkie kompletne ramki (JSON lub binarne) z bufora
+                    for frame in decoder.frames():
+                        self._process_frame(session, frame)
 
                 except socket.timeout:
                     # Timeout jest OK
@@ -280,68 +656,183 @@ class ChessServer:
         except Exception as e:
             print(f"Błąd obsługi klienta: {e}")
         finally:
+            session.detach(token)
             client_socket.close()
             print("Połączenie z ESP32 zakończone")
 
-    def _detect_reed_changes(self, previous_data, current_data):
-        """Wykrywa zmiany w stanach przełączników Reed i obsługuje je."""
-        changes = []
+    @staticmethod
+    def _shutdown_socket(client_socket):
+        """Przerywa połączenie zastąpione nowszym - oczekujący recv zwraca 0 bajtów."""
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _decode_frame(self, frame):
+        """Dekoduje ramkę, zapisując czas dekodowania i liczniki ramek."""
+        started = metrics.start()
+        message = self._parse_frame(frame)
+        STAGE_DECODE.observe_since(started)
+        if message is None:
+            FRAMES_INVALID.inc()
+        elif is_binary_frame(frame):
+            FRAMES_RECEIVED_BINARY.inc()
+        else:
+            FRAMES_RECEIVED_JSON.inc()
+        return message
+
+    def _parse_frame(self, frame):
+        """
+        Dekoduje ramkę JSON lub binarną. Zwraca None, jeśli ramka jest uszkodzona.
+
+        Stan Reed z ramek JSON jest tu jednorazowo zamieniany na 64-bitową mapę zajętości
+        ("occupancy") - dalsza logika nie korzysta już ze słownika MCP/port/pin.
+        """
+        if is_binary_frame(frame):
+            try:
+                return decode_binary_frame(frame)
+            except ValueError as e:
+                print(f"Błąd dekodowania ramki binarnej: {e}")
+                return None
 
-        # Porównaj poprzedni i obecny stan Reed
-        for mcp_name, ports in current_data.items():
-            for port_name, pins in ports.items():
-                for pin_name, current_state in pins.items():
-                    # Pobierz poprzedni stan pinu
-                    previous_state = previous_data.get(mcp_name, {}).get(port_name, {}).get(pin_name, 0)
-
-                    # Jeśli stan się zmienił
-                    if current_state != previous_state:
-                        # Pobierz numer LED i pozycję szachową
-                        led_num = self.MAPPING[mcp_name][port_name][pin_name]
-                        chess_pos = self.LED_TO_CHESS.get(led_num)
-
-                        if chess_pos:
-                            # Dodaj informację o zmianie
-                            changes.append({
-                                "position": chess_pos,
-                                "from_state": previous_state,
-                                "to_state": current_state
-                            })
+        data_str = ""
+        try:
+            data_str = frame.decode('utf-8').strip()
+            message = json.loads(data_str)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"Błąd parsowania JSON: {e}")
+            print(f"Dane: '{data_str}'")
+            return None
+
+        if not isinstance(message, dict):
+            print(f"Nieobsługiwany format ramki: '{data_str}'")
+            return None
+
+        if message.get("type") == "reed_state":
+            message["occupancy"] = reed_to_bitboard(message.get("data", {}), self.wiring)
+        elif "type" not in message:
+            # Stare oprogramowanie wysyła sam stan Reed bez koperty
+            message = {"type": "reed_state", "event": "unknown", "occupancy": reed_to_bitboard(message, self.wiring)}
+        return message
+
+    def _process_frame(self, session, frame):
+        """Dekoduje i przetwarza kompletną ramkę od ESP32."""
+        message = self._decode_frame(frame)
+        if message is not None:
+            session.handle_message(message)
+
+    def _run_async_server_thread(self):
+        """Uruchamia pętlę asyncio serwera wielu szachownic w wątku."""
+        try:
+            asyncio.run(self._run_async_server())
+        except Exception as e:
+            if self.running:
+                print(f"Błąd serwera: {e}")
 
-        # Jeśli wykryto zmiany, obsłuż je
-        if changes and self.on_reed_change_callback:
-            self.on_reed_change_callback(changes)
+    async def _run_async_server(self):
+        """Serwer asyncio - każda szachownica obsługiwana współbieżnie."""
+        self._loop = asyncio.get_running_loop()
+        self._async_server = await asyncio.start_server(
+            self._handle_client_async, self.host, self.port, reuse_address=True
+        )
+        print(f"Serwer (asyncio) uruchomiony na {self.host}:{self.port}")
 
-    def set_led(self, position, color, blink=False):
-        """Ustawia diodę LED na określonej pozycji."""
-        if not hasattr(self, 'custom_leds'):
-            self.custom_leds = []
+        try:
+            async with self._async_server:
+                await self._async_server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    async def _handle_client_async(self, reader, writer):
+        """Obsługuje połączenie jednej szachownicy w trybie asyncio."""
+        loop = asyncio.get_running_loop()
+        peer = writer.get_extra_info('peername')
+        print(f"Połączono z ESP32: {peer}")
+
+        def write(data):
+            transport = writer.transport
+            if transport.is_closing():
+                return
+            if transport.get_write_buffer_size() + len(data) > MAX_WRITE_BUFFER:
+                # ESP32 nie odbiera danych - zerwij połączenie zamiast buforować bez końca
+                print(f"ESP32 {peer} nie odbiera danych ({transport.get_write_buffer_size()} B w buforze) "
+                      f"- zamykam połączenie")
+                transport.abort()
+                return
+            writer.write(data)
+
+        def send(data):
+            # Wysyłanie jest bezpieczne z dowolnego wątku
+            loop.call_soon_threadsafe(write, data)
+
+        def close():
+            # Połączenie zastąpione nowszym połączeniem tej samej szachownicy
+            print(f"ESP32 {peer} połączył się ponownie - zamykam poprzednie połączenie")
+            loop.call_soon_threadsafe(writer.transport.abort)
+
+        session = None
+        decoder = FrameDecoder(capacity=self.BUFFER_SIZE * 4)
+        try:
+            while self.running:
+                data = await reader.read(self.BUFFER_SIZE)
+                if data:
+                    BYTES_RECEIVED.inc(len(data))
+                    decoder.feed(data)
+                    frames = decoder.frames()
+                else:
+                    print(f"Klient rozłączony: {peer}")
+                    frames = decoder.flush()
+
+                messages = []
+                for frame in frames:
+                    message = self._decode_frame(frame)
+                    if message is None:
+                        continue
+
+                    # Sesję wiążemy przy pierwszej ramce - ESP32 może przedstawić się polem "board",
+                    # w przeciwnym razie sesja należy do połączenia (adres IP i port), bo za jednym
+                    # adresem IP (NAT) może działać kilka szachownic
+                    if session is None:
+                        board_id = message.get("board") if isinstance(message, dict) else None
+                        if not board_id:
+                            board_id = f"{peer[0]}:{peer[1]}" if peer else id(writer)
+                        session = self._get_session(board_id)
+                        session.attach(send, close)
+                    messages.append(message)
+
+                # Logika gry (blokada sesji, LED) działa w puli wątków - wolna szachownica nie
+                # wstrzymuje pętli zdarzeń innych szachownic. Ramki jednego połączenia są
+                # obsługiwane po kolei, bo na wynik czekamy przed kolejnym odczytem
+                if messages:
+                    await loop.run_in_executor(None, self._handle_messages, session, messages)
+
+                if not data:
+                    break
 
-        # Sprawdź czy pozycja jest prawidłowa
-        if position in self.CHESS_TO_LED:
-            led_num = self.CHESS_TO_LED[position]
+        except ConnectionResetError:
+            print(f"Połączenie resetowane przez ESP32: {peer}")
+        except Exception as e:
+            print(f"Błąd obsługi klienta {peer}: {e}")
+        finally:
+            if session is not None:
+                session.detach(send)
+            writer.close()
+            print(f"Połączenie z ESP32 zakończone: {peer}")
 
-            # Sprawdź czy ta dioda już jest na liście
-            for i, led in enumerate(self.custom_leds):
-                if led.get("led") == led_num:
-                    # Aktualizuj istniejącą diodę
-                    self.custom_leds[i] = {"led": led_num, "color": color, "blink": blink}
-                    return
+    @staticmethod
+    def _handle_messages(session, messages):
+        """Obsługuje ramki jednego odczytu (w wątku puli wykonawców)."""
+        for message in messages:
+            session.handle_message(message)
 
-            # Dodaj nową diodę
-            self.custom_leds.append({"led": led_num, "color": color, "blink": blink})
+    def set_led(self, position, color, blink=False):
+        """Ustawia diodę LED na określonej pozycji."""
+        self.session.set_led(position, color, blink)
 
     def clear_led(self, position):
         """Usuwa diodę LED z określonej pozycji."""
-        if not hasattr(self, 'custom_leds'):
-            return
-
-        if position in self.CHESS_TO_LED:
-            led_num = self.CHESS_TO_LED[position]
-
-            # Usuń diodę z listy
-            self.custom_leds = [led for led in self.custom_leds if led.get("led") != led_num]
+        self.session.clear_led(position)
 
     def clear_all_leds(self):
         """Usuwa wszystkie niestandardowe diody LED."""
-        self.custom_leds = []
+        self.session.clear_all_leds()
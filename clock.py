@@ -0,0 +1,95 @@
+# clock.py
+"""
+Zegar wstrzykiwany do planisty (scheduler.TimerScheduler), obsługi ruchów i serwera.
+
+SystemClock to zwykły czas monotoniczny. SimulatedClock to czas wirtualny: stoi
+w miejscu, dopóki nie zostanie przesunięty przez advance(), a podpięci do niego
+planiści nie mają własnego wątku - ich zadania wykonywane są w wątku przesuwającym
+czas, w kolejności terminów. Terminy (rozpoznanie ruchu, łączenie wypychania LED,
+pulsowanie diod) mijają więc natychmiast i zawsze w tej samej kolejności.
+"""
+import threading
+import time
+
+
+class SystemClock:
+    """Czas rzeczywisty (monotoniczny)."""
+
+    simulated = False
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Czas wirtualny przesuwany ręcznie."""
+
+    simulated = True
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._schedulers = []
+        self._lock = threading.RLock()
+
+    def now(self):
+        return self._now
+
+    def attach(self, scheduler):
+        """Podpina planistę - jego zadania wykonuje advance()."""
+        with self._lock:
+            if scheduler not in self._schedulers:
+                self._schedulers.append(scheduler)
+
+    def detach(self, scheduler):
+        with self._lock:
+            if scheduler in self._schedulers:
+                self._schedulers.remove(scheduler)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """Przesuwa czas o seconds, wykonując po drodze zaplanowane zadania w kolejności terminów."""
+        with self._lock:
+            target = self._now + seconds
+            while True:
+                due = self._next_due(target)
+                if due is None:
+                    break
+                deadline, scheduler = due
+                self._now = max(self._now, deadline)
+                scheduler.run_due(self._now)
+            self._now = max(self._now, target)
+
+    def run_until_idle(self, limit=3600.0):
+        """
+        Przesuwa czas do kolejnych terminów, aż planiści nie będą mieli zadań.
+
+        Zwraca czas wirtualny, który upłynął. limit (s) chroni przed zadaniami,
+        które planują się bez końca.
+        """
+        with self._lock:
+            started = self._now
+            while True:
+                due = self._next_due(started + limit)
+                if due is None:
+                    break
+                deadline, scheduler = due
+                self._now = max(self._now, deadline)
+                scheduler.run_due(self._now)
+            return self._now - started
+
+    def _next_due(self, not_after):
+        """Zwraca (termin, planista) najbliższego zadania nie późniejszego niż not_after."""
+        best = None
+        for scheduler in self._schedulers:
+            deadline = scheduler.next_deadline()
+            if deadline is not None and deadline <= not_after and (best is None or deadline < best[0]):
+                best = (deadline, scheduler)
+        return best
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -41,6 +41,100 @@ CHESS_TO_LED = {
     "a8": 120, "b8": 118, "c8": 116, "d8": 114, "e8": 112, "f8": 110, "g8": 108, "h8": 106
 }
 
+
+
+def square_index(chess_pos):
+    """Zamienia pole szachowe (np. "e2") na indeks 0-63 (a1 = 0, b1 = 1, ..., h8 = 63)."""
+    return (int(chess_pos[1]) - 1) * 8 + (ord(chess_pos[0]) - ord('a'))
+
+
+# Nazwa pola dla każdego indeksu (a1 = 0, ..., h8 = 63)
+SQUARE_NAMES = [f"{chr(ord('a') + square % 8)}{square // 8 + 1}" for square in range(64)]
+
+
+class WiringTable:
+    """
+    Skompilowane okablowanie szachownicy: indeks pola <-> (mcp, port, pin) <-> numer LED.
+
+    Tablice są płaskie i indeksowane numerem pola lub diody, więc każde odwzorowanie
+    jest O(1). Inny układ okablowania obsługuje się, kompilując inną tablicę
+    funkcją compile_wiring i przekazując ją do serwera.
+    """
+
+    def __init__(self, name, pins, square_to_pin, square_to_led, led_to_square):
+        self.name = name
+        # Krotki (mcp, port, pin, indeks_pola) w kolejności odczytu przełączników Reed
+        self.pins = pins
+        self.square_to_pin = square_to_pin
+        self.square_to_led = square_to_led
+        # Indeks pola dla numeru LED (-1 dla diod bez przypisanego pola)
+        self.led_to_square = led_to_square
+
+    def led_for_position(self, chess_pos):
+        """Zwraca numer LED dla pola (np. "e2") lub None dla nieprawidłowego pola."""
+        if not isinstance(chess_pos, str) or len(chess_pos) != 2:
+            return None
+        if chess_pos[0] not in "abcdefgh" or chess_pos[1] not in "12345678":
+            return None
+        return self.square_to_led[square_index(chess_pos)]
+
+    def position_for_led(self, led_num):
+        """Zwraca pole szachowe dla numeru LED lub None."""
+        if 0 <= led_num < len(self.led_to_square) and self.led_to_square[led_num] >= 0:
+            return SQUARE_NAMES[self.led_to_square[led_num]]
+        return None
+
+    def pin_for_led(self, led_num):
+        """Zwraca (mcp, port, pin) przełącznika Reed pod diodą lub None."""
+        if 0 <= led_num < len(self.led_to_square) and self.led_to_square[led_num] >= 0:
+            return self.square_to_pin[self.led_to_square[led_num]]
+        return None
+
+
+def compile_wiring(mapping, led_to_chess, chess_to_led=None, name="default"):
+    """
+    Kompiluje mapowania MCP -> LED -> pole do tablic WiringTable.
+
+    Sprawdza, że każde z 64 pól ma dokładnie jeden przełącznik Reed i jedną diodę,
+    a (opcjonalne) mapowanie odwrotne jest spójne. Błędy zgłaszane są jako ValueError.
+    """
+    pins = []
+    square_to_pin = [None] * 64
+    square_to_led = [None] * 64
+
+    for mcp_name, ports in mapping.items():
+        for port_name, port_pins in ports.items():
+            for pin_name, led_num in port_pins.items():
+                chess_pos = led_to_chess.get(led_num)
+                if chess_pos is None:
+                    raise ValueError(f"Dioda {led_num} ({mcp_name}/{port_name}/{pin_name}) nie ma przypisanego pola")
+                square = square_index(chess_pos)
+                if square_to_pin[square] is not None:
+                    raise ValueError(f"Pole {chess_pos} ma więcej niż jeden przełącznik Reed")
+                square_to_pin[square] = (mcp_name, port_name, pin_name)
+                square_to_led[square] = led_num
+                pins.append((mcp_name, port_name, pin_name, square))
+
+    missing = [SQUARE_NAMES[square] for square in range(64) if square_to_pin[square] is None]
+    if missing:
+        raise ValueError(f"Brak przełączników Reed dla pól: {', '.join(missing)}")
+
+    if chess_to_led is not None:
+        for square, led_num in enumerate(square_to_led):
+            if chess_to_led.get(SQUARE_NAMES[square]) != led_num:
+                raise ValueError(f"Niespójne mapowanie pola {SQUARE_NAMES[square]}: "
+                                 f"{chess_to_led.get(SQUARE_NAMES[square])} != {led_num}")
+
+    led_to_square = [-1] * (max(square_to_led) + 1)
+    for square, led_num in enumerate(square_to_led):
+        led_to_square[led_num] = square
+
+    return WiringTable(name, tuple(pins), tuple(square_to_pin), tuple(square_to_led), tuple(led_to_square))
+
+
+# Skompilowane okablowanie używane domyślnie przez wszystkie moduły
+WIRING = compile_wiring(MAPPING, LED_TO_CHESS, CHESS_TO_LED)
+
 # Kolory LED
 COLOR_RED = "red"
 COLOR_GREEN = "green"
@@ -51,6 +145,58 @@ COLOR_ORANGE = "orange"
 SERVER_HOST = '0.0.0.0'
 SERVER_PORT = 5000
 BUFFER_SIZE = 4096
+# Okno łączenia zmian LED przed wypchnięciem ich do ESP32 (sekundy)
+LED_PUSH_COALESCE_DELAY = 0.02
+# Maksymalna liczba bajtów czekających na wysłanie do jednego ESP32 w trybie asyncio -
+# po jej przekroczeniu (szachownica nie odbiera danych) połączenie jest zamykane
+MAX_WRITE_BUFFER = 64 * 1024
+
+# Zachowanie oprogramowania ESP32 (arduino.txt) odtwarzane przez emulator (sekundy):
+# heartbeat co 500 ms, oczekiwanie na odpowiedź do 1 s, ponowne łączenie co 5 s
+ESP32_HEARTBEAT_INTERVAL = 0.5
+ESP32_RESPONSE_TIMEOUT = 1.0
+ESP32_RECONNECT_DELAY = 5.0
+
+# Magistrala zdarzeń: liczba wątków roboczych, rozmiar kolejki na wątek
+# i maksymalny czas oczekiwania na miejsce w kolejce (sekundy)
+EVENT_BUS_WORKERS = 4
+EVENT_QUEUE_SIZE = 256
+EVENT_PUBLISH_TIMEOUT = 0.1
+
+# Czas bez zmian przełączników Reed, po którym ruch na szachownicy uznawany jest za zakończony (sekundy)
+MOVE_SETTLE_DELAY = 0.5
+# Liczba pozycji w pamięci podręcznej ruchów legalnych i ich sygnatur
+MOVE_CACHE_SIZE = 256
 
 # Konfiguracja Lichess API
-LICHESS_API_TOKEN = ""
\ No newline at end of file
+LICHESS_API_TOKEN = ""
+LICHESS_API_URL = "https://lichess.org"
+# Liczba szachownic grających z tego samego konta - wspólny strumień zdarzeń (LichessHub)
+# uruchamiany jest tylko dla więcej niż jednej szachownicy
+BOARD_COUNT = 1
+
+# Strumienie NDJSON: limit czasu odczytu (Lichess wysyła pustą linię co kilka sekund),
+# opóźnienie ponownego połączenia (rośnie wykładniczo do wartości maksymalnej)
+# i przerwa po odpowiedzi 429 (zalecana przez Lichess minuta)
+STREAM_READ_TIMEOUT = 30.0
+STREAM_RECONNECT_DELAY = 0.5
+STREAM_RECONNECT_MAX_DELAY = 30.0
+RATE_LIMIT_DELAY = 60.0
+
+# Śledzenie partii poza Board API (odpytywanie eksportu): odstęp przy turze przeciwnika
+# to jego pozostały czas / WATCH_CLOCK_DIVISOR, ograniczony do [MIN, MAX] sekund
+WATCH_MIN_INTERVAL = 1.0
+WATCH_MAX_INTERVAL = 30.0
+WATCH_CLOCK_DIVISOR = 60.0
+
+# Wysyłanie ruchów: liczba prób i opóźnienie między nimi (rośnie wykładniczo do wartości maksymalnej)
+SUBMIT_MAX_ATTEMPTS = 5
+SUBMIT_RETRY_DELAY = 0.25
+SUBMIT_RETRY_MAX_DELAY = 4.0
+SUBMIT_TIMEOUT = 10.0
+
+# Metryki opóźnień i liczniki (format Prometheus) pod http://METRICS_HOST:METRICS_PORT/metrics.
+# Domyślnie wyłączone - w gorących ścieżkach kosztują wtedy jedno sprawdzenie flagi
+METRICS_ENABLED = False
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
@@ -1,57 +1,25 @@
-import pygame
 import socket
 import json
 import threading
 import time
-
-MAPPING = {
-    "MCP1": {
-        "PA": {"PA7": 16, "PA6": 18, "PA5": 20, "PA4": 22, "PA3": 24, "PA2": 26, "PA1": 28, "PA0": 30},
-        "PB": {"PB7": 1, "PB6": 3, "PB5": 5, "PB4": 7, "PB3": 9, "PB2": 11, "PB1": 13, "PB0": 15}
-    },
-    "MCP2": {
-        "PA": {"PA7": 46, "PA6": 48, "PA5": 50, "PA4": 52, "PA3": 54, "PA2": 56, "PA1": 58, "PA0": 60},
-        "PB": {"PB7": 31, "PB6": 33, "PB5": 35, "PB4": 37, "PB3": 39, "PB2": 41, "PB1": 43, "PB0": 45}
-    },
-    "MCP3": {
-        "PA": {"PA7": 76, "PA6": 78, "PA5": 80, "PA4": 82, "PA3": 84, "PA2": 86, "PA1": 88, "PA0": 90},
-        "PB": {"PB7": 61, "PB6": 63, "PB5": 65, "PB4": 67, "PB3": 69, "PB2": 71, "PB1": 73, "PB0": 75}
-    },
-    "MCP4": {
-        "PA": {"PA7": 106, "PA6": 108, "PA5": 110, "PA4": 112, "PA3": 114, "PA2": 116, "PA1": 118, "PA0": 120},
-        "PB": {"PB7": 91, "PB6": 93, "PB5": 95, "PB4": 97, "PB3": 99, "PB2": 101, "PB1": 103, "PB0": 105}
-    }
-}
-# Mapowanie numerów LED na pola szachownicy
-# Mapowanie numerów LED na pola szachownicy
-LED_TO_CHESS = {
-    1: "a1", 3: "b1", 5: "c1", 7: "d1", 9: "e1", 11: "f1", 13: "g1", 15: "h1",
-    16: "h2", 18: "g2", 20: "f2", 22: "e2", 24: "d2", 26: "c2", 28: "b2", 30: "a2",
-    31: "a3", 33: "b3", 35: "c3", 37: "d3", 39: "e3", 41: "f3", 43: "g3", 45: "h3",
-    46: "h4", 48: "g4", 50: "f4", 52: "e4", 54: "d4", 56: "c4", 58: "b4", 60: "a4",
-    61: "a5", 63: "b5", 65: "c5", 67: "d5", 69: "e5", 71: "f5", 73: "g5", 75: "h5",
-    76: "h6", 78: "g6", 80: "f6", 82: "e6", 84: "d6", 86: "c6", 88: "b6", 90: "a6",
-    91: "a7", 93: "b7", 95: "c7", 97: "d7", 99: "e7", 101: "f7", 103: "g7", 105: "h7",
-    106: "h8", 108: "g8", 110: "f8", 112: "e8", 114: "d8", 116: "c8", 118: "b8", 120: "a8"
-}
-
-CHESS_TO_LED = {
-    "a1": 1, "b1": 3, "c1": 5, "d1": 7, "e1": 9, "f1": 11, "g1": 13, "h1": 15,
-    "a2": 30, "b2": 28, "c2": 26, "d2": 24, "e2": 22, "f2": 20, "g2": 18, "h2": 16,
-    "a3": 31, "b3": 33, "c3": 35, "d3": 37, "e3": 39, "f3": 41, "g3": 43, "h3": 45,
-    "a4": 60, "b4": 58, "c4": 56, "d4": 54, "e4": 52, "f4": 50, "g4": 48, "h4": 46,
-    "a5": 61, "b5": 63, "c5": 65, "d5": 67, "e5": 69, "f5": 71, "g5": 73, "h5": 75,
-    "a6": 90, "b6": 88, "c6": 86, "d6": 84, "e6": 82, "f6": 80, "g6": 78, "h6": 76,
-    "a7": 91, "b7": 93, "c7": 95, "d7": 97, "e7": 99, "f7": 101, "g7": 103, "h7": 105,
-    "a8": 120, "b8": 118, "c8": 116, "d8": 114, "e8": 112, "f8": 110, "g8": 108, "h8": 106
-}
-
-# Mapowanie LED na piny MCP
-LED_TO_MCP_PIN = {}
-for mcp_name, ports in MAPPING.items():
-    for port_name, pins in ports.items():
-        for pin_name, led_num in pins.items():
-            LED_TO_MCP_PIN[led_num] = (mcp_name, port_name, pin_name)
+import argparse
+import copy
+import multiprocessing
+import select
+import zlib
+from config import (WIRING, ESP32_HEARTBEAT_INTERVAL, ESP32_RESPONSE_TIMEOUT, ESP32_RECONNECT_DELAY, SQUARE_NAMES,
+                    square_index)
+from board_protocol import (encode_hello, encode_reed_frame, encode_led_ack, bitboard_to_reed,
+                            LedDeltaDecoder, PROTOCOL_JSON, PROTOCOL_BINARY, FEATURE_LED_DELTA)
+from chess_logic import START_RANKS_MASK, MIDDLE_RANKS_MASK
+from chess_position import Position, iter_squares
+from game_playback import GamePlayer, PlaybackTiming, TIMINGS, load_game, random_game
+
+# pygame potrzebny jest tylko w trybie z oknem - tryb bez okna (--headless) działa bez niego
+try:
+    import pygame
+except ImportError:
+    pygame = None
 
 # Kolory RGB dla LED
 COLOR_MAP = {
@@ -62,9 +30,21 @@ COLOR_MAP = {
     "off": (50, 50, 50)
 }
 
+# Okres migania diod (s) - blinkInterval w oprogramowaniu
+BLINK_INTERVAL = 0.5
+
 
 class ChessboardSimulator:
-    def __init__(self, width=800, height=800, server_host='localhost', server_port=5000):
+    def __init__(self, width=800, height=800, server_host='localhost', server_port=5000, protocol=PROTOCOL_JSON,
+                 player=None):
+        """
+        Okno szachownicy - pola klika się, by postawić lub zdjąć figurę.
+
+        player (game_playback.GamePlayer) odtwarza partię na szachownicy w oknie;
+        bez niego szachownica startuje pusta.
+        """
+        if pygame is None:
+            raise RuntimeError("Symulator z oknem wymaga pygame (pip install pygame) - użyj --headless")
         pygame.init()
         self.width = width
         self.height = height
@@ -75,17 +55,22 @@ class ChessboardSimulator:
         self.server_host = server_host
         self.server_port = server_port
 
-        # Stan przełączników Reeda
-        self.reed_state = {
-            mcp: {
-                port: {pin: 0 for pin in pins}
-                for port, pins in ports.items()
-            }
-            for mcp, ports in MAPPING.items()
-        }
+        # Warstwy stałe renderowane raz, stan narysowanych pól i faza migania (jak w oprogramowaniu)
+        self._build_layers()
+        self.drawn_state = {}
+        self.blink_on = False
+        self.last_blink_time = 0.0
+
+        # Rdzeń oprogramowania ESP32: trwałe połączenie, ramki po zmianie stanu i heartbeat.
+        # Format ramek: PROTOCOL_JSON (stare oprogramowanie) lub PROTOCOL_BINARY (negocjowany)
+        self.protocol = protocol
+        self.board = EmulatedBoard("gui", server_host, server_port, player, protocol=protocol, send_board_id=False,
+                                   occupancy=None if player else 0, verbose=True)
 
         # Stan LED: {led_num: {"state": 0/1, "color": "red"/"green"/"yellow"/"orange"}}
-        self.led_state = {led: {"state": 0, "color": "off"} for led in LED_TO_CHESS.keys()}
+        self.led_state = {led: {"state": 0, "color": "off"} for led in WIRING.square_to_led}
+        self._shown_leds = None
+        self._checked_occupancy = None
 
         # Zmienne do kontroli wyświetlania komunikatów
         self.last_message = ""
@@ -97,45 +82,42 @@ class ChessboardSimulator:
         self.thread.daemon = True
         self.thread.start()
 
-    def draw_chessboard(self):
-        self.screen.fill((255, 255, 255))
+    def _build_layers(self):
+        """
+        Renderuje raz elementy stałe: tło szachownicy oraz nakładkę z etykietami i legendą.
+
+        Nakładka jest przezroczysta i kładziona na diody, tak jak wcześniej etykiety
+        i legenda rysowane były na końcu każdej klatki.
+        """
+        font = pygame.font.SysFont('Arial', 14)
+        legend_font = pygame.font.SysFont('Arial', 16)
+
+        self.board_layer = pygame.Surface((self.width, self.height))
+        self.board_layer.fill((255, 255, 255))
+        self.overlay_layer = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
 
+        self.cells = {}  # led_num -> (prostokąt pola, środek czujnika Reed, środek LED)
         for row in range(8):
             for col in range(8):
                 x = col * self.cell_size
                 y = (7 - row) * self.cell_size
+                rect = pygame.Rect(x, y, self.cell_size, self.cell_size)
 
                 # Kolor pola
                 color = (240, 217, 181) if (row + col) % 2 == 0 else (181, 136, 99)
-                pygame.draw.rect(self.screen, color, (x, y, self.cell_size, self.cell_size))
-
-                # Oznaczenia pól
-                chess_pos = f"{chr(97 + col)}{row + 1}"
-                font = pygame.font.SysFont('Arial', 14)
-
-                # Czujnik Reeda (lewy dolny róg)
-                led_num = CHESS_TO_LED.get(chess_pos)
-                if led_num:
-                    reed_state = self.get_reed_state(led_num)
-                    reed_pos = (x + 10, y + self.cell_size - 10)
-                    pygame.draw.circle(self.screen, (0, 255, 0) if reed_state else (100, 100, 100), reed_pos, 6)
-
-                # LED (prawy górny róg)
-                if led_num and led_num in self.led_state:
-                    led_pos = (x + self.cell_size - 10, y + 10)
-                    led_info = self.led_state[led_num]
-                    led_color = COLOR_MAP[led_info["color"]] if led_info["state"] == 1 else COLOR_MAP["off"]
-                    pygame.draw.circle(self.screen, led_color, led_pos, 8)
+                pygame.draw.rect(self.board_layer, color, rect)
 
                 # Etykiety
-                text = font.render(chess_pos, True, (0, 0, 0))
-                self.screen.blit(text, (x + 5, y + 5))
-                if led_num:
+                chess_pos = f"{chr(97 + col)}{row + 1}"
+                self.overlay_layer.blit(font.render(chess_pos, True, (0, 0, 0)), (x + 5, y + 5))
+                led_num = WIRING.led_for_position(chess_pos)
+                if led_num is not None:
                     led_text = font.render(str(led_num), True, (0, 0, 0))
-                    self.screen.blit(led_text, (x + self.cell_size - 25, y + self.cell_size - 20))
+                    self.overlay_layer.blit(led_text, (x + self.cell_size - 25, y + self.cell_size - 20))
+                    # Czujnik Reeda (lewy dolny róg), LED (prawy górny róg)
+                    self.cells[led_num] = (rect, (x + 10, y + self.cell_size - 10), (x + self.cell_size - 10, y + 10))
 
         # Legenda
-        font = pygame.font.SysFont('Arial', 16)
         legends = [
             ("Zielony LED: figura na linii startowej", COLOR_MAP["green"]),
             ("Czerwony LED: figura na niedozwolonym polu", COLOR_MAP["red"]),
@@ -145,15 +127,46 @@ class ChessboardSimulator:
 
         for i, (text, color) in enumerate(legends):
             y_pos = self.height - 80 + i * 20
-            pygame.draw.circle(self.screen, color, (15, y_pos), 6)
-            self.screen.blit(font.render(text, True, (0, 0, 0)), (30, y_pos - 8))
+            pygame.draw.circle(self.overlay_layer, color, (15, y_pos), 6)
+            self.overlay_layer.blit(legend_font.render(text, True, (0, 0, 0)), (30, y_pos - 8))
 
-        pygame.display.flip()
+    def _cell_state(self, led_num):
+        """Stan pola do narysowania: (czujnik Reed, kolor LED) z uwzględnieniem fazy migania."""
+        led_info = self.led_state.get(led_num)
+        led_color = COLOR_MAP["off"]
+        if led_info and led_info["state"] == 1 and (not led_info.get("blink") or self.blink_on):
+            led_color = COLOR_MAP[led_info["color"]]
+        return self.get_reed_state(led_num), led_color
+
+    def draw_chessboard(self):
+        """Rysuje tylko pola, których stan czujnika lub LED zmienił się od poprzedniej klatki."""
+        full = not self.drawn_state
+        if full:
+            self.screen.blit(self.board_layer, (0, 0))
+            self.screen.blit(self.overlay_layer, (0, 0))
+
+        dirty = []
+        for led_num, (rect, reed_pos, led_pos) in self.cells.items():
+            state = self._cell_state(led_num)
+            if self.drawn_state.get(led_num) == state:
+                continue
+            self.drawn_state[led_num] = state
+            reed_state, led_color = state
+
+            self.screen.blit(self.board_layer, rect, rect)
+            pygame.draw.circle(self.screen, (0, 255, 0) if reed_state else (100, 100, 100), reed_pos, 6)
+            pygame.draw.circle(self.screen, led_color, led_pos, 8)
+            self.screen.blit(self.overlay_layer, rect, rect)
+            dirty.append(rect)
+
+        if full:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
 
     def get_reed_state(self, led_num):
-        if led_num in LED_TO_MCP_PIN:
-            mcp, port, pin = LED_TO_MCP_PIN[led_num]
-            return self.reed_state[mcp][port][pin]
+        if 0 <= led_num < len(WIRING.led_to_square) and WIRING.led_to_square[led_num] >= 0:
+            return (self.board.occupancy >> WIRING.led_to_square[led_num]) & 1
         return 0
 
     def handle_click(self, pos):
@@ -163,11 +176,8 @@ class ChessboardSimulator:
 
         if 0 <= row < 8 and 0 <= col < 8:
             chess_pos = f"{chr(97 + col)}{row + 1}"
-            led_num = CHESS_TO_LED.get(chess_pos)
-
-            if led_num and led_num in LED_TO_MCP_PIN:
-                mcp, port, pin = LED_TO_MCP_PIN[led_num]
-                self.reed_state[mcp][port][pin] ^= 1  # Toggle stanu
+            if WIRING.led_for_position(chess_pos) is not None:
+                self.board.occupancy ^= 1 << square_index(chess_pos)  # Toggle stanu
 
     def check_board_status(self):
         """
@@ -178,26 +188,14 @@ class ChessboardSimulator:
         2. "Figura na błędnym polu!" - jeśli wykryto figury na liniach 3,4,5,6
         3. "Gotowe do gry!" - jeśli figury są tylko na liniach startowych i nie ma błędów
         """
+        occupancy = self.board.occupancy
+
         # Sprawdź czy wszystkie pola startowe mają figury
-        starting_positions_ok = True
-        for led_num, position in LED_TO_CHESS.items():
-            rank = position[1]
-            if rank in ['1', '2', '7', '8']:
-                reed_state = self.get_reed_state(led_num)
-                if reed_state == 0:  # Brak figury na polu startowym
-                    starting_positions_ok = False
-                    break
+        starting_positions_ok = occupancy & START_RANKS_MASK == START_RANKS_MASK
 
         # Sprawdź czy są figury na polach środkowych (niedozwolonych)
-        illegal_positions = False
-        illegal_positions_list = []
-        for led_num, position in LED_TO_CHESS.items():
-            rank = position[1]
-            if rank in ['3', '4', '5', '6']:
-                reed_state = self.get_reed_state(led_num)
-                if reed_state == 1:  # Figura na niedozwolonym polu
-                    illegal_positions = True
-                    illegal_positions_list.append(position)
+        illegal_positions_list = [SQUARE_NAMES[square] for square in iter_squares(occupancy & MIDDLE_RANKS_MASK)]
+        illegal_positions = bool(illegal_positions_list)
 
         # Wyświetl odpowiedni komunikat
         current_time = time.time()
@@ -223,30 +221,42 @@ class ChessboardSimulator:
                 self.message_time = current_time
 
     def simulate_esp32(self):
-        while self.running:
-            try:
-                with socket.socket() as s:
-                    s.connect((self.server_host, self.server_port))
-                    s.sendall(json.dumps(self.reed_state).encode())
-
-                    response = json.loads(s.recv(4096).decode())
-
-                    # Resetuj stan wszystkich LED
-                    for led in self.led_state:
-                        self.led_state[led] = {"state": 0, "color": "off"}
-
-                    # Aktualizuj stan LED na podstawie otrzymanych danych
-                    for led_info in response.get('leds', []):
-                        led_num = led_info['led']
-                        if led_num in self.led_state:
-                            self.led_state[led_num] = {"state": 1, "color": led_info['color']}
-
-                    # Sprawdź i wyświetl komunikaty o stanie szachownicy
-                    self.check_board_status()
-
-            except Exception as e:
-                print(f"Błąd połączenia: {e}")
-            time.sleep(0.1)
+        """Wątek komunikacji - pętla oprogramowania ESP32 do zamknięcia okna."""
+        self.board.run()
+
+    def _sync_from_board(self):
+        """Przenosi stan LED odebrany przez wątek komunikacji do stanu wyświetlania."""
+        leds = self.board.leds
+        if leds is not self._shown_leds:
+            self._shown_leds = leds
+
+            # Resetuj stan wszystkich LED i ustaw otrzymane
+            for led in self.led_state:
+                self.led_state[led] = {"state": 0, "color": "off"}
+            for led_info in leds:
+                led_num = led_info['led']
+                if led_num in self.led_state:
+                    self.led_state[led_num] = {"state": 1, "color": led_info['color'],
+                                               "blink": led_info.get('blink', False)}
+
+        # Faza migania - zmienia tylko pola z migającymi diodami
+        now = time.perf_counter()
+        if now - self.last_blink_time > BLINK_INTERVAL:
+            self.last_blink_time = now
+            self.blink_on = not self.blink_on
+
+        # Sprawdź i wyświetl komunikaty o stanie szachownicy
+        if self.board.occupancy != self._checked_occupancy:
+            self._checked_occupancy = self.board.occupancy
+            self.check_board_status()
+
+    def print_protocol_stats(self):
+        """Wyświetla statystyki przesłanych danych stanu Reed."""
+        board = self.board
+        if board.frames_sent:
+            print(f"Protokół {board.negotiated}: wysłano {board.frames_sent} ramek, {board.bytes_sent} B "
+                  f"(średnio {board.bytes_sent / board.frames_sent:.1f} B/ramkę), odebrano {board.bytes_received} B, "
+                  f"zgubionych odpowiedzi: {board.dropped}, połączeń: {board.connects}")
 
     def run(self):
         clock = pygame.time.Clock()
@@ -254,15 +264,386 @@ class ChessboardSimulator:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
+                    self.board.stop()
                     pygame.quit()
+                    self.print_protocol_stats()
                     return
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     self.handle_click(event.pos)
+                elif event.type == pygame.VIDEOEXPOSE:
+                    # Okno trzeba odrysować w całości
+                    self.drawn_state = {}
 
+            self._sync_from_board()
             self.draw_chessboard()
             clock.tick(30)
 
 
-if __name__ == "__main__":
-    simulator = ChessboardSimulator()
+class EmulatedBoard:
+    """
+    Rdzeń oprogramowania ESP32 (arduino.txt) - używany bez okna i przez ChessboardSimulator.
+
+    Jedno trwałe połączenie (po zerwaniu ponawiane z rosnącym opóźnieniem), ramki
+    {"type": "reed_state", "event": ..., "data": ...} zakończone znakiem nowej linii,
+    wysyłane po zmianie stanu Reed lub statusu gry oraz co 500 ms jako heartbeat.
+    Po każdej ramce czeka na odpowiedź do 1 s - brak odpowiedzi liczony jest jako
+    zgubiona ramka. Odpowiedzi czytane są z bufora linia po linii, więc ramki dowolnej
+    długości i ramki wysłane przez serwer z własnej inicjatywy nie są gubione.
+    Partia ze skryptu odtwarzana jest przez game_playback.GamePlayer.
+    """
+
+    def __init__(self, board_id, host='localhost', port=5000, player=None,
+                 heartbeat_interval=ESP32_HEARTBEAT_INTERVAL, response_timeout=ESP32_RESPONSE_TIMEOUT,
+                 reconnect_delay=ESP32_RECONNECT_DELAY, protocol=PROTOCOL_JSON, send_board_id=True,
+                 occupancy=None, verbose=False):
+        """
+        Inicjalizacja szachownicy.
+
+        send_board_id=True dodaje do ramek pole "board", dzięki czemu serwer asyncio rozróżnia
+        wiele szachownic łączących się z tego samego adresu IP. player (GamePlayer) odtwarza
+        partię ruchami ręką. occupancy to początkowa mapa zajętości (domyślnie pozycja
+        startowa lub początkowa pozycja odtwarzanej partii). Zajętość można też zmieniać z zewnątrz
+        (atrybut occupancy) - zmiana zostanie wysłana w następnym obiegu pętli.
+        verbose=True wypisuje błędy połączenia.
+        """
+        self.board_id = board_id
+        self.host = host
+        self.port = port
+        self.player = player
+        self.heartbeat_interval = heartbeat_interval
+        self.response_timeout = response_timeout
+        self.reconnect_delay = reconnect_delay
+        self.protocol = protocol
+        self.send_board_id = send_board_id
+        self.verbose = verbose
+
+        if occupancy is None:
+            occupancy = player.occupancy if player else Position().occupancy
+        self.occupancy = occupancy
+        self.status = ""
+        self.leds = []
+
+        self.sock = None
+        self.negotiated = PROTOCOL_JSON
+        self.seq = 0
+        self.led_decoder = LedDeltaDecoder()
+        self._pending = b""
+        self._stopped = threading.Event()
+
+        # Statystyki
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.responses = 0
+        self.dropped = 0
+        self.pushes = 0
+        self.connects = 0
+        self.rtts = []
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self, duration=None):
+        """Pętla oprogramowania (co 10 ms) przez duration sekund lub do stop()."""
+        deadline = None if duration is None else time.perf_counter() + duration
+        delay = min(0.5, self.reconnect_delay)
+        last_heartbeat = 0.0
+        sent_occupancy = None
+        sent_status = None
+
+        while not self._stopped.is_set() and (deadline is None or time.perf_counter() < deadline):
+            if self.sock is None:
+                if not self._connect():
+                    self._stopped.wait(delay)
+                    delay = min(delay * 2, self.reconnect_delay)
+                    continue
+                delay = min(0.5, self.reconnect_delay)
+                sent_occupancy, sent_status = self.occupancy, self.status
+
+            try:
+                self._drain()
+
+                now = time.perf_counter()
+                if self.player:
+                    occupancy = self.player.poll(now)
+                    if occupancy is not None:
+                        self.occupancy = occupancy
+                reed_changed = self.occupancy != sent_occupancy
+                status_changed = self.status != sent_status
+                heartbeat_due = now - last_heartbeat > self.heartbeat_interval
+
+                if reed_changed or status_changed or heartbeat_due:
+                    if heartbeat_due:
+                        last_heartbeat = now
+                    sent_occupancy, sent_status = self.occupancy, self.status
+                    self._exchange(self._event_type(reed_changed, status_changed))
+            except (OSError, ConnectionError, ValueError) as e:
+                if self.verbose:
+                    print(f"Błąd połączenia: {e}")
+                self._close()
+                continue
+
+            time.sleep(0.01)
+
+        self._close()
+
+    def stats(self):
+        """Statystyki szachownicy (czasy w sekundach)."""
+        return {
+            "board": self.board_id,
+            "frames_sent": self.frames_sent,
+            "responses": self.responses,
+            "dropped": self.dropped,
+            "pushes": self.pushes,
+            "connects": self.connects,
+            "moves_played": self.player.moves_played if self.player else 0,
+            "bounces": self.player.bounces if self.player else 0,
+            "rtts": self.rtts,
+        }
+
+    def _event_type(self, reed_changed, status_changed):
+        """Rodzaj zdarzenia wybierany tak jak w communicateWithServer()."""
+        important = reed_changed and ("Twoj ruch!" in self.status or "Wykonaj ruch przeciwnika" in self.status)
+        if important:
+            return "important_event"
+        if reed_changed:
+            return "state_change"
+        if status_changed:
+            return "status_change"
+        return "heartbeat"
+
+    def _connect(self):
+        """Nawiązuje połączenie, negocjuje format ramek i wysyła pełny stan Reed."""
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.response_timeout)
+            self.connects += 1
+            self._pending = b""
+            self.negotiated = PROTOCOL_JSON
+            self.led_decoder = LedDeltaDecoder()
+
+            if self.protocol == PROTOCOL_BINARY:
+                board_id = self.board_id if self.send_board_id else None
+                self._write(encode_hello(board_id=board_id, features=[FEATURE_LED_DELTA]))
+                hello = self._read_line(self.response_timeout)
+                if hello is None:
+                    raise ConnectionError("Brak odpowiedzi na negocjację protokołu")
+                self.negotiated = json.loads(hello).get("protocol", PROTOCOL_JSON)
+
+            if self.send_board_id or self.negotiated == PROTOCOL_BINARY:
+                self._exchange("heartbeat")
+            else:
+                # Oprogramowanie po połączeniu wysyła sam stan Reed (bez koperty)
+                self._write(json.dumps(bitboard_to_reed(self.occupancy)).encode() + b'\n')
+                self.frames_sent += 1
+        except (OSError, ConnectionError, ValueError) as e:
+            if self.verbose:
+                print(f"Błąd połączenia: {e}")
+            self._close()
+            return False
+        return True
+
+    def _close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def _write(self, payload):
+        self.sock.sendall(payload)
+        self.bytes_sent += len(payload)
+
+    def _exchange(self, event):
+        """Wysyła ramkę stanu Reed i czeka na odpowiedź serwera (stan LED)."""
+        if self.negotiated == PROTOCOL_BINARY:
+            self.seq = (self.seq + 1) & 0xFFFF
+            payload = encode_reed_frame(self.occupancy, event, self.seq)
+        else:
+            message = {"type": "reed_state", "event": event, "data": bitboard_to_reed(self.occupancy)}
+            if self.send_board_id:
+                message["board"] = self.board_id
+            payload = json.dumps(message).encode() + b'\n'
+        started = time.perf_counter()
+        self._write(payload)
+        self.frames_sent += 1
+
+        deadline = started + self.response_timeout
+        while True:
+            line = self._read_line(deadline - time.perf_counter())
+            if line is None:
+                self.dropped += 1
+                return
+            if self._apply(line):
+                break
+        self.rtts.append(time.perf_counter() - started)
+        self.responses += 1
+
+    def _drain(self):
+        """Odbiera ramki wysłane przez serwer z własnej inicjatywy (np. diody ruchu przeciwnika)."""
+        while b'\n' in self._pending or select.select([self.sock], [], [], 0)[0]:
+            line = self._read_line(0)
+            if line is None:
+                return
+            if self._apply(line):
+                self.pushes += 1
+
+    def _read_line(self, timeout):
+        """Zwraca kolejną linię od serwera lub None po upływie timeout sekund."""
+        deadline = time.perf_counter() + timeout
+        while b'\n' not in self._pending:
+            # Po terminie select z zerowym czasem - dane już czekające w gnieździe są odczytywane
+            remaining = max(0.0, deadline - time.perf_counter())
+            if not select.select([self.sock], [], [], remaining)[0]:
+                return None
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("Serwer zamknął połączenie")
+            self.bytes_received += len(data)
+            self._pending += data
+        line, _, self._pending = self._pending.partition(b'\n')
+        return line
+
+    def _apply(self, line):
+        """Stosuje ramkę od serwera. Zwraca True, jeśli odebrano stan LED."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return False
+        if not isinstance(message, dict):
+            return False
+
+        # Ramki delta LED - zastosuj i potwierdź, po luce serwer przyśle ramkę kluczową
+        if "seq" in message:
+            applied, gap = self.led_decoder.apply(message)
+            if self.negotiated == PROTOCOL_BINARY:
+                self._write(encode_led_ack(message["seq"], gap))
+            else:
+                self._write(json.dumps({"type": "led_ack", "seq": message["seq"], "gap": gap}).encode() + b'\n')
+            if not applied:
+                return False
+            self.leds = self.led_decoder.leds()
+            self.status = self.led_decoder.status or self.status
+            return True
+
+        if "leds" not in message and "status" not in message:
+            return False
+        if "leds" in message:
+            self.leds = message["leds"]
+        if "status" in message:
+            self.status = message["status"]
+        return True
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def _run_board_group(options):
+    """Uruchamia grupę szachownic w wątkach jednego procesu. Zwraca ich statystyki."""
+    boards = []
+    for board_id in options["board_ids"]:
+        seed = zlib.crc32(board_id.encode())
+        moves = options["moves"] or random_game(options["plies"], seed=seed)
+        player = GamePlayer(moves, options["timing"], fen=options["fen"], seed=seed)
+        boards.append(EmulatedBoard(board_id, options["host"], options["port"], player, protocol=options["protocol"]))
+
+    threads = [threading.Thread(target=board.run, args=(options["duration"],), daemon=True) for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [board.stats() for board in boards]
+
+
+def run_headless(boards, processes=1, host='localhost', port=5000, duration=10.0, moves=None, plies=40,
+                 timing=None, protocol=PROTOCOL_JSON, fen=None):
+    """
+    Uruchamia boards szachownic bez okna rozłożonych na processes procesów.
+
+    Każda szachownica gra moves (UCI, od pozycji fen) albo własną losową partię o długości
+    plies, w tempie timing (game_playback.PlaybackTiming).
+    Zwraca zbiorcze statystyki: ramki, odpowiedzi, zgubione ramki i czasy odpowiedzi (ms).
+    """
+    processes = max(1, min(processes, boards))
+    groups = [{
+        "board_ids": [f"emu-{index}" for index in range(group, boards, processes)],
+        "host": host, "port": port, "duration": duration, "moves": moves, "plies": plies,
+        "timing": timing, "protocol": protocol, "fen": fen,
+    } for group in range(processes)]
+
+    if processes == 1:
+        results = [_run_board_group(groups[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_run_board_group, groups)
+
+    board_stats = [stats for group in results for stats in group]
+    rtts = sorted(rtt * 1000.0 for stats in board_stats for rtt in stats["rtts"])
+    summary = {
+        "boards": len(board_stats),
+        "processes": processes,
+        "frames_sent": sum(stats["frames_sent"] for stats in board_stats),
+        "responses": sum(stats["responses"] for stats in board_stats),
+        "dropped": sum(stats["dropped"] for stats in board_stats),
+        "pushes": sum(stats["pushes"] for stats in board_stats),
+        "reconnects": sum(max(0, stats["connects"] - 1) for stats in board_stats),
+        "never_connected": sum(1 for stats in board_stats if not stats["connects"]),
+        "moves_played": sum(stats["moves_played"] for stats in board_stats),
+        "bounces": sum(stats["bounces"] for stats in board_stats),
+        "rtt_p50_ms": _percentile(rtts, 50),
+        "rtt_p95_ms": _percentile(rtts, 95),
+        "rtt_p99_ms": _percentile(rtts, 99),
+        "rtt_max_ms": rtts[-1] if rtts else float('nan'),
+    }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symulator szachownicy ESP32")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--protocol", choices=[PROTOCOL_JSON, PROTOCOL_BINARY], default=PROTOCOL_JSON)
+    parser.add_argument("--headless", action="store_true", help="szachownice bez okna (generowanie obciążenia)")
+    parser.add_argument("--boards", type=int, default=1, help="liczba szachownic w trybie --headless")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--duration", type=float, default=10.0, help="czas działania w sekundach")
+    parser.add_argument("--moves", nargs="*", default=None, help="ruchy UCI (domyślnie losowa partia)")
+    parser.add_argument("--plies", type=int, default=40, help="długość losowej partii")
+    parser.add_argument("--game", help="plik PGN lub plik z ruchami UCI do odtworzenia")
+    parser.add_argument("--step", type=float, default=1.0, help="odstęp między krokami ruchu ręką (s)")
+    parser.add_argument("--timing", choices=sorted(TIMINGS), help="tempo odtwarzania zamiast stałego --step")
+    parser.add_argument("--bounce", type=float, default=None, help="prawdopodobieństwo drgań styków przy zmianie")
+    args = parser.parse_args()
+
+    fen = None
+    moves = args.moves
+    if args.game:
+        fen, moves = load_game(args.game)
+
+    if args.timing:
+        timing = copy.copy(TIMINGS[args.timing])
+    else:
+        timing = PlaybackTiming(think_time=args.step, hand_time=args.step)
+    if args.bounce is not None:
+        timing.bounce_probability = args.bounce
+
+    if args.headless:
+        summary = run_headless(args.boards, args.processes, args.host, args.port, args.duration, moves,
+                               args.plies, timing, args.protocol, fen)
+        print(f"Szachownic: {summary['boards']} (procesów: {summary['processes']}), "
+              f"ruchów: {summary['moves_played']}, drgań styków: {summary['bounces']}")
+        print(f"Ramek: {summary['frames_sent']}, odpowiedzi: {summary['responses']}, "
+              f"zgubionych: {summary['dropped']}, ramek od serwera: {summary['pushes']}, "
+              f"ponownych połączeń: {summary['reconnects']}, bez połączenia: {summary['never_connected']}")
+        print(f"Czas odpowiedzi: p50={summary['rtt_p50_ms']:.2f} ms  p95={summary['rtt_p95_ms']:.2f} ms  "
+              f"p99={summary['rtt_p99_ms']:.2f} ms  max={summary['rtt_max_ms']:.2f} ms")
+        return
+
+    player = GamePlayer(moves, timing, fen=fen) if moves else None
+    simulator = ChessboardSimulator(server_host=args.host, server_port=args.port, protocol=args.protocol,
+                                    player=player)
     simulator.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# event_bus.py
+"""
+Magistrala zdarzeń oddzielająca obsługę ramek ESP32 od logiki gry i wywołań sieciowych.
+
+Zdarzenia trafiają do ograniczonych kolejek obsługiwanych przez wątki robocze.
+Wszystkie zdarzenia z tym samym kluczem (np. ID szachownicy) trafiają do tej samej
+kolejki, więc są obsługiwane w kolejności publikacji. Zdarzenia z różnymi kluczami
+mogą być obsługiwane równolegle. try_publish() nie czeka na miejsce w kolejce - służy
+do publikowania z wątków obsługi gniazd, które łączą zdarzenia i ponawiają publikację. W trybie inline (np. z zegarem symulowanym) zdarzenia
+obsługiwane są od razu w wątku publikującym.
+"""
+import collections
+import queue
+import threading
+import time
+import zlib
+
+from config import EVENT_BUS_WORKERS, EVENT_QUEUE_SIZE, EVENT_PUBLISH_TIMEOUT
+
+_STOP = object()
+
+
+class EventBus:
+    def __init__(self, workers=EVENT_BUS_WORKERS, maxsize=EVENT_QUEUE_SIZE,
+                 publish_timeout=EVENT_PUBLISH_TIMEOUT, name="event-bus", inline=False):
+        """
+        Inicjalizacja magistrali z podaną liczbą wątków roboczych i rozmiarem kolejek.
+
+        inline=True wywołuje callbacki od razu w wątku publikującym (bez wątków roboczych).
+        """
+        self.name = name
+        self.inline = inline
+        self.publish_timeout = publish_timeout
+        self._queues = [queue.Queue(maxsize) for _ in range(max(1, workers))]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.running = False
+
+        # Metryki
+        self.published = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.deferred = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._recent_latencies = collections.deque(maxlen=1000)
+
+    def start(self):
+        """Uruchamia wątki robocze."""
+        if self.running:
+            return
+        self.running = True
+        if self.inline:
+            return
+        for index, work_queue in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(work_queue,), name=f"{self.name}-{index}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=1.0):
+        """Zatrzymuje wątki robocze po obsłużeniu zdarzeń już znajdujących się w kolejkach."""
+        if not self.running:
+            return
+        self.running = False
+        for work_queue in self._queues:
+            try:
+                work_queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+        self._threads = []
+
+    def publish(self, key, callback, *args):
+        """
+        Publikuje wywołanie callback(*args) do obsłużenia w wątku roboczym.
+
+        Zwraca False, jeśli kolejka dla danego klucza jest pełna dłużej niż publish_timeout
+        (zdarzenie jest wtedy odrzucane i liczone w metryce dropped).
+        """
+        if self.inline:
+            with self._lock:
+                self.published += 1
+            self._dispatch(time.monotonic(), key, callback, args)
+            return True
+
+        work_queue = self._queues[self._partition(key)]
+        try:
+            work_queue.put((time.monotonic(), key, callback, args), timeout=self.publish_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"Kolejka zdarzeń pełna - odrzucono zdarzenie dla {key}")
+            return False
+
+        with self._lock:
+            self.published += 1
+            self.max_queue_depth = max(self.max_queue_depth, work_queue.qsize())
+        return True
+
+    def try_publish(self, key, callback, *args):
+        """
+        Publikuje wywołanie callback(*args) bez czekania na miejsce w kolejce.
+
+        Zwraca False, jeśli kolejka dla danego klucza jest pełna - zdarzenie nie zostało
+        opublikowane (metryka deferred) i publikujący powinien ponowić próbę później.
+        """
+        if self.inline:
+            return self.publish(key, callback, *args)
+
+        work_queue = self._queues[self._partition(key)]
+        try:
+            work_queue.put_nowait((time.monotonic(), key, callback, args))
+        except queue.Full:
+            with self._lock:
+                self.deferred += 1
+            return False
+
+        with self._lock:
+            self.published += 1
+            self.max_queue_depth = max(self.max_queue_depth, work_queue.qsize())
+        return True
+
+    def _partition(self, key):
+        """Wybiera kolejkę dla klucza - stabilnie między uruchomieniami."""
+        return zlib.crc32(str(key).encode()) % len(self._queues)
+
+    @property
+    def queue_depth(self):
+        """Łączna liczba zdarzeń oczekujących w kolejkach."""
+        return sum(work_queue.qsize() for work_queue in self._queues)
+
+    def metrics(self):
+        """Zwraca słownik z metrykami magistrali."""
+        with self._lock:
+            recent = sorted(self._recent_latencies)
+            dispatched = self.dispatched
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "published": self.published,
+                "dispatched": dispatched,
+                "dropped": self.dropped,
+                "deferred": self.deferred,
+                "failed": self.failed,
+                "dispatch_latency_avg_ms": (self._latency_sum / dispatched * 1000.0) if dispatched else 0.0,
+                "dispatch_latency_p95_ms": (recent[int(len(recent) * 0.95) - 1] * 1000.0) if recent else 0.0,
+                "dispatch_latency_max_ms": self._latency_max * 1000.0,
+            }
+
+    def _worker(self, work_queue):
+        """Pętla wątku roboczego."""
+        while True:
+            item = work_queue.get()
+            if item is _STOP:
+                break
+
+            self._dispatch(*item)
+
+    def _dispatch(self, enqueued_at, key, callback, args):
+        """Wywołuje callback zdarzenia, zbierając metryki opóźnienia."""
+        latency = time.monotonic() - enqueued_at
+        with self._lock:
+            self.dispatched += 1
+            self._latency_sum += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._recent_latencies.append(latency)
+
+        try:
+            callback(*args)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Błąd podczas obsługi zdarzenia dla {key}: {e}")
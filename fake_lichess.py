@@ -0,0 +1,616 @@
+# fake_lichess.py
+"""
+Lokalny serwer udający API Lichess - do testów i pomiarów bez sieci i tokenu.
+
+Obsługiwane punkty końcowe:
+    GET  /api/account
+    GET  /api/stream/event                (NDJSON: gameStart / gameFinish partii konta)
+    GET  /api/board/game/stream/{id}      (NDJSON: gameFull, potem gameState)
+    POST /api/board/game/{id}/move/{uci}
+    POST /api/board/game/{id}/resign
+    POST /api/board/game/{id}/draw/{yes|no}
+    GET  /api/stream/game/{id}            (NDJSON strumień widza: fen i ostatni ruch)
+    GET  /game/export/{id}                (JSON z ruchami SAN, obsługuje If-None-Match)
+
+Przeciwnik (ScriptedOpponent) gra ruchy z listy lub losowe ruchy legalne z zadanym
+opóźnieniem. Błędy można wstrzykiwać losowo (z podanym prawdopodobieństwem) albo
+zaplanować dla kolejnych zapytań: 429, 503, zerwanie połączenia i odmowę Board API.
+
+Użycie:
+    python fake_lichess.py --port 8080
+    python fake_lichess.py --opponent-delay 2 --rate-limit 0.05 --disconnect 0.02
+    (w config.py: LICHESS_API_URL = "http://127.0.0.1:8080")
+"""
+import argparse
+import collections
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chess_position import Position, uci_to_move, move_to_uci
+
+# Co ile sekund wysyłać pustą linię podtrzymującą strumień
+KEEPALIVE_INTERVAL = 5.0
+
+# Rodzaje wstrzykiwanych błędów
+FAULT_RATE_LIMIT = "rate_limit"      # 429 Too Many Requests
+FAULT_SERVER_ERROR = "server_error"  # 503 Service Unavailable
+FAULT_DISCONNECT = "disconnect"      # zamknięcie połączenia bez odpowiedzi
+FAULT_BOARD_API = "board_api"        # odmowa Board API dla strumienia partii
+FAULTS = (FAULT_RATE_LIMIT, FAULT_SERVER_ERROR, FAULT_DISCONNECT, FAULT_BOARD_API)
+
+
+class FakeGame:
+    def __init__(self, game_id, white, black, initial=600000, increment=0, board_api=True, spectator=True):
+        """
+        Partia prowadzona przez serwer testowy.
+
+        board_api=False udaje partię, której Board API nie obsługuje (np. blitz),
+        spectator=False wyłącza strumień widza (zostaje tylko eksport).
+        """
+        self.game_id = game_id
+        self.white = white
+        self.black = black
+        self.initial = initial
+        self.increment = increment
+        self.board_api = board_api
+        self.spectator = spectator
+        self.position = Position()
+        self.moves = []
+        self.sans = []
+        self.move_times = []  # time.perf_counter() dodania każdego ruchu
+        self.status = "started"
+        self.condition = threading.Condition()
+        self.on_finish = None  # Wywoływane po zakończeniu partii (FakeLichess publikuje gameFinish)
+
+    def push_move(self, uci):
+        """Dodaje ruch i budzi wszystkie strumienie partii. Zgłasza ValueError dla ruchu nielegalnego."""
+        with self.condition:
+            if self.status != "started":
+                raise ValueError("Partia zakończona")
+            move = uci_to_move(uci)
+            if move not in self.position.legal_moves():
+                raise ValueError(f"Nielegalny ruch: {uci}")
+            self.sans.append(self.position.san(move))
+            self.position.push(move)
+            self.moves.append(uci)
+            self.move_times.append(time.perf_counter())
+            if not self.position.legal_moves():
+                self.status = "mate" if self.position.is_check() else "stalemate"
+            self.condition.notify_all()
+        if self.status != "started" and self.on_finish:
+            self.on_finish(self)
+
+    def random_move(self, rng):
+        """Zwraca losowy ruch legalny (UCI) lub None, jeśli partia się skończyła."""
+        with self.condition:
+            moves = self.position.legal_moves()
+            return move_to_uci(rng.choice(moves)) if moves and self.status == "started" else None
+
+    @property
+    def turn(self):
+        """Kolor strony na ruchu."""
+        return "white" if len(self.moves) % 2 == 0 else "black"
+
+    @property
+    def etag(self):
+        return f'"{self.game_id}-{len(self.moves)}-{self.status}"'
+
+    def export(self):
+        """Eksport partii w formacie JSON (ruchy SAN, zegary w setnych sekundy)."""
+        return {
+            "id": self.game_id,
+            "status": self.status,
+            "players": {"white": {"user": {"id": self.white, "name": self.white}},
+                        "black": {"user": {"id": self.black, "name": self.black}}},
+            "moves": " ".join(self.sans),
+            "clocks": [self.initial // 10] * len(self.moves),
+            "clock": {"initial": self.initial // 1000, "increment": self.increment // 1000},
+        }
+
+    def spectator_summary(self):
+        """Pierwsze zdarzenie strumienia widza."""
+        return {"id": self.game_id, "fen": self.position.fen(), "turns": len(self.moves),
+                "status": {"name": self.status}}
+
+    def spectator_move(self, index):
+        """Zdarzenie strumienia widza dla ruchu o podanym indeksie (tylko ostatni ruch ma pełny FEN)."""
+        return {"fen": self.position.fen(), "lm": self.moves[index],
+                "wc": self.initial // 1000, "bc": self.initial // 1000}
+
+    def finish(self, status="resign"):
+        """Kończy partię."""
+        with self.condition:
+            if self.status != "started":
+                return
+            self.status = status
+            self.condition.notify_all()
+        if self.on_finish:
+            self.on_finish(self)
+
+    def account_event(self, event_type, account):
+        """Zdarzenie strumienia konta (gameStart / gameFinish) z punktu widzenia gracza account."""
+        color = "white" if self.white == account else "black"
+        return {
+            "type": event_type,
+            "game": {
+                "gameId": self.game_id,
+                "fullId": self.game_id,
+                "color": color,
+                "fen": self.position.fen(),
+                "isMyTurn": self.turn == color and self.status == "started",
+                "opponent": {"id": self.black if color == "white" else self.white},
+                "status": {"name": self.status},
+            },
+        }
+
+    def state(self):
+        """Zdarzenie gameState dla bieżącego stanu partii."""
+        return {
+            "type": "gameState",
+            "moves": " ".join(self.moves),
+            "wtime": self.initial,
+            "btime": self.initial,
+            "winc": self.increment,
+            "binc": self.increment,
+            "status": self.status,
+        }
+
+    def full(self):
+        """Zdarzenie gameFull rozpoczynające strumień partii."""
+        return {
+            "type": "gameFull",
+            "id": self.game_id,
+            "white": {"id": self.white, "name": self.white},
+            "black": {"id": self.black, "name": self.black},
+            "clock": {"initial": self.initial, "increment": self.increment},
+            "state": self.state(),
+        }
+
+
+class ScriptedOpponent:
+    def __init__(self, game, color, delay=1.0, moves=None, seed=None):
+        """
+        Przeciwnik grający kolorem color w partii game.
+
+        Ruch wykonywany jest delay sekund po ruchu gracza (delay może być parą (min, max)
+        - opóźnienie losowane z tego przedziału). Najpierw grane są ruchy z listy moves
+        (UCI), potem losowe ruchy legalne.
+        """
+        self.game = game
+        self.color = color
+        self.delay = delay
+        self.script = list(moves or [])
+        self.rng = random.Random(seed)
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # Statystyki
+        self.moves_made = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"opponent-{self.game.game_id}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self.game.condition:
+            self.game.condition.notify_all()
+
+    def _next_delay(self):
+        if isinstance(self.delay, (tuple, list)):
+            return self.rng.uniform(*self.delay)
+        return self.delay
+
+    def _next_move(self):
+        """Kolejny ruch ze skryptu (jeśli legalny) albo losowy ruch legalny."""
+        while self.script:
+            uci = self.script.pop(0)
+            if self.game.position.is_legal_uci(uci):
+                return uci
+            print(f"Przeciwnik: pomijam nielegalny ruch ze skryptu {uci}")
+        return self.game.random_move(self.rng)
+
+    def _run(self):
+        game = self.game
+        while not self._stopped.is_set():
+            with game.condition:
+                while game.status == "started" and game.turn != self.color and not self._stopped.is_set():
+                    game.condition.wait(timeout=KEEPALIVE_INTERVAL)
+                if game.status != "started":
+                    break
+            if self._stopped.wait(self._next_delay()):
+                break
+            uci = self._next_move()
+            if uci is None:
+                break
+            try:
+                game.push_move(uci)
+                self.moves_made += 1
+            except ValueError:
+                pass  # Partia zakończyła się w trakcie oczekiwania
+
+
+class FakeLichess:
+    def __init__(self, host="127.0.0.1", port=0, account="player", faults=None, seed=None):
+        """
+        Inicjalizacja serwera. Port 0 oznacza dowolny wolny port.
+
+        faults to słownik {rodzaj błędu: prawdopodobieństwo} dla każdego zapytania
+        (np. {FAULT_RATE_LIMIT: 0.05}).
+        """
+        self.account = account
+        self.games = {}
+        self.opponents = []
+        self._ids = itertools.count(1)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+        # Zdarzenia strumienia konta (gameStart / gameFinish)
+        self.events = []
+        self.events_condition = threading.Condition()
+        self.closed = False
+
+        # Wstrzykiwanie błędów
+        self.fault_rates = dict(faults or {})
+        self._scheduled_faults = []  # [rodzaj, prefiks ścieżki, pozostała liczba]
+        self._fault_lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._streams = set()  # Gniazda otwartych strumieni (do zerwania)
+
+        # Statystyki
+        self.requests = 0
+        self.event_streams = 0
+        self.faults_injected = collections.Counter()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Uruchamia serwer w wątku w tle."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-lichess")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Zatrzymuje serwer i kończy otwarte strumienie."""
+        for opponent in self.opponents:
+            opponent.stop()
+        for game in list(self.games.values()):
+            game.finish("aborted")
+        with self.events_condition:
+            self.closed = True
+            self.events_condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def create_game(self, game_id=None, white=None, black="opponent", opponent_delay=None, opponent_moves=None,
+                    opponent_seed=None, **kwargs):
+        """
+        Tworzy partię (domyślnie gracz testowy gra białymi).
+
+        Podanie opponent_delay uruchamia przeciwnika (ScriptedOpponent) grającego
+        kolorem, którym nie gra konto testowe.
+        """
+        game_id = game_id or f"game{next(self._ids):04d}"
+        game = FakeGame(game_id, white or self.account, black, **kwargs)
+        game.on_finish = self._game_finished
+        self.games[game_id] = game
+        self._publish(game.account_event("gameStart", self.account))
+
+        if opponent_delay is not None:
+            color = "black" if game.white == self.account else "white"
+            self.opponents.append(ScriptedOpponent(game, color, opponent_delay, opponent_moves,
+                                                   opponent_seed).start())
+        return game
+
+    def inject(self, fault, count=1, path=""):
+        """Planuje błąd fault dla kolejnych count zapytań o ścieżce zaczynającej się od path."""
+        if fault not in FAULTS:
+            raise ValueError(f"Nieznany rodzaj błędu: {fault}")
+        with self._fault_lock:
+            self._scheduled_faults.append([fault, path, count])
+
+    def take_fault(self, path):
+        """Zwraca błąd do wstrzyknięcia w zapytanie o ścieżce path (lub None)."""
+        with self._fault_lock:
+            for scheduled in self._scheduled_faults:
+                fault, prefix, _ = scheduled
+                if path.startswith(prefix):
+                    scheduled[2] -= 1
+                    if scheduled[2] <= 0:
+                        self._scheduled_faults.remove(scheduled)
+                    break
+            else:
+                fault = None
+                for kind, rate in self.fault_rates.items():
+                    if kind == FAULT_BOARD_API and "/api/board/game/stream/" not in path:
+                        continue
+                    if self._rng.random() < rate:
+                        fault = kind
+                        break
+            if fault:
+                self.faults_injected[fault] += 1
+            return fault
+
+    def drop_streams(self):
+        """Zrywa wszystkie otwarte strumienie NDJSON (klienci powinni połączyć się ponownie)."""
+        for connection in list(self._streams):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _game_finished(self, game):
+        self._publish(game.account_event("gameFinish", self.account))
+
+    def _publish(self, event):
+        """Dodaje zdarzenie strumienia konta i budzi otwarte strumienie."""
+        with self.events_condition:
+            self.events.append(event)
+            self.events_condition.notify_all()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Nagłówki i treść wysyłane są osobno - bez tego utrzymywane połączenie czeka na opóźnione ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def do_GET(self):
+        self.fake.requests += 1
+        if self._inject_fault():
+            return
+
+        if self.path == "/api/account":
+            self._send_json(200, {"id": self.fake.account, "username": self.fake.account})
+            return
+
+        if self.path == "/api/stream/event":
+            self._stream_events()
+            return
+
+        match = re.fullmatch(r"/api/board/game/stream/(\w+)", self.path)
+        if match:
+            game = self.fake.games.get(match.group(1))
+            if game is None:
+                self._send_json(404, {"error": "No such game"})
+            elif not game.board_api:
+                self._send_json(400, {"error": "This game cannot be played with the Board API."})
+            else:
+                self._stream_game(game)
+            return
+
+        match = re.fullmatch(r"/api/stream/game/(\w+)", self.path)
+        if match and match.group(1) in self.fake.games and self.fake.games[match.group(1)].spectator:
+            self._stream_spectator(self.fake.games[match.group(1)])
+            return
+
+        match = re.fullmatch(r"/game/export/(\w+)(\?.*)?", self.path)
+        if match and match.group(1) in self.fake.games:
+            game = self.fake.games[match.group(1)]
+            with game.condition:
+                if self.headers.get("If-None-Match") == game.etag:
+                    self.send_response(304)
+                    self.send_header("ETag", game.etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                else:
+                    self._send_json(200, game.export(), {"ETag": game.etag})
+            return
+
+        self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        self.fake.requests += 1
+        self._discard_body()
+        if self._inject_fault():
+            return
+
+        match = re.fullmatch(r"/api/board/game/(\w+)/(move/\w+|resign|draw/\w+)(\?.*)?", self.path)
+        if not match:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        game = self.fake.games.get(match.group(1))
+        if game is None:
+            self._send_json(404, {"error": "No such game"})
+            return
+
+        action = match.group(2)
+        if action == "resign":
+            game.finish("resign")
+        elif action.startswith("draw/"):
+            if action == "draw/yes":
+                game.finish("draw")
+        else:
+            try:
+                game.push_move(action[len("move/"):])
+            except ValueError:
+                self._send_json(400, {"error": "Not your turn, or game already over"})
+                return
+        self._send_json(200, {"ok": True})
+
+    def _inject_fault(self):
+        """Wstrzykuje zaplanowany lub wylosowany błąd. Zwraca True, jeśli zapytanie zostało obsłużone."""
+        fault = self.fake.take_fault(self.path)
+        if fault is None:
+            return False
+        if fault == FAULT_RATE_LIMIT:
+            self._send_json(429, {"error": "Too many requests. Please wait a minute."})
+        elif fault == FAULT_SERVER_ERROR:
+            self._send_json(503, {"error": "Service unavailable"})
+        elif fault == FAULT_BOARD_API:
+            self._send_json(400, {"error": "This game cannot be played with the Board API."})
+        else:
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return True
+
+    def _discard_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _start_stream(self):
+        """Wysyła nagłówki odpowiedzi strumieniowej NDJSON."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.fake._streams.add(self.connection)
+
+    def _stream_game(self, game):
+        """Wysyła strumień NDJSON partii aż do jej zakończenia."""
+        self._start_stream()
+
+        try:
+            with game.condition:
+                sent_moves = len(game.moves)
+                self._send_chunk(json.dumps(game.full()).encode() + b"\n")
+
+                while game.status == "started":
+                    if len(game.moves) == sent_moves:
+                        if not game.condition.wait(timeout=KEEPALIVE_INTERVAL):
+                            self._send_chunk(b"\n")
+                        continue
+                    sent_moves = len(game.moves)
+                    self._send_chunk(json.dumps(game.state()).encode() + b"\n")
+
+                # Stan końcowy partii
+                self._send_chunk(json.dumps(game.state()).encode() + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            self.fake._streams.discard(self.connection)
+        self.close_connection = True
+
+    def _stream_spectator(self, game):
+        """Wysyła strumień widza: podsumowanie, potem FEN i ostatni ruch po każdym ruchu."""
+        self._start_stream()
+
+        try:
+            with game.condition:
+                sent_moves = len(game.moves)
+                self._send_chunk(json.dumps(game.spectator_summary()).encode() + b"\n")
+
+                while game.status == "started" or sent_moves < len(game.moves):
+                    if len(game.moves) == sent_moves:
+                        if not game.condition.wait(timeout=KEEPALIVE_INTERVAL):
+                            self._send_chunk(b"\n")
+                        continue
+                    sent_moves = len(game.moves)
+                    self._send_chunk(json.dumps(game.spectator_move(sent_moves - 1)).encode() + b"\n")
+
+                self._send_chunk(json.dumps(game.spectator_summary()).encode() + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            self.fake._streams.discard(self.connection)
+        self.close_connection = True
+
+    def _stream_events(self):
+        """Wysyła strumień konta: gameStart dla trwających partii, potem nowe zdarzenia."""
+        self._start_stream()
+        self.fake.event_streams += 1
+
+        fake = self.fake
+        try:
+            with fake.events_condition:
+                # Na początku strumienia Lichess zgłasza wszystkie trwające partie
+                for game in list(fake.games.values()):
+                    if game.status == "started":
+                        self._send_chunk(json.dumps(game.account_event("gameStart", fake.account)).encode() + b"\n")
+                sent = len(fake.events)
+                while not fake.closed:
+                    if len(fake.events) == sent:
+                        if not fake.events_condition.wait(timeout=KEEPALIVE_INTERVAL):
+                            self._send_chunk(b"\n")
+                        continue
+                    for event in fake.events[sent:]:
+                        self._send_chunk(json.dumps(event).encode() + b"\n")
+                    sent = len(fake.events)
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            self.fake._streams.discard(self.connection)
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalny serwer udający API Lichess")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--account", default="player")
+    parser.add_argument("--game", default="testgame", help="ID partii tworzonej na starcie")
+    parser.add_argument("--black", action="store_true", help="konto testowe gra czarnymi")
+    parser.add_argument("--no-board-api", action="store_true", help="partia odrzucana przez Board API")
+    parser.add_argument("--opponent-delay", type=float, nargs="+", metavar="S",
+                        help="opóźnienie ruchu przeciwnika w sekundach (lub przedział min max)")
+    parser.add_argument("--opponent-moves", nargs="*", default=[], help="ruchy przeciwnika (UCI)")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="prawdopodobieństwo odpowiedzi 429")
+    parser.add_argument("--server-error", type=float, default=0.0, help="prawdopodobieństwo odpowiedzi 503")
+    parser.add_argument("--disconnect", type=float, default=0.0, help="prawdopodobieństwo zerwania połączenia")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    faults = {FAULT_RATE_LIMIT: args.rate_limit, FAULT_SERVER_ERROR: args.server_error,
+              FAULT_DISCONNECT: args.disconnect}
+    fake = FakeLichess(args.host, args.port, args.account,
+                       faults={kind: rate for kind, rate in faults.items() if rate}, seed=args.seed).start()
+
+    delay = args.opponent_delay
+    if delay is not None:
+        delay = delay[0] if len(delay) == 1 else tuple(delay[:2])
+    players = {"white": "opponent", "black": args.account} if args.black else {"white": args.account}
+    fake.create_game(args.game, board_api=not args.no_board_api, opponent_delay=delay,
+                     opponent_moves=args.opponent_moves, opponent_seed=args.seed, **players)
+    print(f"Serwer testowy Lichess: {fake.url}  (partia: {args.game})")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
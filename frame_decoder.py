@@ -0,0 +1,136 @@
+# frame_decoder.py
+"""
+Strumieniowy dekoder ramek przychodzących od ESP32.
+
+Ramki JSON są rozdzielane znakiem nowej linii (tak wysyła je oprogramowanie ESP32),
+ramki binarne protokołu "bin1" mają stały rozmiar i zaczynają się bajtem MAGIC.
+Dane trafiają do prealokowanego bufora (recv_into), każdy bajt jest przeszukiwany
+tylko raz, a jedno wywołanie frames() zwraca wszystkie kompletne ramki z bufora.
+"""
+from board_protocol import MAGIC, BINARY_FRAME_SIZE
+from config import BUFFER_SIZE
+
+# Maksymalny rozmiar pojedynczej ramki - dłuższe dane są odrzucane do najbliższej nowej linii
+MAX_FRAME_SIZE = 64 * 1024
+
+_SEPARATORS = b' \r\n\t'
+
+
+class FrameDecoder:
+    def __init__(self, capacity=BUFFER_SIZE * 4, max_frame_size=MAX_FRAME_SIZE):
+        """Inicjalizacja dekodera z prealokowanym buforem."""
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0      # Początek nieprzetworzonych danych
+        self._end = 0        # Koniec danych w buforze
+        self._scan = 0       # Pozycja, od której szukamy nowej linii
+        self._discarding = False
+        self.frames_decoded = 0
+        self.bytes_discarded = 0
+
+    @property
+    def pending(self):
+        """Liczba bajtów oczekujących w buforze."""
+        return self._end - self._start
+
+    def recv_into(self, sock):
+        """Odbiera dane z gniazda bezpośrednio do bufora. Zwraca liczbę odebranych bajtów."""
+        self._reserve(1)
+        received = sock.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def feed(self, data):
+        """Dopisuje dane do bufora (np. odebrane przez asyncio)."""
+        self._reserve(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def frames(self):
+        """Zwraca listę wszystkich kompletnych ramek z bufora."""
+        frames = []
+        buffer = self._buffer
+        start = self._start
+        end = self._end
+
+        while start < end:
+            if self._discarding:
+                newline = buffer.find(b'\n', max(self._scan, start), end)
+                if newline < 0:
+                    self.bytes_discarded += end - start
+                    start = end
+                    break
+                self.bytes_discarded += newline + 1 - start
+                start = newline + 1
+                self._discarding = False
+                continue
+
+            first = buffer[start]
+            if first in _SEPARATORS:
+                start += 1
+                continue
+
+            # Ramka binarna o stałym rozmiarze
+            if first == MAGIC:
+                if end - start < BINARY_FRAME_SIZE:
+                    break
+                frames.append(bytes(self._view[start:start + BINARY_FRAME_SIZE]))
+                start += BINARY_FRAME_SIZE
+                continue
+
+            # Ramka tekstowa zakończona nową linią
+            newline = buffer.find(b'\n', max(self._scan, start), end)
+            if newline < 0:
+                self._scan = end
+                if end - start > self.max_frame_size:
+                    print(f"Ramka przekracza {self.max_frame_size} B - odrzucam dane")
+                    self._discarding = True
+                    continue
+                break
+            frames.append(bytes(self._view[start:newline]))
+            start = newline + 1
+
+        self._start = start
+        if self._start == self._end:
+            self._start = self._end = self._scan = 0
+        self.frames_decoded += len(frames)
+        return frames
+
+    def flush(self):
+        """
+        Zwraca niezakończoną ramkę tekstową pozostałą w buforze (np. po zamknięciu połączenia).
+
+        Niepełna ramka binarna nie da się zdekodować - jest odrzucana.
+        """
+        frames = self.frames()
+        if self._start < self._end and not self._discarding:
+            if self._buffer[self._start] == MAGIC:
+                self.bytes_discarded += self._end - self._start
+            else:
+                frames.append(bytes(self._view[self._start:self._end]))
+        self._start = self._end = self._scan = 0
+        self._discarding = False
+        return frames
+
+    def _reserve(self, size):
+        """Zapewnia miejsce na co najmniej size bajtów na końcu bufora."""
+        if self._end + size <= len(self._buffer):
+            return
+
+        # Przesuń nieprzetworzone dane na początek bufora
+        pending = self._end - self._start
+        if self._start > 0:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._scan = max(0, self._scan - self._start)
+            self._start = 0
+            self._end = pending
+
+        # Powiększ bufor, jeśli nadal brakuje miejsca
+        if self._end + size > len(self._buffer):
+            capacity = len(self._buffer)
+            while self._end + size > capacity:
+                capacity *= 2
+            self._view.release()
+            self._buffer.extend(bytes(capacity - len(self._buffer)))
+            self._view = memoryview(self._buffer)
@@ -0,0 +1,216 @@
+# game_playback.py
+"""
+Odtwarzanie partii (PGN lub lista ruchów UCI) jako ruchów ręką na emulowanej szachownicy.
+
+Każdy ruch zamieniany jest na ciąg zmian czujników Reed: najpierw zdjęcie zbitej figury
+(także pionka zbitego w przelocie), potem zdjęcie i postawienie figury ruszającej się,
+a przy roszadzie - przestawienie wieży po królu. Czasy kroków i drgania styków przy
+każdej zmianie czujnika ustawia PlaybackTiming. GamePlayer podaje kolejne stany
+zajętości w ich terminach - tak samo bez okna (EmulatedBoard) i w ChessboardSimulator.
+"""
+import collections
+import random
+import re
+
+from chess_position import Position, STARTING_FEN, iter_squares, uci_to_move, move_to_uci
+
+UCI_MOVE = re.compile(r"^[a-h][1-8][a-h][1-8][nbrq]?$")
+PGN_HEADER = re.compile(r'^\s*\[(\w+)\s+"([^"]*)"\s*\]\s*$', re.MULTILINE)
+PGN_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+PGN_VARIATION = re.compile(r"\([^()]*\)")
+PGN_MOVE_NUMBER = re.compile(r"^\d+\.+")
+PGN_RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class PlaybackTiming:
+    def __init__(self, think_time=1.0, hand_time=1.0, jitter=0.0, bounce_probability=0.0, bounce_flips=2,
+                 bounce_interval=0.005):
+        """
+        Czasy odtwarzania (s).
+
+        think_time - namysł przed pierwszym krokiem ruchu, hand_time - odstęp między
+        kolejnymi krokami ruchu (zdjęcie, postawienie). jitter to losowe odchylenie obu
+        czasów (ułamek, np. 0.3 = +-30%). Z prawdopodobieństwem bounce_probability zmiana
+        czujnika poprzedzona jest 1..bounce_flips krótkimi drganiami co bounce_interval.
+        """
+        self.think_time = think_time
+        self.hand_time = hand_time
+        self.jitter = jitter
+        self.bounce_probability = bounce_probability
+        self.bounce_flips = bounce_flips
+        self.bounce_interval = bounce_interval
+
+
+# Gracz przy szachownicy: namysł, spokojne przestawianie figur, czasem drgające styki
+TIMING_HUMAN = PlaybackTiming(think_time=2.0, hand_time=0.6, jitter=0.3, bounce_probability=0.3)
+# Kroki jeden po drugim - po jednej ramce na obieg pętli szachownicy
+TIMING_MAX_SPEED = PlaybackTiming(think_time=0.0, hand_time=0.0)
+
+TIMINGS = {"human": TIMING_HUMAN, "max": TIMING_MAX_SPEED}
+
+
+def hand_actions(position, move):
+    """Kolejne zmiany czujników przy wykonaniu ruchu ręką: lista (pole, czy_figura_stoi)."""
+    from_square, to_square = move[0], move[1]
+    child = position.copy()
+    child.push(move)
+    before, after = position.occupancy, child.occupancy
+    vacated = before & ~after & ~(1 << from_square)
+    placed = after & ~before & ~(1 << to_square)
+
+    actions = []
+    if before >> to_square & 1:
+        # Bicie - najpierw zdjęcie zbitej figury
+        actions.append((to_square, False))
+    if not placed:
+        # Bicie w przelocie - zbity pionek stoi na innym polu niż pole docelowe
+        actions.extend((square, False) for square in iter_squares(vacated))
+    actions.append((from_square, False))
+    actions.append((to_square, True))
+    if placed:
+        # Roszada - wieża przestawiana po królu
+        actions.extend((square, False) for square in iter_squares(vacated))
+        actions.extend((square, True) for square in iter_squares(placed))
+    return actions
+
+
+def physical_steps(position, move):
+    """Kolejne stany zajętości przy wykonaniu ruchu ręką (bez drgań styków)."""
+    occupancy = position.occupancy
+    steps = []
+    for square, present in hand_actions(position, move):
+        if present:
+            occupancy |= 1 << square
+        else:
+            occupancy &= ~(1 << square)
+        steps.append(occupancy)
+    return steps
+
+
+def random_game(plies, seed):
+    """Lista ruchów UCI losowej partii (powtarzalnie dla danego ziarna)."""
+    rng = random.Random(seed)
+    position = Position()
+    moves = []
+    for _ in range(plies):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append(move_to_uci(move))
+        position.push(move)
+    return moves
+
+
+def parse_game(text):
+    """
+    Wczytuje pierwszą partię z tekstu PGN albo listę ruchów UCI.
+
+    Zwraca krotkę (fen, ruchy UCI). Pozycja początkowa brana jest z nagłówka [FEN].
+    Zgłasza ValueError przy ruchu, którego nie da się wykonać.
+    """
+    headers = dict(PGN_HEADER.findall(text))
+    fen = headers.get("FEN", STARTING_FEN)
+
+    body = PGN_HEADER.sub("", text)
+    body = PGN_COMMENT.sub(" ", body)
+    while PGN_VARIATION.search(body):
+        body = PGN_VARIATION.sub(" ", body)
+
+    position = Position(fen)
+    moves = []
+    for token in body.split():
+        token = PGN_MOVE_NUMBER.sub("", token)
+        if not token or token.startswith("$"):
+            continue
+        if token in PGN_RESULTS:
+            break
+        if UCI_MOVE.match(token) and position.is_legal_uci(token):
+            move = uci_to_move(token)
+        else:
+            try:
+                move = position.parse_san(token)
+            except ValueError:
+                raise ValueError(f"Ruch {len(moves) // 2 + 1}: nie można wykonać {token}")
+        moves.append(move_to_uci(move))
+        position.push(move)
+    return fen, moves
+
+
+def load_game(path):
+    """Wczytuje partię z pliku PGN lub pliku z ruchami UCI. Zwraca (fen, ruchy UCI)."""
+    with open(path, encoding="utf-8") as f:
+        return parse_game(f.read())
+
+
+class GamePlayer:
+    def __init__(self, moves, timing=None, fen=None, seed=None):
+        """
+        Odtwarzanie ruchów UCI (obu stron) od pozycji fen (domyślnie pozycja startowa).
+
+        Ruchy nielegalne w bieżącej pozycji są pomijane.
+        """
+        self.moves = collections.deque(moves)
+        self.timing = timing or PlaybackTiming()
+        self.position = Position(fen or STARTING_FEN)
+        self.occupancy = self.position.occupancy
+        self.rng = random.Random(seed)
+        self._steps = collections.deque()  # (termin, zajętość)
+        self._last_time = None
+
+        # Statystyki
+        self.moves_played = 0
+        self.moves_skipped = 0
+        self.bounces = 0
+
+    @property
+    def done(self):
+        return not self.moves and not self._steps
+
+    def poll(self, now):
+        """Zwraca kolejny stan zajętości, jeśli nadszedł jego termin, w przeciwnym razie None."""
+        if self._last_time is None:
+            self._last_time = now
+        if not self._steps:
+            self._schedule_next_move(self._last_time)
+        if not self._steps or self._steps[0][0] > now:
+            return None
+        self._last_time, self.occupancy = self._steps.popleft()
+        return self.occupancy
+
+    def _delay(self, base):
+        if not base or not self.timing.jitter:
+            return base
+        return max(0.0, base * (1.0 + self.rng.uniform(-self.timing.jitter, self.timing.jitter)))
+
+    def _schedule_next_move(self, start):
+        """Rozpisuje kolejny ruch na kroki z terminami liczonymi od start."""
+        while self.moves:
+            uci = self.moves.popleft()
+            if self.position.is_legal_uci(uci):
+                break
+            self.moves_skipped += 1
+        else:
+            return
+
+        move = uci_to_move(uci)
+        timing = self.timing
+        at = start + self._delay(timing.think_time)
+        occupancy = self.occupancy
+        for index, (square, present) in enumerate(hand_actions(self.position, move)):
+            if index:
+                at += self._delay(timing.hand_time)
+            bit = 1 << square
+            settled = occupancy | bit if present else occupancy & ~bit
+            if timing.bounce_probability and self.rng.random() < timing.bounce_probability:
+                # Drgania styków: nowy stan, powrót, ... zakończone stanem docelowym
+                self.bounces += 1
+                for _ in range(self.rng.randint(1, timing.bounce_flips)):
+                    self._steps.append((at, settled))
+                    self._steps.append((at + timing.bounce_interval, occupancy))
+                    at += 2 * timing.bounce_interval
+            self._steps.append((at, settled))
+            occupancy = settled
+
+        self.position.push(move)
+        self.moves_played += 1
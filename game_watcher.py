@@ -0,0 +1,266 @@
+# game_watcher.py
+"""
+Śledzenie partii, której nie można obsłużyć przez Board API.
+
+Najpierw używany jest strumień widza /api/stream/game/{id} (ruch w chwili wykonania).
+Gdy jest niedostępny, eksport partii odpytywany jest z nagłówkiem If-None-Match,
+w odstępach zależnych od tego, czyja jest tura i ile czasu zostało przeciwnikowi.
+Zapis SAN z eksportu porównywany jest z zapamiętanymi ruchami po liczbie półruchów
+(i ostatnim ruchu), parsowane są tylko nowe ruchy. on_state wywoływane jest po pierwszym
+odczycie stanu, a potem tylko wtedy, gdy stan partii faktycznie się zmienił.
+"""
+import http.client
+import json
+import threading
+
+from config import (LICHESS_API_TOKEN, LICHESS_API_URL, RATE_LIMIT_DELAY, WATCH_MIN_INTERVAL,
+                    WATCH_MAX_INTERVAL, WATCH_CLOCK_DIVISOR)
+from chess_position import Position, SQUARE_NAMES, move_to_uci
+from lichess_stream import NdjsonStream, LichessApiError, open_connection, auth_headers, read_error
+
+EXPORT_QUERY = "moves=true&clocks=true&evals=false&opening=false&literate=false"
+
+# Znaki, którymi zapis SAN może się różnić bez zmiany ruchu (szach, mat, komentarz, promocja)
+_SAN_ANNOTATIONS = str.maketrans("", "", "+#!?=")
+
+
+def _san_key(san):
+    """Zapis SAN bez oznaczeń - do porównania ruchu z eksportu z ruchem zapisanym lokalnie."""
+    return san.translate(_SAN_ANNOTATIONS)
+
+
+class GameWatcher:
+    def __init__(self, game_id, on_state, account_id=None, token=LICHESS_API_TOKEN, base_url=LICHESS_API_URL,
+                 min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL,
+                 clock_divisor=WATCH_CLOCK_DIVISOR):
+        """
+        Inicjalizacja śledzenia partii.
+
+        on_state(state) otrzymuje słownik w formacie zdarzenia gameState (ruchy w UCI).
+        """
+        self.game_id = game_id
+        self.on_state = on_state
+        self.account_id = account_id
+        self.token = token
+        self.base_url = base_url
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock_divisor = clock_divisor
+
+        self.player_color = None
+        self.status = "started"
+        self.position = Position()
+        self.moves = []          # Ruchy UCI
+        self._sans = []          # Te same ruchy w zapisie SAN
+        self.clocks = {"white": None, "black": None}  # Pozostały czas (ms)
+
+        self.running = False
+        self._wakeup = threading.Event()
+        self._stream = None
+        self._connection = None
+        self._etag = None
+        self._emitted = False
+
+        # Statystyki
+        self.requests = 0
+        self.not_modified = 0
+        self.changes = 0
+
+    def run(self):
+        """Śledzi partię do jej zakończenia lub wywołania stop()."""
+        self.running = True
+        self._poll_export()
+
+        if self.running and self.status == "started":
+            self._stream = NdjsonStream(f"/api/stream/game/{self.game_id}", self._on_stream_event,
+                                        token=self.token, base_url=self.base_url,
+                                        name=f"watch-{self.game_id}")
+            try:
+                self._stream.run()
+            except LichessApiError as e:
+                print(f"Strumień partii niedostępny ({e}) - przechodzę na odpytywanie eksportu")
+
+        while self.running and self.status == "started":
+            self._wakeup.wait(self.poll_interval())
+            self._wakeup.clear()
+            if self.running:
+                self._poll_export()
+
+        self._close()
+
+    def stop(self):
+        """Zatrzymuje śledzenie."""
+        self.running = False
+        self._wakeup.set()
+        if self._stream:
+            self._stream.stop()
+
+    def poke(self):
+        """Wymusza natychmiastowe sprawdzenie stanu (np. po wysłaniu własnego ruchu)."""
+        self._wakeup.set()
+
+    def is_my_turn(self):
+        return self.player_color is not None and (len(self.moves) % 2 == 0) == (self.player_color == "white")
+
+    def poll_interval(self):
+        """Odstęp do następnego odpytania eksportu (sekundy)."""
+        if self.player_color is None:
+            return self.min_interval
+        if self.is_my_turn():
+            # Stan zmieni dopiero nasz ruch (poke) albo koniec partii
+            return self.max_interval
+        opponent_clock = self.clocks["black" if self.player_color == "white" else "white"]
+        if opponent_clock is None:
+            return self.max_interval
+        return max(self.min_interval, min(self.max_interval, opponent_clock / 1000.0 / self.clock_divisor))
+
+    def _emit(self):
+        """Przekazuje stan partii po zmianie."""
+        self._emitted = True
+        self.changes += 1
+        self.on_state({
+            "type": "gameState",
+            "moves": " ".join(self.moves),
+            "wtime": self.clocks["white"],
+            "btime": self.clocks["black"],
+            "status": self.status,
+        })
+        if self.status != "started":
+            self.stop()
+
+    def _push(self, move):
+        """Dodaje ruch do śledzonej partii."""
+        san = self.position.san(move)
+        self.position.push(move)
+        self.moves.append(move_to_uci(move))
+        self._sans.append(san)
+
+    def _reset(self):
+        self.position = Position()
+        self.moves = []
+        self._sans = []
+
+    # --- Eksport partii ---
+
+    def _poll_export(self):
+        """Pobiera eksport partii (warunkowo) i uwzględnia nowe ruchy."""
+        headers = auth_headers(self.token)
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+
+        try:
+            if self._connection is None:
+                self._connection = open_connection(self.base_url)
+            self._connection.request("GET", f"/game/export/{self.game_id}?{EXPORT_QUERY}", headers=headers)
+            response = self._connection.getresponse()
+            self.requests += 1
+
+            if response.status == 304:
+                response.read()
+                self.not_modified += 1
+                return
+            if response.status == 429:
+                response.read()
+                print(f"Przekroczono limit zapytań - czekam {RATE_LIMIT_DELAY:.0f} s")
+                self._wakeup.wait(RATE_LIMIT_DELAY)
+                return
+            if response.status >= 400:
+                raise read_error(response)
+
+            self._etag = response.getheader("ETag")
+            game = json.loads(response.read())
+        except (OSError, http.client.HTTPException, LichessApiError, ValueError) as e:
+            print(f"Wystąpił błąd podczas pobierania stanu gry: {e}")
+            self._close()
+            return
+
+        if self.player_color is None and self.account_id:
+            white_id = game.get("players", {}).get("white", {}).get("user", {}).get("id")
+            self.player_color = "white" if white_id == self.account_id else "black"
+
+        changed = self._apply_san_text(game.get("moves", ""))
+        changed |= self._apply_export_clocks(game.get("clocks"))
+        status = game.get("status", "started")
+        if status != self.status:
+            self.status = status
+            changed = True
+        # Pierwszy odczyt przekazywany jest zawsze - np. początek partii, w której gracz ma pierwszy ruch
+        if changed or not self._emitted:
+            self._emit()
+
+    def _apply_san_text(self, san_text):
+        """Uwzględnia zapis SAN z eksportu - parsowane są tylko nowe ruchy. Zwraca True przy zmianie."""
+        sans = san_text.split()
+        known = len(self.moves)
+        same_last = not known or (len(sans) >= known and _san_key(sans[known - 1]) == _san_key(self._sans[-1]))
+        if len(sans) == known and same_last:
+            return False
+        if len(sans) < known or not same_last:
+            # Historia się nie zgadza (np. cofnięty ruch) - odtwórz od początku
+            self._reset()
+
+        try:
+            for san in sans[len(self.moves):]:
+                self._push(self.position.parse_san(san))
+        except ValueError as e:
+            print(f"Nie można odczytać ruchu z eksportu partii: {e}")
+        return True
+
+    def _apply_export_clocks(self, clocks):
+        """Odczytuje pozostały czas obu stron z listy zegarów eksportu (setne sekundy). Zwraca True przy zmianie."""
+        if not clocks:
+            return False
+        previous = dict(self.clocks)
+        for color, parity in (("white", 0), ("black", 1)):
+            own = clocks[parity::2]
+            if own:
+                self.clocks[color] = own[-1] * 10
+        return self.clocks != previous
+
+    # --- Strumień widza ---
+
+    def _on_stream_event(self, event):
+        """Obsługuje zdarzenie strumienia /api/stream/game/{id}."""
+        if not self.running:
+            self._stream.stop()
+            return
+
+        if "lm" in event and "fen" in event:
+            for color, key in (("white", "wc"), ("black", "bc")):
+                if key in event:
+                    self.clocks[color] = event[key] * 1000
+            move = self._match_fen(event["fen"], event["lm"])
+            if move is None:
+                # Nie udało się dopasować ruchu - uzgodnij stan z eksportem
+                self._poll_export()
+                return
+            self._push(move)
+            self._emit()
+            return
+
+        # Podsumowanie partii (pierwsze zdarzenie strumienia i zakończenie partii)
+        status = event.get("status")
+        if isinstance(status, dict):
+            status = status.get("name")
+        if event.get("turns") is not None and event["turns"] != len(self.moves):
+            self._poll_export()
+        elif status and status not in ("created", "started") and status != self.status:
+            self.status = status
+            self._emit()
+
+    def _match_fen(self, fen, last_move):
+        """Znajduje ruch legalny prowadzący do pozycji fen (ostatni ruch może być zapisany jako król bije wieżę)."""
+        placement = fen.split()[0]
+        for move in self.position.legal_moves():
+            if last_move and SQUARE_NAMES[move[0]] != last_move[:2]:
+                continue
+            child = self.position.copy()
+            child.push(move)
+            if child.fen().split()[0] == placement:
+                return move
+        return None
+
+    def _close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
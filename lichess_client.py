@@ -1,22 +1,56 @@
 # lichess_client.py
 import berserk
 import threading
-import time
 import datetime
 
+from config import LICHESS_API_URL
+from lichess_stream import NdjsonStream, LichessApiError
+from game_watcher import GameWatcher
+from move_log import MoveLog
+from move_submitter import MoveSubmitter
+
 
 class LichessClient:
-    def __init__(self, api_token, on_opponent_move=None, on_my_turn=None):
-        """Inicjalizacja klienta Lichess."""
+    def __init__(self, api_token, on_opponent_move=None, on_my_turn=None, on_moves=None,
+                 on_move_failed=None, base_url=LICHESS_API_URL, hub=None):
+        """
+        Inicjalizacja klienta Lichess.
+
+        on_moves(moves) otrzymuje pełną listę ruchów partii (UCI) przy każdej zmianie stanu.
+        on_move_failed(move) wywoływane jest, gdy ruchu gracza nie udało się wysłać.
+        hub (lichess_hub.LichessHub) pozwala wielu szachownicom współdzielić konto
+        i strumień zdarzeń - bez podanego ID partii jej strumień otwierany jest wtedy dopiero
+        po jej rozpoczęciu.
+        """
+        self.api_token = api_token
+        self.base_url = base_url
         self.session = berserk.TokenSession(api_token)
-        self.client = berserk.Client(session=self.session)
+        self.client = berserk.Client(session=self.session, base_url=base_url)
         self.game_id = None
         self.player_color = None
         self.account_id = None
         self.on_opponent_move = on_opponent_move
         self.on_my_turn = on_my_turn
+        self.on_moves = on_moves
+        self.on_move_failed = on_move_failed
         self.game_thread = None
+        self.game_stream = None
+        self.event_stream = None
+        self.watcher = None
+        self.submitter = None
         self.running = False
+        self.hub = hub
+        self._start_lock = threading.Lock()
+
+        # Ruchy partii i ostatni półruch, dla którego zgłoszono turę gracza
+        self.move_log = MoveLog()
+        self.history_loaded = False
+        self._my_turn_notified_ply = None
+
+        if hub:
+            # Konto pobrane raz dla wszystkich szachownic
+            self.account_id = hub.account_id
+            return
 
         # Pobierz informacje o koncie
         try:
@@ -27,45 +61,83 @@ class LichessClient:
             self.account_id = None
 
     def start_game(self, game_id):
-        """Rozpoczęcie śledzenia i grania partii o podanym ID."""
-        self.game_id = game_id
-        self.running = True
+        """
+        Rozpoczęcie śledzenia i grania partii o podanym ID.
 
-        # Uruchom śledzenie gry w osobnym wątku
-        self.game_thread = threading.Thread(target=self._stream_game)
-        self.game_thread.daemon = True
-        self.game_thread.start()
+        Z hubem game_id=None oznacza pierwszą rozpoczętą partię, której nie gra inna szachownica.
+        Znana partia otwierana jest od razu - hub przekazuje wtedy tylko jej zakończenie.
+        """
+        self.running = True
+        if self.hub:
+            self.hub.register(self, game_id)
+        if game_id is not None or not self.hub:
+            self.on_game_start(game_id)
+
+    def on_game_start(self, game_id):
+        """Partia się rozpoczęła - otwiera jej strumień i połączenie do wysyłania ruchów."""
+        with self._start_lock:
+            if not self.running or (self.game_thread and self.game_thread.is_alive()):
+                return
+            self.game_id = game_id
+
+            # Połączenie do wysyłania ruchów nawiązywane jest od razu (i zachowywane przy ponownym otwarciu)
+            if self.submitter is None or self.submitter.game_id != game_id:
+                if self.submitter:
+                    self.submitter.stop()
+                self.submitter = MoveSubmitter(game_id, lambda: self.move_log.moves,
+                                               on_success=self._on_move_accepted, on_failure=self._on_move_failed,
+                                               token=self.api_token, base_url=self.base_url).start()
+
+            # Uruchom śledzenie gry w osobnym wątku
+            self.game_thread = threading.Thread(target=self._stream_game)
+            self.game_thread.daemon = True
+            self.game_thread.start()
+
+    def on_game_finish(self, game_id):
+        """Partia zakończyła się według strumienia zdarzeń konta - zamyka jej strumienie."""
+        if game_id == self.game_id and self.running:
+            print(f"\nPartia {game_id} zakończona.")
+            self.stop()
+
+    def on_hub_lost(self, game_id=None):
+        """Strumień zdarzeń huba zakończył się - klient dalej śledzi partię samodzielnie."""
+        if not self.running:
+            return
+        if game_id is not None:
+            self.on_game_start(game_id)
+            return
+        thread = threading.Thread(target=self._wait_for_game, name="lichess-wait")
+        thread.daemon = True
+        thread.start()
+
+    def _wait_for_game(self):
+        """Czeka na rozpoczęcie partii na własnym strumieniu zdarzeń konta."""
+        print("Oczekiwanie na rozpoczęcie partii (własny strumień zdarzeń)...")
+        self.event_stream = NdjsonStream("/api/stream/event", self._handle_account_event, token=self.api_token,
+                                         base_url=self.base_url, name="lichess-events-own")
+        try:
+            self.event_stream.run()
+        except LichessApiError as e:
+            print(f"Strumień zdarzeń Lichess niedostępny: {e}")
+
+    def _handle_account_event(self, event):
+        """Pierwsza rozpoczęta partia konta kończy oczekiwanie."""
+        game = event.get("game") or {}
+        game_id = game.get("gameId") or game.get("id")
+        if event.get("type") == "gameStart" and game_id:
+            self.event_stream.stop()
+            self.on_game_start(game_id)
 
     def _stream_game(self):
-        """Strumieniuje stan gry i obsługuje zdarzenia."""
+        """Strumieniuje stan gry i obsługuje zdarzenia w chwili ich odebrania."""
+        self.game_stream = NdjsonStream(f"/api/board/game/stream/{self.game_id}", self._handle_game_event,
+                                        token=self.api_token, base_url=self.base_url,
+                                        name=f"game-{self.game_id}")
         try:
-            for event in self.client.board.stream_game_state(self.game_id):
-                if not self.running:
-                    break
-
-                event_type = event.get('type')
-
-                if event_type == 'gameFull':
-                    # Początkowy stan gry
-                    white_id = event.get('white', {}).get('id')
-                    self.player_color = 'white' if white_id == self.account_id else 'black'
-                    print(f"Grasz jako: {self.player_color}")
-
-                    self._display_game_info(event)
-
-                    # Pobierz aktualny stan
-                    state = event.get('state', {})
-                    self._process_state(state)
-
-                elif event_type == 'gameState':
-                    # Aktualizacja stanu gry
-                    self._process_state(event)
+            self.game_stream.run()
 
-                # Małe opóźnienie, aby zapobiec zbyt szybkim aktualizacjom
-                time.sleep(0.1)
-
-        except berserk.exceptions.ResponseError as e:
-            if 'Board API' in str(e):
+        except LichessApiError as e:
+            if 'Board API' in e.message:
                 print("\nBłąd: Ta partia nie może być obsługiwana przez Board API.")
                 print("Przyczyną może być tempo gry (tylko Classical i Correspondence są obsługiwane)")
                 print("lub inne ograniczenia (gra musi być publiczna, nie może być zakończona, itp.)")
@@ -76,106 +148,102 @@ class LichessClient:
         except Exception as e:
             print(f"Wystąpił błąd podczas śledzenia gry: {e}")
 
-    def _track_with_alternative_api(self):
-        """Śledzi grę za pomocą alternatywnego API."""
-        print("\nUżywam alternatywnego API do śledzenia partii.")
-
-        last_moves = []
+    def _handle_game_event(self, event):
+        """Obsługuje pojedyncze zdarzenie strumienia partii."""
+        if not self.running:
+            self.game_stream.stop()
+            return
 
-        while self.running:
-            try:
-                # Pobierz aktualny stan gry
-                game = self.client.games.export(self.game_id)
+        event_type = event.get('type')
 
-                # Sprawdź, czy gra się zakończyła
-                if game.get('status') != 'started':
-                    print(f"\nPartia zakończona. Wynik: {game.get('status')}")
-                    break
+        if event_type == 'gameFull':
+            # Początkowy stan gry (także po wznowieniu strumienia)
+            white_id = event.get('white', {}).get('id')
+            self.player_color = 'white' if white_id == self.account_id else 'black'
+            print(f"Grasz jako: {self.player_color}")
 
-                # Pobierz ruchy
-                moves_str = game.get('moves', '')
-                current_moves = self._parse_moves(moves_str)
+            self._display_game_info(event)
 
-                # Znajdź nowe ruchy
-                if len(current_moves) > len(last_moves):
-                    # Wyświetl nowe ruchy
-                    for i in range(len(last_moves), len(current_moves)):
-                        move_number = i // 2 + 1
-                        is_white = i % 2 == 0
-                        move = current_moves[i]
+            # Pobierz aktualny stan
+            state = event.get('state', {})
+            self._process_state(state)
 
-                        self._display_move(move_number, is_white, move)
+        elif event_type == 'gameState':
+            # Aktualizacja stanu gry
+            self._process_state(event)
 
-                        # Sprawdź, czy to ruch przeciwnika
-                        is_opponent_move = (self.player_color == 'white' and not is_white) or \
-                                           (self.player_color == 'black' and is_white)
+        # Partia zakończona - zamknij strumień
+        if not self.running:
+            self.game_stream.stop()
 
-                        if is_opponent_move and self.on_opponent_move:
-                            self.on_opponent_move(move)
+    def _track_with_alternative_api(self):
+        """Śledzi grę za pomocą alternatywnego API (strumień widza lub odpytywanie eksportu)."""
+        print("\nUżywam alternatywnego API do śledzenia partii.")
 
-                    # Zaktualizuj listę ruchów
-                    last_moves = current_moves.copy()
+        self.watcher = GameWatcher(self.game_id, self._handle_watched_state, account_id=self.account_id,
+                                   token=self.api_token, base_url=self.base_url)
+        self.watcher.run()
 
-                # Sprawdź, czy teraz jest kolej gracza
-                is_my_turn = (self.player_color == 'white' and len(current_moves) % 2 == 0) or \
-                             (self.player_color == 'black' and len(current_moves) % 2 == 1)
+    def _handle_watched_state(self, state):
+        """Obsługuje zmianę stanu partii zgłoszoną przez GameWatcher."""
+        if self.player_color is None and self.watcher.player_color:
+            self.player_color = self.watcher.player_color
+            print(f"Grasz jako: {self.player_color}")
 
-                if is_my_turn and self.on_my_turn:
-                    self.on_my_turn()
+        self._process_state(state)
 
-                # Odczekaj przed następnym sprawdzeniem
-                time.sleep(2)
+        if not self.running:
+            self.watcher.stop()
 
-            except Exception as e:
-                print(f"Wystąpił błąd podczas pobierania stanu gry: {e}")
-                time.sleep(5)  # Czekaj dłużej w przypadku błędu
+    @property
+    def last_moves(self):
+        """Lista ruchów partii (UCI)."""
+        return self.move_log.moves
 
     def _process_state(self, state):
-        """Przetwarza stan gry."""
-        # Pobierz ruchy
-        moves_str = state.get('moves', '')
-        current_moves = self._parse_moves(moves_str)
-
-        # Wyświetl nowe ruchy
-        if hasattr(self, 'last_moves'):
-            # Znajdź nowe ruchy
-            if len(current_moves) > len(self.last_moves):
-                for i in range(len(self.last_moves), len(current_moves)):
-                    move_number = i // 2 + 1
-                    is_white = i % 2 == 0
-                    move = current_moves[i]
-
-                    # Wyświetl ruch
-                    white_time = state.get('wtime') if is_white else None
-                    black_time = state.get('btime') if not is_white else None
-                    self._display_move(move_number, is_white, move, white_time, black_time)
-
-                    # Sprawdź, czy to ruch przeciwnika
-                    is_opponent_move = (self.player_color == 'white' and not is_white) or \
-                                       (self.player_color == 'black' and is_white)
-
-                    if is_opponent_move and self.on_opponent_move:
-                        self.on_opponent_move(move)
+        """Przetwarza stan gry - koszt zależy tylko od liczby nowych ruchów."""
+        previous_length = len(self.move_log)
+        start, new_moves = self.move_log.update(state.get('moves', ''))
+        moves = self.move_log.moves
+
+        # Przekaż pełną listę ruchów przed powiadomieniem o ruchu przeciwnika
+        if new_moves or start < previous_length:
+            if self.submitter:
+                self.submitter.notify_moves(moves)
+            if self.on_moves:
+                self.on_moves(moves)
+
+        if not self.history_loaded:
+            # Pierwsza aktualizacja - podsumowanie zamiast wypisywania całej historii
+            self.history_loaded = True
+            if moves:
+                print(f"Wczytano {len(moves)} ruchów partii. Ostatni ruch: {moves[-1]}")
         else:
-            # Pierwsza aktualizacja - wyświetl wszystkie ruchy
-            for i, move in enumerate(current_moves):
+            if start < previous_length:
+                print(f"\nHistoria partii zmieniła się - {len(moves)} ruchów")
+
+            for i, move in enumerate(new_moves, start):
                 move_number = i // 2 + 1
                 is_white = i % 2 == 0
 
                 # Wyświetl ruch
-                white_time = state.get('wtime') if i == len(current_moves) - 2 else None
-                black_time = state.get('btime') if i == len(current_moves) - 1 else None
+                white_time = state.get('wtime') if is_white else None
+                black_time = state.get('btime') if not is_white else None
                 self._display_move(move_number, is_white, move, white_time, black_time)
 
-        # Zapamiętaj ruchy
-        self.last_moves = current_moves.copy()
+                # Sprawdź, czy to ruch przeciwnika
+                is_opponent_move = self.player_color is not None and \
+                    (self.player_color == 'white') != is_white
 
-        # Sprawdź, czy teraz jest kolej gracza
-        is_my_turn = (self.player_color == 'white' and len(current_moves) % 2 == 0) or \
-                     (self.player_color == 'black' and len(current_moves) % 2 == 1)
+                if is_opponent_move and self.on_opponent_move:
+                    self.on_opponent_move(move)
 
-        if is_my_turn and self.on_my_turn:
-            self.on_my_turn()
+        # Tura gracza zgłaszana jest raz na półruch
+        ply = len(moves)
+        if self.move_log.is_turn(self.player_color) and self._my_turn_notified_ply != ply:
+            self._my_turn_notified_ply = ply
+            if self.on_my_turn:
+                self.on_my_turn()
 
         # Sprawdź, czy gra się zakończyła
         if state.get('status') != 'started':
@@ -232,21 +300,26 @@ class LichessClient:
         except Exception:
             return f"?"
 
-    def _parse_moves(self, moves_str):
-        """Przetwarza ciąg ruchów na listę pojedynczych ruchów."""
-        if not moves_str or not isinstance(moves_str, str):
-            return []
-        return moves_str.strip().split()
-
     def make_move(self, move):
-        """Wykonuje ruch w formacie UCI."""
-        try:
-            self.client.board.make_move(self.game_id, move)
-            print(f"Wykonano ruch: {move}")
-            return True
-        except Exception as e:
-            print(f"Błąd podczas wykonywania ruchu: {e}")
+        """Przekazuje ruch w formacie UCI do wysłania i wraca natychmiast."""
+        if not self.submitter:
+            print("Błąd podczas wykonywania ruchu: partia nie została rozpoczęta")
             return False
+        self.submitter.submit(move, ply=len(self.move_log))
+        return True
+
+    def _on_move_accepted(self, move):
+        """Ruch przyjęty przez Lichess."""
+        print(f"Wykonano ruch: {move}")
+        if self.watcher:
+            # Ruch nie przyjdzie strumieniem Board API - sprawdź stan od razu
+            self.watcher.poke()
+
+    def _on_move_failed(self, move, error):
+        """Ruchu nie udało się wysłać mimo ponowień."""
+        print(f"Błąd podczas wykonywania ruchu: {error}")
+        if self.on_move_failed:
+            self.on_move_failed(move)
 
     def resign_game(self):
         """Poddaje grę."""
@@ -272,5 +345,15 @@ class LichessClient:
     def stop(self):
         """Zatrzymuje klienta."""
         self.running = False
-        if self.game_thread and self.game_thread.is_alive():
+        if self.hub:
+            self.hub.unregister(self)
+        if self.game_stream:
+            self.game_stream.stop()
+        if self.event_stream:
+            self.event_stream.stop()
+        if self.watcher:
+            self.watcher.stop()
+        if self.submitter:
+            self.submitter.stop()
+        if self.game_thread and self.game_thread.is_alive() and self.game_thread is not threading.current_thread():
             self.game_thread.join(timeout=1.0)
@@ -0,0 +1,155 @@
+# lichess_hub.py
+"""
+Jedno połączenie z Lichess współdzielone przez wszystkie szachownice.
+
+LichessHub raz pobiera informacje o koncie i utrzymuje jeden strumień zdarzeń konta
+(/api/stream/event). Zdarzenia gameStart i gameFinish kierowane są do klienta
+(LichessClient) szachownicy, która gra daną partię - strumień partii otwierany jest
+dopiero, gdy partia się rozpoczęła, i zamykany po jej zakończeniu. Szachownica bez
+podanego ID partii dostaje pierwszą rozpoczętą partię, której nie gra inna szachownica.
+Gdy strumień zdarzeń konta przestanie działać, klienci są o tym powiadamiani
+(on_hub_lost) i dalej śledzą swoje partie samodzielnie.
+"""
+import http.client
+import json
+import threading
+
+from config import LICHESS_API_URL
+from lichess_stream import NdjsonStream, LichessApiError, open_connection, auth_headers, read_error
+
+
+class LichessHub:
+    def __init__(self, api_token, base_url=LICHESS_API_URL):
+        """Inicjalizacja wspólnego połączenia dla konta o podanym tokenie."""
+        self.api_token = api_token
+        self.base_url = base_url
+        self.account_id = None
+
+        self.active_games = {}   # game_id -> dane partii ze zdarzenia gameStart
+        self.clients = {}        # game_id -> LichessClient
+        self._waiting = []       # Klienci czekający na dowolną rozpoczętą partię
+        self._lock = threading.RLock()
+
+        self.stream = None
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Pobiera konto i uruchamia strumień zdarzeń w osobnym wątku.
+
+        Gdy konta nie udało się pobrać, strumień nie jest uruchamiany (running pozostaje False) -
+        rejestrowani klienci śledzą wtedy swoje partie samodzielnie.
+        """
+        self.account_id = self._fetch_account_id()
+        if self.account_id is None:
+            print("Nie pobrano konta Lichess - wspólny strumień zdarzeń nie zostanie uruchomiony")
+            return self
+        self.running = True
+        self.stream = NdjsonStream("/api/stream/event", self._handle_event, token=self.api_token,
+                                   base_url=self.base_url, name="lichess-events")
+        self._thread = threading.Thread(target=self._run_stream, name="lichess-events")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Zatrzymuje strumień zdarzeń (strumienie partii zatrzymują ich klienci)."""
+        self.running = False
+        if self.stream:
+            self.stream.stop()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def register(self, client, game_id=None):
+        """
+        Przypisuje klienta szachownicy do partii.
+
+        Jeśli partia już trwa, klient otwiera jej strumień od razu, w przeciwnym razie
+        po zdarzeniu gameStart. game_id=None oznacza pierwszą rozpoczętą, wolną partię.
+        Po utracie strumienia zdarzeń klient od razu przechodzi na własne śledzenie partii.
+        """
+        with self._lock:
+            running = self.running
+            if running:
+                if game_id is None:
+                    game_id = next((gid for gid in self.active_games if gid not in self.clients), None)
+                    if game_id is None:
+                        self._waiting.append(client)
+                        print("Oczekiwanie na rozpoczęcie partii...")
+                        return
+                self.clients[game_id] = client
+                active = game_id in self.active_games
+        if not running:
+            client.on_hub_lost(game_id)
+        elif active:
+            client.on_game_start(game_id)
+
+    def unregister(self, client):
+        """Odłącza klienta od partii."""
+        with self._lock:
+            if client in self._waiting:
+                self._waiting.remove(client)
+            for game_id in [gid for gid, c in self.clients.items() if c is client]:
+                del self.clients[game_id]
+
+    def _run_stream(self):
+        try:
+            self.stream.run()
+        except LichessApiError as e:
+            print(f"Strumień zdarzeń Lichess niedostępny: {e}")
+        except Exception as e:
+            print(f"Błąd strumienia zdarzeń Lichess: {e}")
+        if self.running:
+            self._release_clients()
+
+    def _release_clients(self):
+        """Strumień zdarzeń zakończył się - klienci dalej śledzą swoje partie samodzielnie."""
+        with self._lock:
+            self.running = False
+            released = [(client, None) for client in self._waiting]
+            released.extend((client, game_id) for game_id, client in self.clients.items())
+            self._waiting = []
+            self.clients.clear()
+        for client, game_id in released:
+            client.on_hub_lost(game_id)
+
+    def _fetch_account_id(self):
+        """Pobiera ID konta (jedno zapytanie dla wszystkich szachownic)."""
+        connection = open_connection(self.base_url)
+        try:
+            connection.request("GET", "/api/account", headers=auth_headers(self.api_token))
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise read_error(response)
+            return json.loads(response.read()).get("id")
+        except (OSError, http.client.HTTPException, LichessApiError, ValueError) as e:
+            print(f"Błąd podczas pobierania informacji o koncie: {e}")
+            return None
+        finally:
+            connection.close()
+
+    def _handle_event(self, event):
+        """Kieruje zdarzenie strumienia konta do klienta szachownicy."""
+        event_type = event.get("type")
+        game = event.get("game") or {}
+        game_id = game.get("gameId") or game.get("id")
+        if not game_id:
+            return
+
+        if event_type == "gameStart":
+            with self._lock:
+                self.active_games[game_id] = game
+                client = self.clients.get(game_id)
+                if client is None and self._waiting:
+                    client = self._waiting.pop(0)
+                    self.clients[game_id] = client
+            if client:
+                client.on_game_start(game_id)
+
+        elif event_type == "gameFinish":
+            with self._lock:
+                self.active_games.pop(game_id, None)
+                client = self.clients.pop(game_id, None)
+            if client:
+                client.on_game_finish(game_id)
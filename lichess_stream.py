@@ -0,0 +1,180 @@
+# lichess_stream.py
+"""
+Lekki transport strumieni NDJSON API Lichess.
+
+Odpowiedź strumieniowa czytana jest linia po linii z jednego trwałego połączenia HTTP,
+a każde zdarzenie przekazywane jest do obsługi w chwili odebrania pełnej linii.
+Po zerwaniu połączenia strumień jest otwierany ponownie (z rosnącym opóźnieniem);
+strumień partii Lichess zaczyna się zawsze od pełnego stanu (gameFull), więc
+obsługa zdarzeń sama uzgadnia, które ruchy są nowe.
+"""
+import http.client
+import json
+import re
+import socket
+import threading
+import urllib.parse
+
+import metrics
+
+from config import (LICHESS_API_TOKEN, LICHESS_API_URL, STREAM_READ_TIMEOUT, STREAM_RECONNECT_DELAY,
+                    STREAM_RECONNECT_MAX_DELAY, RATE_LIMIT_DELAY)
+
+# Ścieżka strumienia bez ID partii - etykieta metryk nie tworzy nowej serii dla każdej partii
+_GAME_ID_SUFFIX = re.compile(r"/[A-Za-z0-9]{8,12}$")
+
+STREAM_EVENTS = metrics.counter("lichess_stream_events_total", "Zdarzenia odebrane ze strumieni Lichess", ("path",))
+STREAM_EVENT_SECONDS = metrics.histogram("lichess_stream_event_seconds",
+                                         "Czas obsługi zdarzenia strumienia Lichess", ("path",))
+STREAM_RECONNECTS = metrics.counter("lichess_stream_reconnects_total",
+                                    "Ponowne otwarcia strumieni Lichess po zerwaniu", ("path",))
+
+
+class LichessApiError(Exception):
+    """Błąd zwrócony przez API Lichess (kod HTTP i komunikat)."""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def open_connection(base_url=LICHESS_API_URL, timeout=STREAM_READ_TIMEOUT):
+    """Otwiera połączenie HTTP lub HTTPS do podanego adresu bazowego."""
+    parsed = urllib.parse.urlsplit(base_url)
+    if parsed.scheme == "https":
+        return http.client.HTTPSConnection(parsed.hostname, parsed.port, timeout=timeout)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+
+
+def auth_headers(token, accept="application/json"):
+    """Zwraca nagłówki żądania z tokenem API."""
+    headers = {"Accept": accept, "Connection": "keep-alive"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+
+def read_error(response):
+    """Zwraca LichessApiError z treścią odpowiedzi błędu."""
+    body = response.read().decode("utf-8", errors="replace")
+    try:
+        message = json.loads(body).get("error", body)
+    except (ValueError, AttributeError):
+        message = body
+    return LichessApiError(response.status, message)
+
+
+class NdjsonStream:
+    def __init__(self, path, on_event, token=LICHESS_API_TOKEN, base_url=LICHESS_API_URL,
+                 timeout=STREAM_READ_TIMEOUT, reconnect_delay=STREAM_RECONNECT_DELAY,
+                 max_reconnect_delay=STREAM_RECONNECT_MAX_DELAY, name="lichess-stream"):
+        """
+        Inicjalizacja strumienia NDJSON.
+
+        on_event(event) wywoływane jest w wątku czytającym dla każdego zdarzenia (słownika).
+        Błędy 4xx (poza 429) są zgłaszane jako LichessApiError - np. odmowa Board API.
+        """
+        self.path = path
+        self.on_event = on_event
+        self.token = token
+        self.base_url = base_url
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.name = name
+
+        self.running = False
+        self._stopped = threading.Event()
+        self._connection = None
+
+        # Statystyki
+        self.connects = 0
+        self.events = 0
+        metric_path = _GAME_ID_SUFFIX.sub("", path.split("?", 1)[0])
+        self._events_metric = STREAM_EVENTS.labels(metric_path)
+        self._event_seconds = STREAM_EVENT_SECONDS.labels(metric_path)
+        self._reconnects_metric = STREAM_RECONNECTS.labels(metric_path)
+
+    def run(self):
+        """Czyta strumień do wywołania stop(), wznawiając go po zerwaniu połączenia."""
+        self.running = True
+        self._stopped.clear()
+        delay = self.reconnect_delay
+
+        while self.running:
+            try:
+                if self._stream_once():
+                    delay = self.reconnect_delay
+            except LichessApiError as e:
+                if e.status == 429:
+                    print(f"{self.name}: przekroczono limit zapytań - czekam {RATE_LIMIT_DELAY:.0f} s")
+                    self._stopped.wait(RATE_LIMIT_DELAY)
+                    continue
+                if e.status < 500:
+                    raise
+                print(f"{self.name}: błąd serwera ({e}) - ponowienie za {delay:.1f} s")
+            except (OSError, http.client.HTTPException) as e:
+                if not self.running:
+                    break
+                print(f"{self.name}: połączenie przerwane ({e}) - ponowienie za {delay:.1f} s")
+            except Exception:
+                # stop() zamyka połączenie w trakcie odczytu - http.client zgłasza wtedy różne wyjątki
+                if not self.running:
+                    break
+                raise
+            finally:
+                self._close()
+
+            if self.running:
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _stream_once(self):
+        """Otwiera strumień i przekazuje zdarzenia. Zwraca True, jeśli odebrano jakiekolwiek zdarzenie."""
+        self._connection = open_connection(self.base_url, self.timeout)
+        self._connection.request("GET", self.path, headers=auth_headers(self.token, "application/x-ndjson"))
+        response = self._connection.getresponse()
+        if response.status >= 400:
+            raise read_error(response)
+        self.connects += 1
+        if self.connects > 1:
+            self._reconnects_metric.inc()
+
+        received = False
+        while self.running:
+            line = response.readline()
+            if not line:
+                break  # Serwer zamknął strumień
+            line = line.strip()
+            if not line:
+                continue  # Pusta linia podtrzymująca połączenie
+            try:
+                event = json.loads(line)
+            except ValueError:
+                print(f"{self.name}: nieprawidłowa linia strumienia: {line[:80]!r}")
+                continue
+            received = True
+            self.events += 1
+            self._events_metric.inc()
+            started = metrics.start()
+            self.on_event(event)
+            self._event_seconds.observe_since(started)
+        return received
+
+    def stop(self):
+        """Zatrzymuje strumień (przerywa także oczekujący odczyt)."""
+        self.running = False
+        self._stopped.set()
+        self._close()
+
+    def _close(self):
+        connection = self._connection
+        self._connection = None
+        if connection:
+            try:
+                if connection.sock:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
@@ -1,11 +1,15 @@
 from chess_server import ChessServer
 from lichess_client import LichessClient
+from lichess_hub import LichessHub
 from chess_move_handler import ChessMoveHandler
-from config import LICHESS_API_TOKEN, COLOR_GREEN
+from config import LICHESS_API_TOKEN, BOARD_COUNT, COLOR_GREEN, METRICS_ENABLED
+from metrics import MetricsServer
 import threading
 import time
 
 # Obiekty globalne
+metrics_server = None
+lichess_hub = None
 lichess_client = None
 chess_server = None
 move_handler = None
@@ -41,6 +45,20 @@ def handle_my_turn():
         move_handler.set_player_turn(True)
 
 
+def handle_moves(moves):
+    """Funkcja wywoływana przy każdej zmianie listy ruchów partii."""
+    global move_handler
+    if move_handler:
+        move_handler.sync_moves(moves)
+
+
+def handle_move_failed(move):
+    """Funkcja wywoływana, gdy ruchu gracza nie udało się wysłać do Lichess."""
+    global move_handler
+    if move_handler:
+        move_handler.handle_move_failed(move)
+
+
 def handle_reed_changes(changes):
     """Funkcja wywoływana, gdy zmienia się stan przełączników Reed."""
     global move_handler
@@ -55,8 +73,8 @@ def on_board_ready():
     print("\n=== SZACHOWNICA GOTOWA ===")
     print("Wszystkie figury są ustawione w pozycji startowej.\n")
 
-    # Pobierz ID partii od użytkownika
-    game_id = input("Podaj ID partii Lichess: ")
+    # Pobierz ID partii od użytkownika (pusty = pierwsza rozpoczęta partia konta)
+    game_id = input("Podaj ID partii Lichess (Enter = następna rozpoczęta partia): ").strip() or None
 
     # Włącz tryb gry w serwerze szachownicy
     chess_server.set_game_mode(True)
@@ -65,7 +83,10 @@ def on_board_ready():
     lichess_client = LichessClient(
         api_token=LICHESS_API_TOKEN,
         on_opponent_move=handle_opponent_move,
-        on_my_turn=handle_my_turn
+        on_my_turn=handle_my_turn,
+        on_moves=handle_moves,
+        on_move_failed=handle_move_failed,
+        hub=lichess_hub
     )
 
     # Inicjalizacja obsługi ruchów
@@ -78,20 +99,27 @@ def on_board_ready():
 def main():
     print("=== SERWER SZACHOWNICY ===")
 
+    # Lokalny endpoint metryk (Prometheus)
+    global chess_server, lichess_hub, metrics_server
+    if METRICS_ENABLED:
+        try:
+            metrics_server = MetricsServer().start()
+        except OSError as e:
+            print(f"Nie można uruchomić serwera metryk: {e}")
+
+    # Wspólne połączenie z Lichess (konto i strumień zdarzeń) - tylko dla wielu szachownic jednego konta
+    if LICHESS_API_TOKEN and BOARD_COUNT > 1:
+        lichess_hub = LichessHub(LICHESS_API_TOKEN).start()
+        if not lichess_hub.running:
+            # Konta nie udało się pobrać - klienci łączą się z Lichess samodzielnie
+            lichess_hub = None
+
     # Inicjalizacja i uruchomienie serwera
-    global chess_server
     chess_server = ChessServer(
         on_board_ready=on_board_ready,
         on_reed_change=handle_reed_changes
     )
 
-    # Dodaj referencje do mapowań
-    from config import MAPPING, LED_TO_CHESS, CHESS_TO_LED, BUFFER_SIZE
-    chess_server.MAPPING = MAPPING
-    chess_server.LED_TO_CHESS = LED_TO_CHESS
-    chess_server.CHESS_TO_LED = CHESS_TO_LED
-    chess_server.BUFFER_SIZE = BUFFER_SIZE
-
     # Uruchom serwer
     chess_server.start()
 
@@ -110,6 +138,10 @@ def main():
         if move_handler:
             move_handler.stop()
         chess_server.stop()
+        if lichess_hub:
+            lichess_hub.stop()
+        if metrics_server:
+            metrics_server.stop()
 
 
 if __name__ == "__main__":
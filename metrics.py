@@ -0,0 +1,263 @@
+# metrics.py
+"""
+Lekkie liczniki i histogramy opóźnień udostępniane w formacie tekstowym Prometheus.
+
+Histogramy mają stałe przedziały, więc obserwacja to wyszukanie przedziału
+i kilka dodawań. Pomiar etapu wygląda tak:
+
+    started = metrics.start()
+    ...
+    STAGE.observe_since(started)
+
+Po wyłączeniu metryk (config.METRICS_ENABLED = False lub set_enabled(False))
+start() zwraca 0 bez odczytu zegara, a observe_since() i inc() wracają od razu.
+MetricsServer udostępnia wszystkie metryki pod http://METRICS_HOST:METRICS_PORT/metrics.
+"""
+import abc
+import bisect
+import http.server
+import threading
+import time
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+enabled = METRICS_ENABLED
+
+# Przedziały histogramów opóźnień (sekundy): od 50 µs do 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def set_enabled(flag):
+    """Włącza lub wyłącza zbieranie metryk (także w trakcie działania)."""
+    global enabled
+    enabled = flag
+
+
+def start():
+    """Początek pomiaru etapu - czas monotoniczny lub 0, gdy metryki są wyłączone."""
+    return time.perf_counter() if enabled else 0.0
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if enabled:
+            with self._lock:
+                self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if not enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """Zwraca spójną kopię (przedziały, suma, liczba obserwacji)."""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def observe_since(self, started):
+        """Zapisuje czas od started (wynik start()). Pomiar rozpoczęty przy wyłączonych metrykach jest pomijany."""
+        if started and enabled:
+            self.observe(time.perf_counter() - started)
+
+
+class _Family(abc.ABC):
+    """Metryka z etykietami - kolejne kombinacje wartości etykiet tworzą osobne serie."""
+
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Zwraca serię dla podanych wartości etykiet (warto ją zapamiętać poza gorącą ścieżką)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Tworzy serię dla nowej kombinacji wartości etykiet."""
+
+    @abc.abstractmethod
+    def _render_child(self, values, child):
+        """Zwraca linie tekstu Prometheus dla jednej serii."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Zwiększa serię bez etykiet."""
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Zapisuje obserwację w serii bez etykiet."""
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        counts, total, observations = child.snapshot()
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            le = _format_labels(self.label_names, values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        cumulative += counts[-1]
+        le = _format_labels(self.label_names, values, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {observations}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self):
+        """Zwraca wszystkie metryki w formacie tekstowym Prometheus."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, label_names=()):
+    """Rejestruje (lub zwraca istniejący) licznik w rejestrze globalnym."""
+    return REGISTRY.counter(name, help_text, label_names)
+
+
+def histogram(name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+    """Rejestruje (lub zwraca istniejący) histogram w rejestrze globalnym."""
+    return REGISTRY.histogram(name, help_text, label_names, buckets)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, registry=REGISTRY):
+        """Lokalny serwer HTTP z metrykami pod /metrics (port 0 = wolny port)."""
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Uruchamia serwer w osobnym wątku."""
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics")
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"Metryki dostępne pod http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,70 @@
+# move_log.py
+"""
+Lista ruchów partii uzupełniana przyrostowo z zapisu "e2e4 e7e5 ..." przesyłanego przez Lichess.
+
+Każde zdarzenie stanu partii zawiera pełny zapis ruchów. MoveLog pamięta długość już
+przetworzonego prefiksu i dzieli tylko nowy fragment, więc koszt zdarzenia zależy od
+liczby nowych ruchów, a nie od długości partii. Tylko zapis, który nie urósł (np. cofnięcie
+i ponowienie ruchu), porównywany jest w całości.
+"""
+
+
+class MoveLog:
+    def __init__(self):
+        """Pusta lista ruchów."""
+        self.moves = []
+        self._text = ""        # Ostatnio przetworzony zapis ruchów
+        self._text_length = 0  # i jego długość
+        self.resets = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def side_to_move(self):
+        """Kolor strony na ruchu ("white" / "black") - wynika z parzystości liczby ruchów."""
+        return "white" if len(self.moves) % 2 == 0 else "black"
+
+    def is_turn(self, color):
+        """Sprawdza, czy na ruchu jest podany kolor."""
+        return color is not None and self.side_to_move == color
+
+    def update(self, moves_str):
+        """
+        Uwzględnia pełny zapis ruchów ze zdarzenia stanu partii.
+
+        Zwraca (start, nowe_ruchy): indeks pierwszego nowego ruchu i listę nowych ruchów.
+        start mniejszy niż poprzednia długość oznacza, że historia została odtworzona
+        od początku (np. po cofnięciu ruchu).
+        """
+        moves_str = moves_str or ""
+        if not self._continues(moves_str):
+            self.moves = []
+            self._text = ""
+            self._text_length = 0
+            self.resets += 1
+
+        start = len(self.moves)
+        new_moves = moves_str[self._text_length:].split()
+        self.moves.extend(new_moves)
+        self._text = moves_str
+        self._text_length = len(moves_str)
+        return start, new_moves
+
+    def _continues(self, moves_str):
+        """
+        Sprawdza, czy zapis jest kontynuacją przetworzonego prefiksu.
+
+        Gdy zapis urósł, w czasie stałym porównywany jest ostatni ruch. Zapis tej samej
+        długości porównywany jest w całości - cofnięcie ruchu i ponowienie innego może
+        dać zapis tej samej długości z tym samym ostatnim ruchem.
+        """
+        if not self.moves:
+            return True
+        length = self._text_length
+        if len(moves_str) <= length:
+            return moves_str == self._text
+        last = self.moves[-1]
+        if moves_str[length - len(last):length] != last:
+            return False
+        return moves_str[length] == " "
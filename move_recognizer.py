@@ -0,0 +1,218 @@
+# move_recognizer.py
+"""
+Rozpoznawanie ruchów wykonanych na fizycznej szachownicy.
+
+Zmiany przełączników Reed są zbierane, aż szachownica przestanie się zmieniać
+na MOVE_SETTLE_DELAY sekund. Wtedy różnica zajętości względem stanu początkowego
+(XOR dwóch bitboardów) jest wyszukiwana w tablicy sygnatur ruchów legalnych:
+
+- zwykły ruch:      {z, na}
+- bicie:            {z} (pole docelowe było i jest zajęte - musi zostać dotknięte)
+- bicie w przelocie: {z, na, pole zbitego piona}
+- roszada:          {król z, król na, wieża z, wieża na}
+- promocja:         jak zwykły ruch lub bicie; domyślnie hetman
+
+Figura postawiona na pustym polu, którego nie obejmuje żadna sygnatura (np. pole, na które
+nie może wejść żadna figura), jest oceniana od razu - bez czekania na okno stabilizacji.
+"""
+import collections
+import threading
+
+from config import MOVE_SETTLE_DELAY, MOVE_CACHE_SIZE, SQUARE_NAMES, square_index
+from chess_position import QUEEN, iter_squares, move_to_uci
+
+# Wyniki rozpoznawania
+RESULT_NONE = "none"          # Szachownica wróciła do stanu początkowego
+RESULT_PENDING = "pending"    # Ruch w trakcie (figury tylko podniesione)
+RESULT_MOVE = "move"          # Rozpoznano ruch
+RESULT_ILLEGAL = "illegal"    # Układ figur nie odpowiada żadnemu ruchowi legalnemu
+
+
+def move_signatures(position, moves=None):
+    """
+    Zwraca słownik {sygnatura: [ruchy]} dla ruchów legalnych pozycji
+    (lub tylko dla podanych ruchów). Sygnatura to XOR zajętości przed i po ruchu.
+    """
+    before = position.occupancy
+    table = {}
+    for move in (position.legal_moves() if moves is None else moves):
+        child = position.copy()
+        child.push(move)
+        table.setdefault(before ^ child.occupancy, []).append(move)
+    return table
+
+
+def squares_to_names(bitboard):
+    """Zamienia bitboard na listę nazw pól."""
+    return [SQUARE_NAMES[square] for square in iter_squares(bitboard)]
+
+
+class SignatureCache:
+    """
+    Ograniczona pamięć podręczna LRU: skrót Zobrista pozycji -> (ruchy legalne, sygnatury).
+
+    Może być współdzielona przez wiele szachownic (dostęp chroniony blokadą).
+    """
+
+    def __init__(self, maxsize=MOVE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, position):
+        """Zwraca (ruchy legalne, słownik sygnatur) dla pozycji, licząc je tylko przy braku w pamięci."""
+        key = position.hash
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        moves = position.legal_moves()
+        entry = (moves, move_signatures(position, moves))
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def legal_moves(self, position):
+        """Zwraca listę ruchów legalnych pozycji."""
+        return self.get(position)[0]
+
+    def signatures(self, position):
+        """Zwraca słownik {sygnatura: [ruchy]} pozycji."""
+        return self.get(position)[1]
+
+    def clear(self):
+        """Czyści pamięć i liczniki."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def metrics(self):
+        """Zwraca słownik z licznikami trafień i chybień."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class MoveRecognizer:
+    def __init__(self, scheduler, on_result, occupancy=0, settle_delay=MOVE_SETTLE_DELAY):
+        """
+        Inicjalizacja rozpoznawania ruchów.
+
+        on_result(result, uci, diff) wywoływane jest w wątku planisty po ustabilizowaniu
+        się szachownicy; uci to rozpoznany ruch (lub None), diff to bitboard zmienionych pól.
+        """
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.settle_delay = settle_delay
+
+        # Fizyczny stan szachownicy śledzony ze zmian Reed
+        self.occupancy = occupancy
+
+        self.armed = False
+        self.baseline = occupancy
+        self.touched = 0
+        self.signatures = {}
+        self._timer = None
+
+    @property
+    def diff(self):
+        """Bitboard pól, których stan różni się od stanu początkowego."""
+        return self.baseline ^ self.occupancy
+
+    def arm(self, position, moves=None, signatures=None):
+        """
+        Rozpoczyna rozpoznawanie ruchu w podanej pozycji od bieżącego stanu szachownicy.
+
+        moves ogranicza rozpoznawanie do podanych ruchów (np. oczekiwany ruch przeciwnika).
+        """
+        self.cancel()
+        self.signatures = signatures if signatures is not None else move_signatures(position, moves)
+        self.baseline = self.occupancy
+        self.touched = 0
+        self.armed = True
+
+    def resume(self):
+        """Wznawia rozpoznawanie bez zmiany stanu początkowego (np. po odrzuceniu wysłanego ruchu)."""
+        self.armed = True
+
+    def disarm(self):
+        """Kończy rozpoznawanie - zmiany są dalej śledzone, ale nie są oceniane."""
+        self.cancel()
+        self.armed = False
+
+    def cancel(self):
+        """Anuluje oczekującą ocenę ruchu."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def feed(self, changes):
+        """Uwzględnia zmiany Reed i odkłada ocenę ruchu o okno stabilizacji."""
+        for change in changes:
+            mask = 1 << square_index(change["position"])
+            if change["to_state"]:
+                self.occupancy |= mask
+            else:
+                self.occupancy &= ~mask
+            self.touched |= mask
+        if self.occupancy == self.baseline:
+            # Figury wróciły na miejsca (np. poprawiona figura) - nie są już kandydatami na pole docelowe
+            self.touched = 0
+
+        if self.armed:
+            self.cancel()
+            # Ustawienie, którego nie dokończy żaden ruch legalny, oceniane jest od razu (po bieżącym zadaniu planisty)
+            delay = 0 if self.is_placement_illegal() else self.settle_delay
+            self._timer = self.scheduler.call_later(delay, self._settle)
+
+    def is_placement_illegal(self):
+        """Sprawdza, czy figury postawione na pustych polach nie pasują do żadnej sygnatury ruchu legalnego."""
+        placed = self.occupancy & ~self.baseline
+        return placed != 0 and not any(placed & ~signature == 0 for signature in self.signatures)
+
+    def recognize(self):
+        """Zwraca (wynik, ruch_uci) dla bieżącego stanu szachownicy."""
+        diff = self.diff
+        if not diff:
+            return RESULT_NONE, None
+
+        # Pole docelowe musi zostać dotknięte (przy biciu nie zmienia stanu)
+        candidates = [move for move in self.signatures.get(diff, ()) if self.touched >> move[1] & 1]
+        if len(candidates) > 1:
+            # Promocja - domyślnie hetman
+            candidates = [move for move in candidates if move[2] in (None, QUEEN)]
+        if len(candidates) == 1:
+            return RESULT_MOVE, move_to_uci(candidates[0])
+
+        # Figury tylko podniesione - ruch jeszcze trwa
+        if not candidates and (self.occupancy & ~self.baseline) == 0:
+            return RESULT_PENDING, None
+        return RESULT_ILLEGAL, None
+
+    def _settle(self):
+        """Ocena ruchu po ustabilizowaniu się szachownicy."""
+        self._timer = None
+        if not self.armed:
+            return
+        result, uci = self.recognize()
+        self.on_result(result, uci, self.diff)
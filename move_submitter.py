@@ -0,0 +1,281 @@
+# move_submitter.py
+"""
+Wysyłanie ruchów do Lichess przez jedno utrzymywane połączenie HTTP(S).
+
+Ruchy trafiają do kolejki i są wysyłane przez osobny wątek, więc planista obsługi
+szachownicy nigdy nie czeka na sieć. Błędy przejściowe (zerwane połączenie, 5xx)
+są ponawiane z rosnącym opóźnieniem, a po przekroczeniu limitu zapytań (429) kolejka
+wstrzymywana jest na RATE_LIMIT_DELAY sekund. Przed każdym ponowieniem sprawdzane jest, czy ruch
+nie pojawił się już w strumieniu partii (poprzednia próba mogła dojść mimo błędu).
+
+Czas każdego ruchu mierzony jest etapami: oczekiwanie w kolejce, zapytanie HTTP
+i od wysłania zapytania do potwierdzenia w strumieniu partii.
+"""
+import collections
+import http.client
+import queue
+import threading
+import time
+
+from config import (LICHESS_API_TOKEN, LICHESS_API_URL, RATE_LIMIT_DELAY, SUBMIT_MAX_ATTEMPTS, SUBMIT_RETRY_DELAY,
+                    SUBMIT_RETRY_MAX_DELAY, SUBMIT_TIMEOUT)
+from lichess_stream import LichessApiError, open_connection, auth_headers, read_error
+import metrics
+
+_STOP = object()
+
+# Stany zakończenia wysyłki
+SUBMIT_OK = "ok"
+SUBMIT_ALREADY_PLAYED = "already_played"
+SUBMIT_FAILED = "failed"
+
+SUBMIT_SECONDS = metrics.histogram("lichess_submit_seconds", "Czas etapów wysyłania ruchu do Lichess", ("stage",))
+SUBMIT_QUEUE_WAIT = SUBMIT_SECONDS.labels("queue_wait")
+SUBMIT_REQUEST = SUBMIT_SECONDS.labels("request")
+SUBMIT_STREAM_ACK = SUBMIT_SECONDS.labels("stream_ack")
+SUBMIT_TO_ACK = SUBMIT_SECONDS.labels("submit_to_ack")
+SUBMIT_RESULTS = metrics.counter("lichess_submit_total", "Ruchy wysłane do Lichess według wyniku", ("result",))
+SUBMIT_RETRIES = metrics.counter("lichess_submit_retries_total", "Ponowienia wysłania ruchu")
+
+
+class PendingMove:
+    __slots__ = ("uci", "ply", "queued_at", "sent_at", "answered_at", "attempts")
+
+    def __init__(self, uci, ply):
+        self.uci = uci
+        self.ply = ply
+        self.queued_at = time.perf_counter()
+        self.sent_at = None
+        self.answered_at = None
+        self.attempts = 0
+
+
+class MoveSubmitter:
+    def __init__(self, game_id, moves_provider, on_success=None, on_failure=None, token=LICHESS_API_TOKEN,
+                 base_url=LICHESS_API_URL, max_attempts=SUBMIT_MAX_ATTEMPTS, retry_delay=SUBMIT_RETRY_DELAY,
+                 max_retry_delay=SUBMIT_RETRY_MAX_DELAY, timeout=SUBMIT_TIMEOUT, persistent=True,
+                 rate_limit_delay=RATE_LIMIT_DELAY):
+        """
+        Inicjalizacja wysyłania ruchów partii game_id.
+
+        moves_provider() zwraca aktualną listę ruchów partii (UCI) ze strumienia - służy
+        do sprawdzenia, czy ruch już został przyjęty. on_success(uci) i on_failure(uci, error)
+        wywoływane są w wątku wysyłającym po przyjęciu lub ostatecznym odrzuceniu ruchu.
+        persistent=False otwiera nowe połączenie dla każdego zapytania (do porównań).
+        rate_limit_delay to przerwa w wysyłaniu po odpowiedzi 429 (s).
+        """
+        self.game_id = game_id
+        self.moves_provider = moves_provider
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.token = token
+        self.base_url = base_url
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.timeout = timeout
+        self.persistent = persistent
+        self.rate_limit_delay = rate_limit_delay
+
+        self._queue = queue.Queue()
+        self._connection = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._awaiting_ack = {}  # ply -> PendingMove
+
+        # Statystyki (sekundy)
+        self.submitted = 0
+        self.failed = 0
+        self.retries = 0
+        self.already_played = 0
+        self.queue_wait = collections.deque(maxlen=1000)
+        self.request_time = collections.deque(maxlen=1000)
+        self.ack_time = collections.deque(maxlen=1000)
+        self.submit_to_ack = collections.deque(maxlen=1000)
+
+    def start(self):
+        """Uruchamia wątek wysyłający i nawiązuje połączenie z wyprzedzeniem."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f"submit-{self.game_id}")
+        self._thread.daemon = True
+        self._thread.start()
+        self._queue.put(self._warm_up)
+        return self
+
+    def stop(self, timeout=1.0):
+        """Zatrzymuje wysyłanie (ruchy jeszcze w kolejce są porzucane)."""
+        self._stopped.set()
+        self._queue.put(_STOP)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._close()
+
+    def submit(self, uci, ply=None):
+        """
+        Dodaje ruch do wysłania i wraca natychmiast.
+
+        ply to indeks ruchu w partii (domyślnie długość bieżącej listy ruchów).
+        """
+        if ply is None:
+            ply = len(self.moves_provider())
+        pending = PendingMove(uci, ply)
+        with self._lock:
+            self._awaiting_ack[ply] = pending
+        self._queue.put(pending)
+        return pending
+
+    def notify_moves(self, moves):
+        """Uwzględnia listę ruchów ze strumienia partii - potwierdza wysłane ruchy."""
+        now = time.perf_counter()
+        with self._lock:
+            for ply in [ply for ply in self._awaiting_ack if ply < len(moves)]:
+                pending = self._awaiting_ack.pop(ply)
+                if moves[ply] != pending.uci:
+                    continue
+                self.submit_to_ack.append(now - pending.queued_at)
+                SUBMIT_TO_ACK.observe(now - pending.queued_at)
+                if pending.sent_at is not None:
+                    self.ack_time.append(now - pending.sent_at)
+                    SUBMIT_STREAM_ACK.observe(now - pending.sent_at)
+
+    def metrics(self):
+        """Zwraca słownik ze statystykami wysyłania (czasy w milisekundach)."""
+        def stats(values):
+            ordered = sorted(values)
+            if not ordered:
+                return {"count": 0}
+            return {
+                "count": len(ordered),
+                "p50_ms": ordered[len(ordered) // 2] * 1000.0,
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000.0,
+                "max_ms": ordered[-1] * 1000.0,
+            }
+
+        return {
+            "submitted": self.submitted,
+            "failed": self.failed,
+            "retries": self.retries,
+            "already_played": self.already_played,
+            "queue_wait": stats(self.queue_wait),
+            "request": stats(self.request_time),
+            "stream_ack": stats(self.ack_time),
+            "submit_to_ack": stats(self.submit_to_ack),
+        }
+
+    def _run(self):
+        """Pętla wątku wysyłającego."""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if callable(item):
+                item()
+                continue
+            self._submit(item)
+
+    def _warm_up(self):
+        """Nawiązuje połączenie (TCP i TLS), zanim pojawi się pierwszy ruch."""
+        try:
+            self._connect().connect()
+        except OSError as e:
+            print(f"Nie można nawiązać połączenia z Lichess: {e}")
+            self._close()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = open_connection(self.base_url, self.timeout)
+        return self._connection
+
+    def _close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _already_played(self, pending):
+        """Sprawdza w liście ruchów ze strumienia, czy ruch został już przyjęty."""
+        moves = self.moves_provider()
+        return len(moves) > pending.ply and moves[pending.ply] == pending.uci
+
+    def _submit(self, pending):
+        """Wysyła ruch, ponawiając próby przy błędach przejściowych."""
+        self.queue_wait.append(time.perf_counter() - pending.queued_at)
+        SUBMIT_QUEUE_WAIT.observe(self.queue_wait[-1])
+        delay = self.retry_delay
+        error = None
+
+        while pending.attempts < self.max_attempts and not self._stopped.is_set():
+            if pending.attempts and self._already_played(pending):
+                return self._accepted(pending, SUBMIT_ALREADY_PLAYED)
+
+            pending.attempts += 1
+            reused = self._connection is not None
+            try:
+                self._post_move(pending)
+                return self._accepted(pending, SUBMIT_OK)
+            except LichessApiError as e:
+                error = e
+                if e.status == 429:
+                    # Limit zapytań - wstrzymaj całą kolejkę zamiast szybkich ponowień
+                    self.retries += 1
+                    SUBMIT_RETRIES.inc()
+                    print(f"Przekroczono limit zapytań przy ruchu {pending.uci} - "
+                          f"wstrzymuję wysyłanie na {self.rate_limit_delay:.0f} s")
+                    self._stopped.wait(self.rate_limit_delay)
+                    continue
+                if e.status < 500:
+                    # Odrzucenie (np. nie nasza tura) - mógł to spowodować już przyjęty ruch
+                    if self._already_played(pending):
+                        return self._accepted(pending, SUBMIT_ALREADY_PLAYED)
+                    break
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                self._close()
+                if reused:
+                    # Serwer zamknął bezczynne połączenie - ponów od razu na nowym
+                    self.retries += 1
+                    SUBMIT_RETRIES.inc()
+                    continue
+
+            self.retries += 1
+            SUBMIT_RETRIES.inc()
+            print(f"Błąd wysyłania ruchu {pending.uci} ({error}) - ponowienie za {delay:.2f} s")
+            self._stopped.wait(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+        self.failed += 1
+        SUBMIT_RESULTS.labels(SUBMIT_FAILED).inc()
+        with self._lock:
+            self._awaiting_ack.pop(pending.ply, None)
+        print(f"Nie udało się wysłać ruchu {pending.uci}: {error}")
+        if self.on_failure:
+            self.on_failure(pending.uci, error)
+        return SUBMIT_FAILED
+
+    def _accepted(self, pending, result):
+        """Odnotowuje przyjęcie ruchu przez Lichess."""
+        if result == SUBMIT_ALREADY_PLAYED:
+            self.already_played += 1
+        else:
+            self.submitted += 1
+        SUBMIT_RESULTS.labels(result).inc()
+        if self.on_success:
+            self.on_success(pending.uci)
+        return result
+
+    def _post_move(self, pending):
+        """Wysyła jedno zapytanie z ruchem."""
+        connection = self._connect()
+        pending.sent_at = time.perf_counter()
+        headers = auth_headers(self.token)
+        headers["Content-Length"] = "0"
+        connection.request("POST", f"/api/board/game/{self.game_id}/move/{pending.uci}", headers=headers)
+        response = connection.getresponse()
+        if response.status >= 400:
+            raise read_error(response)
+        response.read()
+        pending.answered_at = time.perf_counter()
+        self.request_time.append(pending.answered_at - pending.sent_at)
+        SUBMIT_REQUEST.observe(self.request_time[-1])
+        if not self.persistent:
+            self._close()
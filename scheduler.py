@@ -0,0 +1,152 @@
+# scheduler.py
+"""
+Planista zadań z jednym wątkiem i kolejką priorytetową terminów.
+
+Zastępuje osobne wątki threading.Timer: wszystkie terminy i zdarzenia
+przekazane przez call_soon wykonywane są po kolei w jednym wątku,
+więc stan obiektów korzystających z planisty nie wymaga dodatkowych blokad.
+Z zegarem symulowanym (clock.SimulatedClock) planista nie ma wątku - zadania
+wykonuje zegar przy przesuwaniu czasu.
+"""
+import heapq
+import itertools
+import threading
+
+from clock import SYSTEM_CLOCK
+
+
+class TimerHandle:
+    """Uchwyt zaplanowanego wywołania. Anulowanie jest O(1) (leniwe usuwanie z kopca)."""
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Anuluje wywołanie, jeśli jeszcze się nie wykonało."""
+        self.cancelled = True
+
+
+class TimerScheduler:
+    def __init__(self, name="scheduler", time_func=None, clock=None):
+        """
+        Inicjalizacja planisty.
+
+        clock to źródło czasu (domyślnie clock.SYSTEM_CLOCK), time_func pozwala
+        podać samą funkcję zwracającą bieżący czas w sekundach.
+        """
+        self.name = name
+        self.clock = clock or SYSTEM_CLOCK
+        self.time_func = time_func or self.clock.now
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Uruchamia wątek planisty."""
+        with self._condition:
+            if self._running:
+                return self._thread
+            self._running = True
+        if self.clock.simulated:
+            # Zadania wykonuje zegar symulowany w advance()
+            self.clock.attach(self)
+            return None
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=1.0):
+        """Zatrzymuje wątek planisty. Niewykonane wywołania są porzucane."""
+        with self._condition:
+            self._running = False
+            self._heap.clear()
+            self._condition.notify()
+        if self.clock.simulated:
+            self.clock.detach(self)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def call_later(self, delay, callback, *args):
+        """Planuje wywołanie callback(*args) po delay sekundach. Zwraca TimerHandle."""
+        handle = TimerHandle(self.time_func() + delay, callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, (handle.deadline, next(self._counter), handle))
+            # Obudź wątek tylko, gdy nowy termin jest najwcześniejszy
+            if self._heap[0][2] is handle:
+                self._condition.notify()
+        return handle
+
+    def call_soon(self, callback, *args):
+        """Planuje wywołanie callback(*args) najszybciej, jak to możliwe (w kolejności zgłoszeń)."""
+        return self.call_later(0, callback, *args)
+
+    def in_scheduler_thread(self):
+        """Sprawdza, czy kod wykonuje się w wątku planisty."""
+        return threading.current_thread() is self._thread
+
+    @property
+    def pending(self):
+        """Liczba zaplanowanych (nieanulowanych) wywołań."""
+        with self._condition:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+    def next_deadline(self):
+        """Termin najbliższego zadania lub None."""
+        with self._condition:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now):
+        """Wykonuje w bieżącym wątku wszystkie zadania o terminie nie późniejszym niż now."""
+        while True:
+            with self._condition:
+                if not self._running or not self._heap or self._heap[0][0] > now:
+                    return
+                handle = heapq.heappop(self._heap)[2]
+            if not handle.cancelled:
+                self._execute(handle)
+
+    def _next_due(self):
+        """Zwraca następne wywołanie do wykonania, czekając na jego termin."""
+        with self._condition:
+            while self._running:
+                # Pomiń anulowane wpisy
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                delay = self._heap[0][0] - self.time_func()
+                if delay > 0:
+                    self._condition.wait(timeout=delay)
+                    continue
+
+                return heapq.heappop(self._heap)[2]
+        return None
+
+    def _run(self):
+        """Pętla wątku planisty."""
+        while True:
+            handle = self._next_due()
+            if handle is None:
+                break
+            if handle.cancelled:
+                continue
+            self._execute(handle)
+
+    def _execute(self, handle):
+        try:
+            handle.callback(*handle.args)
+        except Exception as e:
+            print(f"Błąd w zadaniu planisty {self.name}: {e}")
@@ -0,0 +1,6 @@
+# conftest.py
+"""Moduły projektu leżą w katalogu głównym - testy importują je bezpośrednio."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
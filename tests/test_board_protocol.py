@@ -0,0 +1,89 @@
+import json
+
+from board_protocol import LedDeltaEncoder, LedDeltaDecoder, MAX_UNACKED_LED_FRAMES, led_table
+from chess_server import ChessServer
+from clock import SimulatedClock
+from config import COLOR_RED, COLOR_GREEN, COLOR_YELLOW, WIRING
+from event_bus import EventBus
+
+STATES = [
+    [{"led": 1, "color": COLOR_RED}],
+    [{"led": 1, "color": COLOR_RED}, {"led": 9, "color": COLOR_GREEN, "blink": True}],
+    [{"led": 9, "color": COLOR_YELLOW}],
+    [],
+    [{"led": 63, "color": COLOR_GREEN}],
+]
+
+
+def _send(encoder, decoder, leds, status="waiting"):
+    """Koduje stan, stosuje go po stronie szachownicy i potwierdza ramkę. Zwraca ramkę."""
+    message = encoder.encode(leds, status)
+    applied, gap = decoder.apply(message)
+    encoder.acknowledge(message["seq"], gap)
+    return message
+
+
+def test_round_trip():
+    encoder, decoder = LedDeltaEncoder(), LedDeltaDecoder()
+    for i, leds in enumerate(STATES):
+        message = _send(encoder, decoder, leds, status=f"status-{i % 2}")
+        assert ("key" in message) == (i == 0)
+        assert decoder.table == led_table(leds)
+        assert decoder.status == f"status-{i % 2}"
+    assert encoder.keyframes_sent == 1
+
+
+def test_lost_frame_is_recovered_with_keyframe():
+    encoder, decoder = LedDeltaEncoder(), LedDeltaDecoder()
+    _send(encoder, decoder, STATES[0])
+
+    # Ramka zgubiona po drodze - następna delta ma nieznaną bazę
+    encoder.encode(STATES[1], "waiting")
+    message = encoder.encode(STATES[2], "waiting")
+    assert decoder.apply(message) == (False, True)
+    encoder.acknowledge(message["seq"], gap=True)
+    assert encoder.need_keyframe
+
+    message = _send(encoder, decoder, STATES[3])
+    assert message["key"] == 1
+    assert decoder.table == led_table(STATES[3])
+
+
+def test_sequence_wraps_around():
+    encoder, decoder = LedDeltaEncoder(), LedDeltaDecoder()
+    encoder.seq = encoder.acked_seq = 0xFFFD
+    for leds in STATES:
+        message = _send(encoder, decoder, leds)
+        assert not encoder.need_keyframe
+        assert decoder.table == led_table(leds)
+    assert encoder.seq == (0xFFFD + len(STATES)) & 0xFFFF
+    assert encoder.keyframes_sent == 1
+
+
+def test_keyframe_after_too_many_unacknowledged_frames():
+    encoder, decoder = LedDeltaEncoder(), LedDeltaDecoder()
+    _send(encoder, decoder, STATES[0])
+    for i in range(MAX_UNACKED_LED_FRAMES):
+        message = encoder.encode(STATES[i % len(STATES)], "waiting")
+        assert "key" not in message
+        decoder.apply(message)
+    message = encoder.encode(STATES[1], "waiting")
+    assert message["key"] == 1
+    assert encoder.keyframes_sent == 2
+
+
+def test_session_skips_empty_delta():
+    server = ChessServer(event_bus=EventBus(inline=True), clock=SimulatedClock())
+    session = server.session
+    sent = []
+    session.attach(lambda data: sent.append(json.loads(data)))
+    session.handle_message({"type": "hello", "protocols": ["json"], "features": ["led_delta"]})
+    session.occupancy = 0
+    session._push_state()
+    assert sent[-1]["key"] == 1
+
+    # Dioda "off" na pustym polu zmienia listę LED, ale nie stan widoczny dla ESP32
+    frames = len(sent)
+    session.custom_leds.append({"led": WIRING.led_for_position("e4"), "color": "off"})
+    session._push_state()
+    assert len(sent) == frames
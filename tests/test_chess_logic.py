@@ -0,0 +1,38 @@
+import chess_logic
+from board_protocol import bitboard_to_reed
+from chess_logic import START_RANKS_MASK, process_data, is_board_ready
+from config import COLOR_RED, COLOR_YELLOW, COLOR_ORANGE, WIRING, square_index
+
+
+def _partial(reed_data, *positions):
+    """Słownik Reed zawierający tylko przełączniki podanych pól."""
+    partial = {}
+    for position in positions:
+        mcp_name, port_name, pin_name = WIRING.square_to_pin[square_index(position)]
+        partial.setdefault(mcp_name, {}).setdefault(port_name, {})[pin_name] = reed_data[mcp_name][port_name][pin_name]
+    return partial
+
+
+def test_board_ready_checks_only_reported_squares():
+    empty = bitboard_to_reed(0)
+    start = bitboard_to_reed(START_RANKS_MASK)
+    assert is_board_ready(start)
+    assert not is_board_ready(empty)
+    # Niepełny słownik - pola bez stanu nie są sprawdzane
+    assert is_board_ready({})
+    assert is_board_ready(_partial(empty, "e4", "d5"))
+    assert not is_board_ready(_partial(empty, "e4", "e2"))
+
+
+def test_process_data_lights_only_reported_squares():
+    misplaced = bitboard_to_reed(START_RANKS_MASK | 1 << square_index("e4"))
+    leds = process_data(_partial(misplaced, "e4", "e2", "d4"))
+    assert leds == [{"led": WIRING.led_for_position("e4"), "color": COLOR_RED}]
+
+
+def test_process_data_pulses_without_explicit_pulse():
+    chess_logic._DEFAULT_PULSE.last_change = float("-inf")
+    first = process_data(bitboard_to_reed(0))[0]["color"]
+    chess_logic._DEFAULT_PULSE.last_change = float("-inf")
+    second = process_data(bitboard_to_reed(0))[0]["color"]
+    assert {first, second} == {COLOR_YELLOW, COLOR_ORANGE}
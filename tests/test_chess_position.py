@@ -0,0 +1,58 @@
+import pytest
+
+from chess_position import Position, STARTING_FEN
+
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+POSITION_3 = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+POSITION_4 = "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1"
+
+
+@pytest.mark.parametrize("fen, depth, nodes", [
+    (STARTING_FEN, 3, 8902),
+    (KIWIPETE, 2, 2039),
+    (POSITION_3, 4, 43238),
+    (POSITION_4, 3, 9467),
+])
+def test_perft(fen, depth, nodes):
+    assert Position(fen).perft(depth) == nodes
+
+
+def _positions(fen, depth):
+    """Pozycje osiągalne w depth półruchach (wraz z wyjściową)."""
+    positions = [Position(fen)]
+    frontier = positions
+    for _ in range(depth):
+        children = []
+        for position in frontier:
+            for move in position.legal_moves():
+                child = position.copy()
+                child.push(move)
+                children.append(child)
+        positions.extend(children)
+        frontier = children
+    return positions
+
+
+@pytest.mark.parametrize("fen", [STARTING_FEN, KIWIPETE, POSITION_4])
+def test_san_round_trip(fen):
+    for position in _positions(fen, 1):
+        for move in position.legal_moves():
+            assert position.parse_san(position.san(move)) == move
+
+
+def test_san_disambiguation_and_annotations():
+    position = Position(KIWIPETE)
+    assert position.san(position.parse_san("O-O")) == "O-O"
+    assert position.parse_san("0-0-0") == position.parse_san("O-O-O")
+    assert position.san(position.parse_san("Nxf7")) == "Nxf7"
+    assert position.parse_san("Qxf6+") == position.parse_san("Qxf6")
+    with pytest.raises(ValueError):
+        position.parse_san("Ke3")
+
+
+@pytest.mark.parametrize("fen", [KIWIPETE, POSITION_3, POSITION_4])
+def test_incremental_zobrist_matches_recomputed(fen):
+    # Roszady, bicie w przelocie i promocje zmieniają skrót przyrostowo - wynik musi się zgadzać
+    for position in _positions(fen, 2):
+        assert position.hash == position.zobrist_hash()
+        assert position.hash == Position(position.fen()).hash
@@ -0,0 +1,62 @@
+import json
+import socket
+import time
+
+import pytest
+
+from chess_server import ChessServer
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    server = ChessServer(host="127.0.0.1", port=_free_port(), use_asyncio=True)
+    server.start()
+    deadline = time.time() + 2.0
+    while server._async_server is None and time.time() < deadline:
+        time.sleep(0.01)
+    yield server
+    server.stop()
+
+
+def _hello(server, board=None):
+    """Łączy się z serwerem i przedstawia się ramką hello. Zwraca gniazdo po odpowiedzi serwera."""
+    sock = socket.create_connection((server.host, server.port), timeout=2.0)
+    message = {"type": "hello", "protocols": ["json"]}
+    if board:
+        message["board"] = board
+    sock.sendall(json.dumps(message).encode() + b"\n")
+    reply = sock.makefile("rb").readline()
+    assert json.loads(reply)["type"] == "hello"
+    return sock
+
+
+def test_reconnect_closes_previous_connection(server):
+    first = _hello(server, board="board-1")
+    second = _hello(server, board="board-1")
+    try:
+        # Poprzednie połączenie tej samej szachownicy jest zamykane przez serwer
+        first.settimeout(2.0)
+        assert first.recv(1024) == b""
+        assert server.sessions["board-1"].connections == 2
+        assert server.sessions["board-1"].connected
+    finally:
+        first.close()
+        second.close()
+
+
+def test_boards_without_id_behind_one_address_get_own_sessions(server):
+    first = _hello(server)
+    second = _hello(server)
+    try:
+        ids = [board_id for board_id in server.sessions if board_id != "default"]
+        assert len(ids) == 2
+        assert all(server.sessions[board_id].connected for board_id in ids)
+    finally:
+        first.close()
+        second.close()
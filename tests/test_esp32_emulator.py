@@ -0,0 +1,50 @@
+# test_esp32_emulator.py
+import json
+import socket
+
+import pytest
+
+from esp32_emulator import EmulatedBoard
+
+
+@pytest.fixture
+def board():
+    """Szachownica połączona z serwerem przez parę gniazd (bez _connect)."""
+    board = EmulatedBoard("emu-test", response_timeout=0.5)
+    board.sock, server = socket.socketpair()
+    yield board, server
+    board._close()
+    server.close()
+
+
+def _line(message):
+    return json.dumps(message).encode() + b'\n'
+
+
+def test_push_between_exchanges_is_drained(board):
+    board, server = board
+    server.sendall(_line({"leds": [1], "status": "Czekaj"}))
+    board._exchange("heartbeat")
+    assert board.responses == 1
+
+    # Serwer wypycha diody ruchu przeciwnika między dwiema ramkami szachownicy
+    server.sendall(_line({"leds": [2, 3], "status": "Twoj ruch!"}))
+    board._drain()
+    assert board.pushes == 1
+    assert board.leds == [2, 3]
+    assert board.status == "Twoj ruch!"
+
+    server.sendall(_line({"leds": [4], "status": "Czekaj"}))
+    board._exchange("state_change")
+    assert board.responses == 2
+    assert board.dropped == 0
+    assert board.leds == [4]
+
+
+def test_read_line_with_zero_timeout_reads_waiting_data(board):
+    board, server = board
+    server.sendall(b'{"status": "a"}\n{"status"')
+    assert board._read_line(0) == b'{"status": "a"}'
+    assert board._read_line(0) is None
+    server.sendall(b': "b"}\n')
+    assert board._read_line(0) == b'{"status": "b"}'
@@ -0,0 +1,70 @@
+# test_event_bus.py
+import threading
+import time
+
+from chess_position import Position
+from chess_server import ChessServer
+from event_bus import EventBus
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "Przekroczono czas oczekiwania"
+        time.sleep(0.001)
+
+
+def test_try_publish_does_not_block_on_full_queue():
+    bus = EventBus(workers=1, maxsize=1)
+    bus.start()
+    gate = threading.Event()
+    try:
+        assert bus.try_publish("board", gate.wait)
+        _wait_for(lambda: bus.queue_depth == 0)
+        assert bus.try_publish("board", lambda: None)
+        started = time.monotonic()
+        assert not bus.try_publish("board", lambda: None)
+        assert time.monotonic() - started < 0.01
+        assert bus.metrics()["deferred"] == 1
+        assert bus.metrics()["dropped"] == 0
+    finally:
+        gate.set()
+        bus.stop()
+
+
+def test_reed_changes_are_coalesced_not_dropped():
+    squares = {}
+
+    def on_reed_change(changes):
+        for change in changes:
+            squares[change["position"]] = change["to_state"]
+
+    bus = EventBus(workers=1, maxsize=1)
+    server = ChessServer(on_reed_change=on_reed_change, event_bus=bus)
+    bus.start()
+    gate = threading.Event()
+    session = server.session
+    start = Position().occupancy
+    try:
+        session.handle_message({"type": "reed_state", "event": "heartbeat", "occupancy": start})
+        # Wątek magistrali zajęty, kolejka pełna
+        bus.publish(session.board_id, gate.wait)
+        _wait_for(lambda: bus.queue_depth == 0)
+        bus.publish(session.board_id, lambda: None)
+
+        occupancy = start
+        started = time.monotonic()
+        for square in (12, 28, 11, 27):  # e2 zdjęty, e4 postawiony, d2 zdjęty, d4 postawiony
+            occupancy ^= 1 << square
+            session.handle_message({"type": "reed_state", "event": "reed_change", "occupancy": occupancy})
+        assert time.monotonic() - started < 0.05
+
+        gate.set()
+        _wait_for(lambda: bus.queue_depth == 0)
+        # Kolejna ramka (np. heartbeat) przekazuje zaległe zmiany
+        session.handle_message({"type": "reed_state", "event": "heartbeat", "occupancy": occupancy})
+        _wait_for(lambda: squares == {"e2": 0, "e4": 1, "d2": 0, "d4": 1})
+        assert bus.metrics()["dropped"] == 0
+    finally:
+        gate.set()
+        bus.stop()
@@ -0,0 +1,75 @@
+# test_frame_decoder.py
+import json
+import socket
+
+from board_protocol import encode_reed_frame, decode_binary_frame
+from frame_decoder import FrameDecoder
+
+
+def _json_frame(message):
+    return json.dumps(message).encode() + b'\n'
+
+
+def test_frames_split_across_reads():
+    decoder = FrameDecoder(capacity=16)
+    data = _json_frame({"type": "reed_state", "event": "heartbeat"}) + encode_reed_frame(0xFFFF, "reed_change", 7)
+    frames = []
+    for index in range(len(data)):
+        decoder.feed(data[index:index + 1])
+        frames.extend(decoder.frames())
+    assert frames[0] == b'{"type": "reed_state", "event": "heartbeat"}'
+    assert decode_binary_frame(frames[1])["occupancy"] == 0xFFFF
+    assert len(frames) == 2
+    assert decoder.pending == 0
+
+
+def test_several_frames_in_one_read():
+    decoder = FrameDecoder()
+    binary = encode_reed_frame(1, "heartbeat", 1)
+    decoder.feed(_json_frame({"a": 1}) + binary + b'\r\n' + _json_frame({"b": 2}) + binary)
+    assert decoder.frames() == [b'{"a": 1}', binary, b'{"b": 2}', binary]
+    assert decoder.frames_decoded == 4
+
+
+def test_recv_into_grows_buffer_for_long_frame():
+    decoder = FrameDecoder(capacity=8)
+    board, server = socket.socketpair()
+    try:
+        hello = _json_frame({"type": "hello", "protocols": ["bin1", "json"], "board": "emu-1"})
+        board.sendall(hello)
+        frames = []
+        received = 0
+        while not frames:
+            received += decoder.recv_into(server)
+            frames = decoder.frames()
+        assert received == len(hello)
+        assert frames == [hello[:-1]]
+    finally:
+        board.close()
+        server.close()
+
+
+def test_overlong_line_is_discarded():
+    decoder = FrameDecoder(capacity=16, max_frame_size=32)
+    decoder.feed(b'{"x": "' + b'a' * 40)
+    assert decoder.frames() == []
+    decoder.feed(b'a' * 20 + b'"}\n' + _json_frame({"ok": True}))
+    assert decoder.frames() == [b'{"ok": true}']
+    assert decoder.bytes_discarded == 7 + 40 + 20 + 3
+
+
+def test_flush_returns_partial_json_frame():
+    decoder = FrameDecoder()
+    decoder.feed(_json_frame({"a": 1}) + b'{"type": "reed_st')
+    assert decoder.frames() == [b'{"a": 1}']
+    assert decoder.flush() == [b'{"type": "reed_st']
+    assert decoder.pending == 0
+
+
+def test_flush_drops_partial_binary_frame():
+    decoder = FrameDecoder()
+    binary = encode_reed_frame(0xFF, "reed_change", 3)
+    decoder.feed(binary + binary[:5])
+    assert decoder.flush() == [binary]
+    assert decoder.bytes_discarded == 5
+    assert decoder.pending == 0
@@ -0,0 +1,64 @@
+# test_game_watcher.py
+import pytest
+
+from fake_lichess import FakeLichess
+from game_watcher import GameWatcher
+
+
+@pytest.fixture
+def fake():
+    fake = FakeLichess().start()
+    yield fake
+    fake.stop()
+
+
+def _watcher(fake, game, states):
+    return GameWatcher(game.game_id, states.append, account_id=fake.account, token=None, base_url=fake.url)
+
+
+def test_first_poll_of_new_game_is_emitted(fake):
+    game = fake.create_game(board_api=False)
+    states = []
+    watcher = _watcher(fake, game, states)
+
+    watcher._poll_export()
+    assert watcher.player_color == "white"
+    assert [state["moves"] for state in states] == [""]
+    assert watcher.is_my_turn()
+
+    # Bez zmian (304) - brak kolejnych powiadomień
+    watcher._poll_export()
+    assert watcher.not_modified == 1
+    assert len(states) == 1
+    watcher._close()
+
+
+def test_new_moves_are_emitted_once(fake):
+    game = fake.create_game(board_api=False)
+    states = []
+    watcher = _watcher(fake, game, states)
+    watcher._poll_export()
+    game.push_move("e2e4")
+    game.push_move("e7e5")
+    watcher._poll_export()
+    watcher._poll_export()
+    assert [state["moves"] for state in states] == ["", "e2e4 e7e5"]
+    watcher._close()
+
+
+def test_san_annotations_do_not_reset_history():
+    watcher = GameWatcher("game", lambda state: None)
+    assert watcher._apply_san_text("e4 e5 Qh5 Nc6 Bc4 Nf6 Qxf7#")
+    moves = list(watcher.moves)
+    assert not watcher._apply_san_text("e4 e5 Qh5 Nc6 Bc4 Nf6 Qxf7")
+    assert not watcher._apply_san_text("e4  e5 Qh5 Nc6 Bc4 Nf6 Qxf7#")
+    assert watcher.moves == moves
+
+
+def test_takeback_rebuilds_history():
+    watcher = GameWatcher("game", lambda state: None)
+    watcher._apply_san_text("e4 e5 Nf3")
+    assert watcher._apply_san_text("e4 e5")
+    assert watcher.moves == ["e2e4", "e7e5"]
+    assert watcher._apply_san_text("e4 d5")
+    assert watcher.moves == ["e2e4", "d7d5"]
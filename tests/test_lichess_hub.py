@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from fake_lichess import FakeLichess, FAULT_SERVER_ERROR
+from lichess_hub import LichessHub
+
+
+class _Client:
+    """Klient szachownicy zapisujący wywołania huba."""
+
+    def __init__(self):
+        self.calls = []
+
+    def on_game_start(self, game_id):
+        self.calls.append(("start", game_id))
+
+    def on_game_finish(self, game_id):
+        self.calls.append(("finish", game_id))
+
+    def on_hub_lost(self, game_id=None):
+        self.calls.append(("lost", game_id))
+
+
+@pytest.fixture
+def fake():
+    fake = FakeLichess()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def test_failed_account_fetch_does_not_start_stream(fake):
+    fake.inject(FAULT_SERVER_ERROR, path="/api/account")
+    hub = LichessHub("token", base_url=fake.url).start()
+    try:
+        assert hub.account_id is None
+        assert not hub.running
+        assert fake.event_streams == 0
+
+        # Klient od razu przechodzi na własne śledzenie partii
+        client = _Client()
+        hub.register(client, "game0001")
+        assert client.calls == [("lost", "game0001")]
+    finally:
+        hub.stop()
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_board_without_game_id_gets_first_free_game(fake):
+    hub = LichessHub("token", base_url=fake.url).start()
+    try:
+        assert _wait_for(lambda: fake.event_streams == 1)
+        busy = fake.create_game()
+        assert _wait_for(lambda: busy.game_id in hub.active_games)
+
+        first, second, waiting = _Client(), _Client(), _Client()
+        hub.register(first, busy.game_id)
+        # Trwająca partia jest zajęta - druga szachownica dostaje kolejną rozpoczętą
+        hub.register(second)
+        hub.register(waiting)
+        assert second.calls == [] and hub._waiting == [second, waiting]
+
+        game = fake.create_game()
+        assert _wait_for(lambda: second.calls == [("start", game.game_id)])
+        assert first.calls == [("start", busy.game_id)]
+        assert waiting.calls == []
+        assert hub.clients == {busy.game_id: first, game.game_id: second}
+
+        game.finish()
+        assert _wait_for(lambda: second.calls[-1] == ("finish", game.game_id))
+        assert game.game_id not in hub.clients
+    finally:
+        hub.stop()
+
+
+def test_free_active_game_is_assigned_on_register(fake):
+    hub = LichessHub("token", base_url=fake.url).start()
+    try:
+        assert _wait_for(lambda: fake.event_streams == 1)
+        game = fake.create_game()
+        assert _wait_for(lambda: game.game_id in hub.active_games)
+
+        client = _Client()
+        hub.register(client)
+        assert client.calls == [("start", game.game_id)]
+        assert hub.clients == {game.game_id: client}
+    finally:
+        hub.stop()
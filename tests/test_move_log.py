@@ -0,0 +1,78 @@
+# test_move_log.py
+import pytest
+
+from chess_move_handler import ChessMoveHandler
+from chess_position import Position
+from chess_server import ChessServer
+from clock import SimulatedClock
+from event_bus import EventBus
+from move_log import MoveLog
+
+
+def test_incremental_update():
+    log = MoveLog()
+    assert log.update("e2e4") == (0, ["e2e4"])
+    assert log.update("e2e4 e7e5 g1f3") == (1, ["e7e5", "g1f3"])
+    assert log.update("e2e4 e7e5 g1f3") == (3, [])
+    assert log.side_to_move == "black"
+    assert log.resets == 0
+
+
+def test_takeback_to_shorter_history():
+    log = MoveLog()
+    log.update("e2e4 e7e5")
+    assert log.update("e2e4") == (0, ["e2e4"])
+    assert log.resets == 1
+
+
+def test_replay_with_same_length_and_last_move():
+    log = MoveLog()
+    log.update("e2e4 e7e5")
+    # Cofnięcie i inna kontynuacja - ta sama długość i ten sam ostatni ruch
+    assert log.update("d2d4 e7e5") == (0, ["d2d4", "e7e5"])
+    assert log.moves == ["d2d4", "e7e5"]
+    assert log.resets == 1
+
+
+def test_rewritten_history_that_grew():
+    log = MoveLog()
+    log.update("e2e4 e7e5")
+    log.update("d2d4 d7d5 c2c4")
+    assert log.moves == ["d2d4", "d7d5", "c2c4"]
+    assert log.resets == 1
+
+
+class _Client:
+    def make_move(self, move):
+        return True
+
+
+@pytest.fixture
+def handler():
+    clock = SimulatedClock()
+    server = ChessServer(event_bus=EventBus(inline=True), clock=clock)
+    server.scheduler.start()
+    handler = ChessMoveHandler(server, _Client(), clock=clock)
+    yield handler, clock
+    handler.stop()
+    server.scheduler.stop()
+
+
+def test_handler_resyncs_after_replay_with_same_last_move(handler):
+    handler, clock = handler
+    handler.sync_moves(["e2e4", "e7e5"])
+    handler.set_player_turn(True)
+    clock.run_until_idle()
+    assert handler.recognizer.signatures == handler.signature_cache.signatures(handler.position)
+
+    handler.sync_moves(["d2d4", "e7e5"])
+    handler.set_player_turn(True)
+    clock.run_until_idle()
+
+    expected = Position()
+    for move in ("d2d4", "e7e5"):
+        expected.push_uci(move)
+    assert handler.applied_moves == ["d2d4", "e7e5"]
+    assert handler.position.fen() == expected.fen()
+    # Rozpoznawanie uzbrojone ponownie - w nowej pozycji
+    assert handler.recognizer.signatures == handler.signature_cache.signatures(expected)
@@ -0,0 +1,72 @@
+# test_move_recognizer.py
+import pytest
+
+from chess_position import Position
+from clock import SimulatedClock
+from config import square_index
+from move_recognizer import MoveRecognizer, RESULT_ILLEGAL, RESULT_MOVE, RESULT_NONE, RESULT_PENDING
+from scheduler import TimerScheduler
+
+# Biały pionek e4 może zbić d5 albo f5
+FEN = "4k3/8/8/3p1p2/4P3/8/8/4K3 w - - 0 1"
+
+
+@pytest.fixture
+def recognizer():
+    clock = SimulatedClock()
+    scheduler = TimerScheduler(name="test-recognizer", clock=clock)
+    scheduler.start()
+    results = []
+    position = Position(FEN)
+    recognizer = MoveRecognizer(scheduler, lambda result, uci, diff: results.append((result, uci)),
+                                position.occupancy, settle_delay=0.3)
+    recognizer.arm(position)
+    yield recognizer, clock, results
+    scheduler.stop()
+
+
+def _step(recognizer, clock, square, present):
+    recognizer.feed([{"position": square, "from_state": int(not present), "to_state": int(present)}])
+    clock.advance(0.5)
+
+
+def test_lifted_and_replaced_piece_then_capture(recognizer):
+    recognizer, clock, results = recognizer
+    # Poprawienie piona f5 (zdjęty i odstawiony) przed biciem na d5
+    _step(recognizer, clock, "f5", False)
+    _step(recognizer, clock, "f5", True)
+    assert recognizer.touched == 0
+
+    _step(recognizer, clock, "d5", False)
+    _step(recognizer, clock, "e4", False)
+    _step(recognizer, clock, "d5", True)
+    assert results == [(RESULT_PENDING, None), (RESULT_NONE, None), (RESULT_PENDING, None),
+                       (RESULT_PENDING, None), (RESULT_MOVE, "e4d5")]
+
+
+def test_touched_squares_kept_while_move_in_progress(recognizer):
+    recognizer, clock, results = recognizer
+    _step(recognizer, clock, "d5", False)
+    _step(recognizer, clock, "e4", False)
+    assert recognizer.touched == 1 << square_index("d5") | 1 << square_index("e4")
+
+
+def test_piece_placed_where_no_move_lands_is_illegal_at_once(recognizer):
+    recognizer, clock, results = recognizer
+    recognizer.feed([{"position": "e4", "from_state": 1, "to_state": 0}])
+    recognizer.feed([{"position": "a8", "from_state": 0, "to_state": 1}])
+    assert recognizer.is_placement_illegal()
+    clock.advance(0)
+    assert results == [(RESULT_ILLEGAL, None)]
+
+
+def test_placement_that_a_legal_move_can_finish_waits_for_settle(recognizer):
+    recognizer, clock, results = recognizer
+    # e5 to pole docelowe ruchu e4e5 - ocena dopiero po oknie stabilizacji
+    recognizer.feed([{"position": "e4", "from_state": 1, "to_state": 0}])
+    recognizer.feed([{"position": "e5", "from_state": 0, "to_state": 1}])
+    assert not recognizer.is_placement_illegal()
+    clock.advance(0.1)
+    assert results == []
+    clock.advance(0.3)
+    assert results == [(RESULT_MOVE, "e4e5")]
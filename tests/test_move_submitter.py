@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from fake_lichess import FakeLichess, FAULT_RATE_LIMIT, FAULT_SERVER_ERROR
+from move_submitter import MoveSubmitter
+
+
+@pytest.fixture
+def fake():
+    fake = FakeLichess()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def _submitter(fake, game, **kwargs):
+    done = threading.Event()
+    results = []
+
+    def finished(*args):
+        results.append(args)
+        done.set()
+
+    submitter = MoveSubmitter(game.game_id, lambda: game.moves, on_success=finished, on_failure=finished,
+                              token="token", base_url=fake.url, retry_delay=0.01, **kwargs).start()
+    return submitter, done, results
+
+
+def test_server_error_is_retried(fake):
+    game = fake.create_game()
+    fake.inject(FAULT_SERVER_ERROR, count=2, path=f"/api/board/game/{game.game_id}/move/")
+    submitter, done, results = _submitter(fake, game)
+    try:
+        submitter.submit("e2e4", 0)
+        assert done.wait(2.0)
+        assert results == [("e2e4",)]
+        assert game.moves == ["e2e4"]
+        assert submitter.retries == 2
+        assert submitter.submitted == 1
+    finally:
+        submitter.stop()
+
+
+def test_rate_limit_pauses_submitting(fake):
+    game = fake.create_game()
+    fake.inject(FAULT_RATE_LIMIT, path=f"/api/board/game/{game.game_id}/move/")
+    submitter, done, results = _submitter(fake, game, rate_limit_delay=0.2)
+    try:
+        started = time.perf_counter()
+        submitter.submit("e2e4", 0)
+        assert done.wait(2.0)
+        # Po 429 wysyłanie czeka rate_limit_delay zamiast ponawiać od razu
+        assert time.perf_counter() - started >= 0.2
+        assert results == [("e2e4",)]
+        assert game.moves == ["e2e4"]
+        assert submitter.retries == 1
+    finally:
+        submitter.stop()
+
+
+def test_gives_up_after_max_attempts(fake):
+    game = fake.create_game()
+    fake.inject(FAULT_SERVER_ERROR, count=10, path=f"/api/board/game/{game.game_id}/move/")
+    submitter, done, results = _submitter(fake, game, max_attempts=3)
+    try:
+        submitter.submit("e2e4", 0)
+        assert done.wait(2.0)
+        assert results[0][0] == "e2e4" and len(results[0]) == 2
+        assert game.moves == []
+        assert submitter.failed == 1
+    finally:
+        submitter.stop()
@@ -0,0 +1,62 @@
+import pytest
+
+from clock import SimulatedClock
+from scheduler import TimerScheduler
+
+
+def _scheduler(clock):
+    scheduler = TimerScheduler(name="test", clock=clock)
+    scheduler.start()
+    return scheduler
+
+
+def test_timers_run_in_deadline_order():
+    clock = SimulatedClock()
+    scheduler = _scheduler(clock)
+    calls = []
+    scheduler.call_later(0.3, calls.append, "c")
+    scheduler.call_later(0.1, calls.append, "a")
+    scheduler.call_later(0.2, calls.append, "b")
+    # Ten sam termin - w kolejności zgłoszeń
+    scheduler.call_soon(calls.append, "first")
+    scheduler.call_soon(calls.append, "second")
+
+    clock.advance(0.15)
+    assert calls == ["first", "second", "a"]
+    assert clock.now() == 0.15
+
+    assert clock.run_until_idle() == pytest.approx(0.15)
+    assert calls == ["first", "second", "a", "b", "c"]
+    assert scheduler.pending == 0
+
+
+def test_cancelled_timer_does_not_run():
+    clock = SimulatedClock()
+    scheduler = _scheduler(clock)
+    calls = []
+    first = scheduler.call_later(0.1, calls.append, "a")
+    scheduler.call_later(0.2, calls.append, "b")
+    first.cancel()
+    assert scheduler.pending == 1
+    assert scheduler.next_deadline() == 0.2
+
+    clock.run_until_idle()
+    assert calls == ["b"]
+
+
+def test_timers_of_several_schedulers_are_interleaved():
+    clock = SimulatedClock()
+    first, second = _scheduler(clock), _scheduler(clock)
+    calls = []
+    first.call_later(0.2, calls.append, "first-0.2")
+    second.call_later(0.1, calls.append, "second-0.1")
+    # Zadanie planujące kolejne - wykonywane w tym samym przesunięciu czasu
+    second.call_later(0.3, lambda: first.call_later(0.1, calls.append, "first-0.4"))
+
+    clock.advance(1.0)
+    assert calls == ["second-0.1", "first-0.2", "first-0.4"]
+
+    second.stop()
+    second.call_later(0.1, calls.append, "stopped")
+    clock.run_until_idle()
+    assert "stopped" not in calls